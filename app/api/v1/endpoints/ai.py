@@ -70,8 +70,8 @@ async def upload_document(
         raise HTTPException(status_code=403, detail="Only students can upload documents")
     
     try:
-        # Read file content
-        file_content = await file.read()
+        # Stream the spooled upload rather than reading it into memory
+        file_content = file.file
         
         # Validate file
         storage_service = StorageService()
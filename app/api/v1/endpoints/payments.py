@@ -1,5 +1,5 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Request, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Body, Query, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from pydantic import BaseModel, Field
@@ -106,6 +106,7 @@ async def create_subscription_checkout(
     plan_key: str = Body(..., embed=True),
     success_url: str = Body(..., embed=True),
     cancel_url: str = Body(..., embed=True),
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -124,7 +125,8 @@ async def create_subscription_checkout(
             price_id=plan.stripe_price_id,
             success_url=success_url,
             cancel_url=cancel_url,
-            db_session=db
+            db_session=db,
+            idempotency_key=idempotency_key
         )
         
         return CheckoutSessionResponse(
@@ -214,6 +216,7 @@ async def create_payment_intent(
     amount_cents: int = Body(..., embed=True),
     description: str = Body(..., embed=True),
     metadata: Optional[dict] = Body({}, embed=True),
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -225,7 +228,8 @@ async def create_payment_intent(
             amount_cents=amount_cents,
             description=description,
             metadata=metadata,
-            db_session=db
+            db_session=db,
+            idempotency_key=idempotency_key
         )
         
         return PaymentIntentResponse(
@@ -247,6 +251,7 @@ async def create_credit_pack_checkout(
     request: CreditPackRequest,
     success_url: str = Body(..., embed=True),
     cancel_url: str = Body(..., embed=True),
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -259,7 +264,8 @@ async def create_credit_pack_checkout(
             price_cents=request.price_cents,
             success_url=success_url,
             cancel_url=cancel_url,
-            db_session=db
+            db_session=db,
+            idempotency_key=idempotency_key
         )
         
         return CheckoutSessionResponse(
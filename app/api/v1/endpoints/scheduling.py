@@ -1,12 +1,14 @@
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from pydantic import BaseModel, Field
 import pytz
 import json
+import logging
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.auth import get_current_user
 from app.models.user import User, UserRole
@@ -14,10 +16,11 @@ from app.models.availability import AvailabilityBlock, TimeOffBlock, Slot, SlotS
 from app.models.booking import Booking, BookingStatus
 from app.models.tutor_profile import TutorProfile
 from app.models.student_profile import StudentProfile
-from app.services.scheduling_service import SchedulingService
+from app.services.scheduling_service import SchedulingService, invalidate_oauth_account
 from app.services.google_calendar_service import GoogleCalendarService
-from app.core.exceptions import SchedulingError, BookingError
+from app.core.exceptions import SchedulingError, BookingError, GoogleCalendarError
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -472,6 +475,17 @@ async def connect_google_calendar(
         db.add(oauth_account)
         await db.commit()
         await db.refresh(oauth_account)
+        invalidate_oauth_account(current_user.id)
+        
+        # Watch the primary calendar so changes are pushed to us; the
+        # connection still succeeds without it
+        if settings.GOOGLE_CALENDAR_WEBHOOK_URL:
+            try:
+                db.add(await google_calendar.watch_calendar(tokens["access_token"], current_user.id))
+                await db.commit()
+            except GoogleCalendarError:
+                await db.rollback()
+                logger.warning("Could not watch Google Calendar for user %s", current_user.id, exc_info=True)
         
         # Update user profile to indicate calendar connection
         if current_user.role == UserRole.TUTOR:
@@ -498,6 +512,37 @@ async def connect_google_calendar(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.post("/calendar/notifications")
+async def google_calendar_notification(
+    x_goog_channel_id: str = Header(...),
+    x_goog_resource_id: str = Header(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """Receive Google Calendar push notifications for watched calendars
+    
+    Changes are fetched and applied by a background task so Google gets a
+    quick acknowledgement.
+    """
+    from app.models.google_oauth import GoogleCalendarChannel
+    from app.tasks.reminder_tasks import sync_calendar_channel_task
+    
+    result = await db.execute(
+        select(GoogleCalendarChannel.id).where(
+            and_(
+                GoogleCalendarChannel.channel_id == x_goog_channel_id,
+                GoogleCalendarChannel.resource_id == x_goog_resource_id,
+                GoogleCalendarChannel.deleted_at.is_(None)
+            )
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Unknown channel")
+    
+    sync_calendar_channel_task.delay(x_goog_channel_id)
+    
+    return {"status": "accepted"}
+
+
 @router.get("/calendar/calendars")
 async def get_google_calendars(
     current_user: User = Depends(get_current_user),
@@ -552,6 +597,7 @@ async def disconnect_google_calendar(
         if oauth_account:
             oauth_account.deleted_at = datetime.now(timezone.utc)
             await db.commit()
+            invalidate_oauth_account(current_user.id)
         
         # Update user profile
         if current_user.role == UserRole.TUTOR:
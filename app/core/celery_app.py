@@ -0,0 +1,94 @@
+from celery import Celery
+from celery.schedules import crontab
+
+from app.core.config import settings
+
+
+# Redis doubles as the broker when no dedicated Celery broker is configured
+broker_url = settings.CELERY_BROKER_URL or settings.REDIS_URL
+result_backend = settings.CELERY_RESULT_BACKEND or None
+
+celery_app = Celery(
+    "preply",
+    broker=broker_url,
+    backend=result_backend,
+    include=[
+        "app.tasks.notifications",
+        "app.tasks.calendar",
+        "app.tasks.payments",
+        "app.tasks.reminder_tasks",
+    ],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    timezone="UTC",
+    enable_utc=True,
+    task_ignore_result=True,
+    worker_prefetch_multiplier=1,
+    # Separate queues so slow SMTP/SMS delivery, Google Calendar calls and Stripe
+    # webhook handling never stall in-app writes
+    task_default_queue="notifications",
+    task_routes={
+        "app.tasks.notifications.dispatch_booking_confirmation_email": {"queue": "email"},
+        "app.tasks.notifications.dispatch_booking_cancellation_email": {"queue": "email"},
+        "app.tasks.notifications.dispatch_booking_reschedule_email": {"queue": "email"},
+        "app.tasks.notifications.send_booking_reminders": {"queue": "email"},
+        "app.tasks.notifications.dispatch_booking_confirmation_inapp": {"queue": "inapp"},
+        "app.tasks.notifications.dispatch_booking_cancellation_inapp": {"queue": "inapp"},
+        "app.tasks.notifications.dispatch_booking_reschedule_inapp": {"queue": "inapp"},
+        "app.tasks.calendar.create_booking_calendar_events": {"queue": "calendar"},
+        "app.tasks.calendar.cancel_booking_calendar_events": {"queue": "calendar"},
+        "app.tasks.reminder_tasks.sync_google_calendar_events_task": {"queue": "calendar"},
+        "app.tasks.reminder_tasks.renew_expiring_calendar_channels_task": {"queue": "calendar"},
+        "app.tasks.reminder_tasks.sync_calendar_channel_task": {"queue": "calendar"},
+        "app.tasks.payments.process_stripe_event": {"queue": "payments"},
+        "app.tasks.payments.warm_stripe_customer_cache": {"queue": "payments"},
+    },
+    # Each periodic run expires after one interval, so a backed-up queue
+    # never executes stale runs back to back
+    beat_schedule={
+        "send-booking-reminders": {
+            "task": "app.tasks.notifications.send_booking_reminders",
+            "schedule": crontab(minute=0),
+        },
+        "cleanup-expired-holds": {
+            "task": "app.tasks.reminder_tasks.cleanup_expired_holds_task",
+            "schedule": crontab(minute="*/5"),
+            "options": {"expires": 5 * 60},
+        },
+        "generate-future-slots": {
+            "task": "app.tasks.reminder_tasks.generate_future_slots_task",
+            "schedule": crontab(hour=2, minute=0),
+            "options": {"expires": 24 * 60 * 60},
+        },
+        "sync-google-calendar-events": {
+            "task": "app.tasks.reminder_tasks.sync_google_calendar_events_task",
+            "schedule": crontab(minute="*/30"),
+            "options": {"expires": 30 * 60},
+        },
+        "renew-expiring-calendar-channels": {
+            "task": "app.tasks.reminder_tasks.renew_expiring_calendar_channels_task",
+            "schedule": crontab(minute=0),
+            "options": {"expires": 60 * 60},
+        },
+        "process-no-show-bookings": {
+            "task": "app.tasks.reminder_tasks.process_no_show_bookings_task",
+            "schedule": crontab(minute="*/15"),
+            "options": {"expires": 15 * 60},
+        },
+        # Customer mappings are cached for a day, so a daily run keeps the cache full
+        "warm-stripe-customer-cache": {
+            "task": "app.tasks.payments.warm_stripe_customer_cache",
+            "schedule": crontab(hour=4, minute=0),
+            "options": {"expires": 24 * 60 * 60},
+        },
+        "cleanup-old-slots": {
+            "task": "app.tasks.reminder_tasks.cleanup_old_slots_task",
+            "schedule": crontab(hour=3, minute=0),
+            "options": {"expires": 24 * 60 * 60},
+        },
+    },
+)
@@ -18,6 +18,9 @@ class Settings(BaseSettings):
     
     # Database (Neon)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./preply.db")
+    # Per-process pool; keep (pool size + overflow) x processes under Postgres max_connections
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 20
     
     # Authentication
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -45,12 +48,16 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_ID: str = ""
     GOOGLE_CLIENT_SECRET: str = ""
     GOOGLE_REDIRECT_URI: str = "http://localhost:8000/api/v1/auth/google/callback"
+    GOOGLE_API_MAX_CONCURRENCY: int = 5  # Max in-flight Google API calls per worker
+    GOOGLE_CALENDAR_WEBHOOK_URL: str = ""  # Public URL of the /calendar/notifications receiver; calendars aren't watched when unset
     
     # File Storage (S3)
     S3_ACCESS_KEY_ID: str = ""
     S3_SECRET_ACCESS_KEY: str = ""
     S3_BUCKET_NAME: str = "preply-uploads"
     S3_REGION: str = "us-east-1"
+    S3_MULTIPART_PART_SIZE_MB: int = 16  # Files above one part upload in parallel parts
+    S3_MULTIPART_MAX_CONCURRENCY: int = 10  # Max in-flight part uploads per file
     
     # Email (Resend)
     RESEND_API_KEY: str = ""
@@ -60,12 +67,14 @@ class Settings(BaseSettings):
     REDIS_URL: str = ""
     REDIS_PASSWORD: str = ""
     
-    # Celery
+    # Celery (required: background notifications and calendar writes are queued
+    # through it; falls back to REDIS_URL when unset)
     CELERY_BROKER_URL: str = ""
     CELERY_RESULT_BACKEND: str = ""
     
     # File Upload
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_UPLOAD_SIZE_MB: int = 50  # Larger multipart bodies are refused while streaming in
     ALLOWED_FILE_TYPES: List[str] = [".pdf", ".docx", ".txt", ".md"]
     
     class Config:
@@ -3,8 +3,19 @@ from sqlalchemy.orm import declarative_base
 from sqlalchemy import Column, DateTime, func
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
+import orjson
 from app.core.config import settings
 
+
+# orjson options used for every JSON column
+JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _json_serializer(obj) -> str:
+    """Serialize JSON columns with orjson (datetimes become ISO 8601 UTC strings)"""
+    return orjson.dumps(obj, option=JSON_OPTIONS).decode()
+
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -12,6 +23,11 @@ engine = create_async_engine(
     future=True,
     pool_pre_ping=True,
     pool_recycle=300,
+    # Sized for bursts such as Stripe renewal webhooks; the default 5 + 10 queues them
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
 )
 
 # Create async session factory
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Optional
+import httpx
+
+
+# Shared outbound HTTP client (HTTP/2, pooled connections)
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client for the running event loop.
+
+    The client is created lazily inside the running loop and rebuilt if the
+    loop changes, so pooled connections are never reused across loops.
+    """
+    global _client, _client_loop
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=10,
+        )
+        _client_loop = loop
+
+    return _client
+
+
+async def close_http_client():
+    """Close the shared HTTP client"""
+    global _client, _client_loop
+
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+
+    _client = None
+    _client_loop = None
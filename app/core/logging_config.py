@@ -0,0 +1,82 @@
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+_listener: Optional[QueueListener] = None
+
+
+class RateLimitingFilter(logging.Filter):
+    """Drop repeats of the same log record beyond a burst within each period.
+
+    Records repeat when they share logger, level, formatted message and
+    exception type, so records naming different ids are never collapsed.
+    Windows older than the period are pruned, keeping memory bounded.
+    """
+
+    def __init__(self, period_seconds: float = 60.0, burst: int = 5):
+        super().__init__()
+        self.period = period_seconds
+        self.burst = burst
+        self._windows: Dict[Tuple[str, int, str, str], Tuple[float, int]] = {}
+        self._last_prune = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else ""
+        key = (record.name, record.levelno, record.getMessage(), exc_type)
+        now = time.monotonic()
+
+        if now - self._last_prune >= self.period:
+            self._windows = {
+                window_key: window
+                for window_key, window in self._windows.items()
+                if now - window[0] < self.period
+            }
+            self._last_prune = now
+
+        window_start, count = self._windows.get(key, (now, 0))
+        if now - window_start >= self.period:
+            window_start, count = now, 0
+
+        self._windows[key] = (window_start, count + 1)
+        return count < self.burst
+
+
+def setup_logging():
+    """Route root logging through a queue so handlers never block the event loop.
+
+    Records are enqueued on the calling thread and written to stderr by a
+    background listener thread.
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued log records and stop the listener thread"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    _listener = None
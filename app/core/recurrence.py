@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List
+from zoneinfo import ZoneInfo
+from dateutil import rrule
+
+
+@lru_cache(maxsize=512)
+def _tz(name: str) -> ZoneInfo:
+    """Resolve a timezone name once; later lookups are a cache hit"""
+    return ZoneInfo(name)
+
+
+@lru_cache(maxsize=256)
+def _parse_rrule(rrule_string: str, dtstart: datetime) -> rrule.rrulebase:
+    """Parse an RRULE once per rule and start; the parsed rule caches its own occurrences"""
+    return rrule.rrulestr(rrule_string, dtstart=dtstart, cache=True)
+
+
+def expand_rrule(
+    rrule_string: str,
+    dtstart: datetime,
+    start: datetime,
+    until: datetime,
+    tz: str = "UTC"
+) -> List[datetime]:
+    """Expand an RRULE into UTC occurrences strictly between start and until.
+
+    The rule is evaluated in the tutor's local wall time so a weekly 9:00
+    session stays at 9:00 across DST changes.
+    """
+    local_tz = _tz(tz)
+
+    def to_local(value: datetime) -> datetime:
+        return value.astimezone(local_tz).replace(tzinfo=None)
+
+    try:
+        rule = _parse_rrule(rrule_string, to_local(dtstart))
+        occurrences = rule.between(to_local(start), to_local(until))
+    except ValueError:
+        # Rules pinned to UTC (e.g. UNTIL=...Z) can't be combined with a
+        # wall-clock start; expand them in UTC instead
+        rule = _parse_rrule(rrule_string, dtstart)
+        return rule.between(start, until)
+
+    return [occurrence.replace(tzinfo=local_tz).astimezone(timezone.utc) for occurrence in occurrences]
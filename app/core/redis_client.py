@@ -0,0 +1,44 @@
+import asyncio
+from typing import Optional
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+
+# Shared Redis client (Upstash)
+_client: Optional[redis.Redis] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """Get the shared Redis client for the running event loop.
+
+    Returns None when REDIS_URL is not configured, so callers can fall back
+    to their uncached path.
+    """
+    global _client, _client_loop
+
+    if not settings.REDIS_URL:
+        return None
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = redis.from_url(
+            settings.REDIS_URL,
+            password=settings.REDIS_PASSWORD or None,
+            decode_responses=True,
+        )
+        _client_loop = loop
+
+    return _client
+
+
+async def close_redis():
+    """Close the shared Redis client"""
+    global _client, _client_loop
+
+    if _client is not None:
+        await _client.aclose()
+
+    _client = None
+    _client_loop = None
@@ -0,0 +1,62 @@
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, Optional
+import aioboto3
+from aiobotocore.config import AioConfig
+
+from app.core.config import settings
+
+
+# Shared async S3 client (aiobotocore, pooled connections)
+S3_CLIENT_CONFIG = AioConfig(
+    max_pool_connections=64,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+)
+
+_session = aioboto3.Session()
+_client: Optional[Any] = None
+_client_stack: Optional[AsyncExitStack] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_s3_client() -> Any:
+    """Get the shared S3 client for the running event loop.
+
+    The client is opened lazily inside the running loop and reopened if the
+    loop changes, so pooled connections are never reused across loops.
+    """
+    global _client, _client_stack, _client_loop
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        stack = AsyncExitStack()
+        client = await stack.enter_async_context(
+            _session.client(
+                's3',
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_REGION,
+                config=S3_CLIENT_CONFIG
+            )
+        )
+
+        # Another coroutine may have opened one while we awaited
+        if _client is None or _client_loop is not loop:
+            _client, _client_stack, _client_loop = client, stack, loop
+        else:
+            await stack.aclose()
+
+    return _client
+
+
+async def close_s3_client():
+    """Close the shared S3 client"""
+    global _client, _client_stack, _client_loop
+
+    if _client_stack is not None:
+        await _client_stack.aclose()
+
+    _client = None
+    _client_stack = None
+    _client_loop = None
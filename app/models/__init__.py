@@ -4,7 +4,7 @@ from .tutor_profile import TutorProfile
 from .student_profile import StudentProfile
 from .availability import AvailabilityBlock, TimeOffBlock, Slot, SlotStatus
 from .booking import Booking, BookingStatus
-from .google_oauth import GoogleOAuthAccount
+from .google_oauth import GoogleOAuthAccount, GoogleCalendarChannel
 from .stripe_models import StripeCustomer, StripeSubscription, SubscriptionStatus
 from .payment import Payment, PaymentType, PaymentStatus
 from .credit_ledger import CreditLedger, CreditReason
@@ -31,6 +31,7 @@ __all__ = [
     
     # OAuth and external integrations
     "GoogleOAuthAccount",
+    "GoogleCalendarChannel",
     "StripeCustomer",
     "StripeSubscription", 
     "SubscriptionStatus",
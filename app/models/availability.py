@@ -74,3 +74,33 @@ class Slot(Base):
 
 # Create unique index to prevent double-booking
 Index('idx_slots_tutor_start_unique', Slot.tutor_id, Slot.start_at, unique=True)
+
+# Partial covering index for listing a tutor's open slots by time
+Index(
+    'idx_slots_open_by_tutor_start',
+    Slot.tutor_id,
+    Slot.start_at,
+    postgresql_include=['id', 'end_at'],
+    postgresql_where=(Slot.status == SlotStatus.OPEN) & Slot.deleted_at.is_(None)
+)
+
+# Partial index for the recurring-block scan behind slot generation
+Index(
+    'idx_availability_blocks_recurring',
+    AvailabilityBlock.id,
+    postgresql_where=AvailabilityBlock.is_recurring.is_(True) & AvailabilityBlock.deleted_at.is_(None)
+)
+
+# Partial index for releasing expired holds
+Index(
+    'idx_slots_held_updated',
+    Slot.updated_at,
+    postgresql_where=(Slot.status == SlotStatus.HELD) & Slot.deleted_at.is_(None)
+)
+
+# Partial index for the old-slot cleanup
+Index(
+    'idx_slots_live_start',
+    Slot.start_at,
+    postgresql_where=Slot.deleted_at.is_(None)
+)
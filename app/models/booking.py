@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, Enum
+from sqlalchemy import Column, String, DateTime, Integer, Boolean, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import enum
@@ -38,15 +38,34 @@ class Booking(Base):
     join_link = Column(String, nullable=True)  # Meeting link (Zoom, Google Meet, etc.)
     notes = Column(Text, nullable=True)  # Booking notes
     
+    # Reminder tracking
+    reminder_sent_24h = Column(Boolean, default=False, nullable=False)
+    reminder_sent_2h = Column(Boolean, default=False, nullable=False)
+    
     # Slot relationship
     slot_id = Column(UUID(as_uuid=True), ForeignKey("slots.id"), nullable=True)
     
-    # Relationships
-    student = relationship("User", foreign_keys=[student_id], back_populates="bookings_as_student")
-    tutor = relationship("User", foreign_keys=[tutor_id], back_populates="bookings_as_tutor")
-    slot = relationship("Slot", back_populates="booking")
+    # Relationships (load explicitly; implicit lazy loads raise under async sessions)
+    student = relationship("User", foreign_keys=[student_id], back_populates="bookings_as_student", lazy="raise")
+    tutor = relationship("User", foreign_keys=[tutor_id], back_populates="bookings_as_tutor", lazy="raise")
+    slot = relationship("Slot", back_populates="booking", lazy="raise")
     payments = relationship("Payment", back_populates="booking")
     credit_ledger_entries = relationship("CreditLedger", back_populates="booking")
 
     def __repr__(self):
         return f"<Booking(student_id={self.student_id}, tutor_id={self.tutor_id}, start_at={self.start_at}, status={self.status})>"
+
+
+# Partial index for the upcoming-bookings reminder scan
+Index(
+    'idx_bookings_upcoming',
+    Booking.start_at,
+    postgresql_where=(Booking.status == BookingStatus.CONFIRMED) & Booking.deleted_at.is_(None)
+)
+
+# Partial index for the no-show scan of confirmed bookings that have ended
+Index(
+    'idx_bookings_confirmed_end',
+    Booking.end_at,
+    postgresql_where=(Booking.status == BookingStatus.CONFIRMED) & Booking.deleted_at.is_(None)
+)
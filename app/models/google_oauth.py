@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -29,3 +29,39 @@ class GoogleOAuthAccount(Base):
 
     def __repr__(self):
         return f"<GoogleOAuthAccount(user_id={self.user_id}, provider={self.provider})>"
+
+
+class GoogleCalendarChannel(Base):
+    __tablename__ = "google_calendar_channels"
+
+    # Foreign key to user
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    
+    # Watched calendar and notification address
+    calendar_id = Column(String, default="primary", nullable=False)
+    address = Column(Text, nullable=False)  # Webhook URL receiving push notifications
+    
+    # Push channel details returned by events.watch
+    channel_id = Column(String, unique=True, nullable=False)
+    resource_id = Column(String, nullable=False)
+    expiration = Column(DateTime(timezone=True), nullable=False)  # UTC
+    
+    # Incremental sync state (nextSyncToken from the last events listing)
+    sync_token = Column(Text, nullable=True)
+    
+    # Relationships
+    user = relationship("User", back_populates="google_calendar_channels")
+
+    def __repr__(self):
+        return f"<GoogleCalendarChannel(user_id={self.user_id}, calendar_id={self.calendar_id}, expiration={self.expiration})>"
+
+
+# Index for the periodic renewal scan
+Index('idx_google_calendar_channels_expiration', GoogleCalendarChannel.expiration)
+
+# Partial index for looking up live OAuth accounts
+Index(
+    'idx_google_oauth_accounts_live_user',
+    GoogleOAuthAccount.user_id,
+    postgresql_where=GoogleOAuthAccount.deleted_at.is_(None)
+)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, ForeignKey, Text, Enum
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID, JSON
+from sqlalchemy import Column, String, ForeignKey, Text, Enum, Index
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import enum
 
 from app.core.database import Base
@@ -10,6 +10,7 @@ class NotificationType(str, enum.Enum):
     BOOKING_CONFIRMATION = "booking_confirmation"
     BOOKING_REMINDER = "booking_reminder"
     BOOKING_CANCELLATION = "booking_cancellation"
+    BOOKING_COMPLETED = "booking_completed"
     PAYMENT_SUCCESS = "payment_success"
     PAYMENT_FAILED = "payment_failed"
     CREDIT_LOW = "credit_low"
@@ -38,7 +39,8 @@ class Notification(Base):
     
     # Notification details
     type = Column(Enum(NotificationType), nullable=False)
-    payload = Column(JSON, nullable=False)  # JSON data containing notification content
+    # JSON data containing notification content; deferred so list queries skip it
+    payload = deferred(Column(JSONB, nullable=False), raiseload=True)
     delivery = Column(Enum(NotificationDelivery), nullable=False)
     status = Column(Enum(NotificationStatus), default=NotificationStatus.PENDING, nullable=False)
     
@@ -47,3 +49,13 @@ class Notification(Base):
 
     def __repr__(self):
         return f"<Notification(user_id={self.user_id}, type={self.type}, delivery={self.delivery}, status={self.status})>"
+
+
+# Partial index for listing a user's notifications newest first
+Index(
+    'idx_notifications_user_created',
+    Notification.user_id,
+    Notification.created_at.desc(),
+    Notification.id.desc(),
+    postgresql_where=Notification.deleted_at.is_(None)
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import enum
@@ -54,3 +54,7 @@ class StripeSubscription(Base):
 
     def __repr__(self):
         return f"<StripeSubscription(user_id={self.user_id}, plan_key={self.plan_key}, status={self.status})>"
+
+
+# Looking up a user's subscription by status (e.g. the active one)
+Index('idx_stripe_subscriptions_user_status', StripeSubscription.user_id, StripeSubscription.status)
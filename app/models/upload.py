@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, Enum, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, Enum, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import enum
@@ -37,3 +37,12 @@ class Upload(Base):
 
     def __repr__(self):
         return f"<Upload(user_id={self.user_id}, file_key={self.file_key}, origin={self.origin}, processed={self.processed})>"
+
+
+# Covering index for summing a user's live uploads
+Index(
+    'idx_uploads_live_by_user',
+    Upload.user_id,
+    postgresql_include=['bytes'],
+    postgresql_where=Upload.deleted_at.is_(None)
+)
@@ -19,8 +19,12 @@ class User(Base):
     role = Column(Enum(UserRole), default=UserRole.STUDENT, nullable=False)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
+    phone_number = Column(String, nullable=True)  # E.164, used for SMS reminders
     timezone = Column(String, default="UTC", nullable=False)
     
+    # Plan key of the user's active subscription, kept in sync by the Stripe webhooks
+    active_subscription_tier = Column(String, nullable=True)
+    
     # Relationships
     tutor_profile = relationship("TutorProfile", back_populates="user", uselist=False)
     student_profile = relationship("StudentProfile", back_populates="user", uselist=False)
@@ -30,6 +34,7 @@ class User(Base):
     bookings_as_student = relationship("Booking", foreign_keys="Booking.student_id", back_populates="student")
     bookings_as_tutor = relationship("Booking", foreign_keys="Booking.tutor_id", back_populates="tutor")
     google_oauth_accounts = relationship("GoogleOAuthAccount", back_populates="user")
+    google_calendar_channels = relationship("GoogleCalendarChannel", back_populates="user")
     stripe_customer = relationship("StripeCustomer", back_populates="user", uselist=False)
     stripe_subscriptions = relationship("StripeSubscription", back_populates="user")
     payments = relationship("Payment", back_populates="user")
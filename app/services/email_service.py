@@ -223,3 +223,17 @@ class EmailService:
         except Exception as e:
             logger.error(f"Error sending AI artifact ready email: {e}")
             return False
+
+
+# Shared instance so callers reuse one service (and its provider connections)
+_email_service: Optional[EmailService] = None
+
+
+def get_email_service() -> EmailService:
+    """Get the shared email service"""
+    global _email_service
+
+    if _email_service is None:
+        _email_service = EmailService()
+
+    return _email_service
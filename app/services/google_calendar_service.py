@@ -1,16 +1,199 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Optional
+from email import message_from_bytes
+from typing import List, Dict, Any, Optional, Set, Tuple
+import asyncio
+from urllib.parse import quote, urlencode
 import httpx
-import json
+import orjson
+import requests
+import secrets
+import uuid
+from cachetools import TTLCache
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-import base64
-import os
 
 from app.core.config import settings
 from app.core.exceptions import GoogleCalendarError
+from app.core.http_client import get_http_client
+from app.models.google_oauth import GoogleCalendarChannel
+from app.services.google_oauth_service import refresh_token_single_flight
+
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+OAUTH_SCOPES = (
+    "https://www.googleapis.com/auth/calendar.events",
+    "https://www.googleapis.com/auth/calendar.readonly",
+    "openid",
+    "email",
+    "profile"
+)
+CALENDAR_SCOPES = (
+    "https://www.googleapis.com/auth/calendar.events",
+    "https://www.googleapis.com/auth/calendar.readonly"
+)
+OAUTH_CLIENT_CONFIG = {
+    "web": {
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": GOOGLE_TOKEN_URL,
+        "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
+    }
+}
+CALENDAR_API_URL = "https://www.googleapis.com/calendar/v3"
+CALENDAR_BATCH_URL = "https://www.googleapis.com/batch/calendar/v3"
+BATCH_MAX_REQUESTS = 50  # Google's cap on sub-requests per batch call
+FREEBUSY_MAX_ITEMS = 50  # Google's cap on calendars per Free/Busy query
+
+# Request bodies carry datetimes directly; naive values are treated as UTC
+JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+# ICS event template; CR/LF in descriptions are escaped as literal "\n"
+ICS_TIME_FORMAT = '%Y%m%dT%H%M%SZ'
+ICS_NEWLINE_ESCAPES = str.maketrans({"\n": "\\n", "\r": "\\n"})
+ICS_TEMPLATE = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "PRODID:-//Preply//Tutoring Session//EN\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:{start}@preply.com\r\n"
+    "DTSTAMP:{stamp}\r\n"
+    "DTSTART:{start}\r\n"
+    "DTEND:{end}\r\n"
+    "SUMMARY:{summary}\r\n"
+    "DESCRIPTION:{description}\r\n"
+    "{optional_lines}"
+    "END:VEVENT\r\n"
+    "END:VCALENDAR"
+)
+
+
+# Shared google-auth transport; keeps connections to the token endpoint alive
+_refresh_request = Request(session=requests.Session())
+
+# Caps in-flight Google API calls per event loop
+_api_semaphore: Optional[asyncio.Semaphore] = None
+_api_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_api_semaphore() -> asyncio.Semaphore:
+    """Get the outbound Google API semaphore for the running event loop"""
+    global _api_semaphore, _api_semaphore_loop
+    
+    loop = asyncio.get_running_loop()
+    if _api_semaphore is None or _api_semaphore_loop is not loop:
+        _api_semaphore = asyncio.Semaphore(settings.GOOGLE_API_MAX_CONCURRENCY)
+        _api_semaphore_loop = loop
+    
+    return _api_semaphore
+
+
+def _channel_expiration(webhook: Dict[str, Any]) -> datetime:
+    """Channel expiry as a UTC datetime (Google reports epoch milliseconds)"""
+    return datetime.fromtimestamp(int(webhook['expiration']) / 1000, tz=timezone.utc)
+
+
+@dataclass
+class BatchOp:
+    """Single Calendar API call sent as part of a batch request"""
+    method: str
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    body: Optional[Dict[str, Any]] = None
+
+
+class _FreeBusyBatcher:
+    """Coalesce concurrent Free/Busy lookups into multi-calendar queries
+    
+    A lookup is sent at once unless a query for the same access token and
+    time range is already in flight; lookups arriving meanwhile are collected
+    and sent as one Free/Busy request when it completes. A collecting batch
+    is flushed early once it holds ``max_batch_size`` calendars.
+    """
+    
+    def __init__(self, max_batch_size: int = FREEBUSY_MAX_ITEMS):
+        self.max_batch_size = max_batch_size
+        self._in_flight: Set[Tuple[str, datetime, datetime]] = set()
+        self._pending: Dict[Tuple[str, datetime, datetime], Dict[str, List[asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def submit(
+        self,
+        service: "GoogleCalendarService",
+        access_token: str,
+        calendar_id: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Send a lookup, or queue it behind the query in flight for its key"""
+        key = (access_token, start_date, end_date)
+        future = asyncio.get_running_loop().create_future()
+        
+        if key not in self._in_flight:
+            # Nothing to wait for; send immediately
+            self._in_flight.add(key)
+            self._start(service, key, {calendar_id: [future]}, chained=True)
+            return await future
+        
+        batch = self._pending.setdefault(key, {})
+        batch.setdefault(calendar_id, []).append(future)
+        
+        if len(batch) >= self.max_batch_size:
+            del self._pending[key]
+            self._start(service, key, batch, chained=False)
+        
+        return await future
+    
+    def _start(
+        self,
+        service: "GoogleCalendarService",
+        key: Tuple[str, datetime, datetime],
+        batch: Dict[str, List[asyncio.Future]],
+        chained: bool
+    ) -> None:
+        """Send a batch in the background, so a cancelled caller can't abort it for the others"""
+        task = asyncio.create_task(self._flush(service, key, batch, chained))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _flush(
+        self,
+        service: "GoogleCalendarService",
+        key: Tuple[str, datetime, datetime],
+        batch: Dict[str, List[asyncio.Future]],
+        chained: bool
+    ) -> None:
+        """Send one Free/Busy query for a batch and resolve its waiters
+        
+        A chained flush holds the key's in-flight slot and hands it on to
+        the lookups collected while it ran.
+        """
+        access_token, start_date, end_date = key
+        try:
+            busy_times = await service.get_busy_times_multi(
+                access_token, start_date, end_date, list(batch)
+            )
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+        else:
+            for calendar_id, futures in batch.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(busy_times[calendar_id])
+        finally:
+            if chained:
+                next_batch = self._pending.pop(key, None)
+                if next_batch:
+                    self._start(service, key, next_batch, chained=True)
+                else:
+                    self._in_flight.discard(key)
+
+
+_freebusy_batcher = _FreeBusyBatcher()
 
 
 class GoogleCalendarService:
@@ -20,64 +203,37 @@ class GoogleCalendarService:
         self.client_id = settings.GOOGLE_CLIENT_ID
         self.client_secret = settings.GOOGLE_CLIENT_SECRET
         self.redirect_uri = settings.GOOGLE_REDIRECT_URI
+        
+        # Only `state` varies between authorization URLs
+        auth_params = {
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "scope": " ".join(OAUTH_SCOPES),
+            "response_type": "code",
+            "access_type": "offline",
+            "prompt": "consent"
+        }
+        self._auth_url_prefix = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(auth_params)}"
     
     def get_authorization_url(self, state: str = None) -> str:
         """Generate Google OAuth authorization URL"""
-        from google_auth_oauthlib.flow import Flow
-        
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [self.redirect_uri]
-                }
-            },
-            scopes=[
-                "https://www.googleapis.com/auth/calendar.events",
-                "https://www.googleapis.com/auth/calendar.readonly",
-                "openid",
-                "email",
-                "profile"
-            ]
-        )
-        
-        flow.redirect_uri = self.redirect_uri
-        
         if state:
-            flow.state = state
+            return f"{self._auth_url_prefix}&state={quote(state, safe='')}"
         
-        return flow.authorization_url()[0]
+        return self._auth_url_prefix
     
     async def exchange_code_for_tokens(self, code: str) -> Dict[str, Any]:
         """Exchange authorization code for access and refresh tokens"""
         from google_auth_oauthlib.flow import Flow
         
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [self.redirect_uri]
-                }
-            },
-            scopes=[
-                "https://www.googleapis.com/auth/calendar.events",
-                "https://www.googleapis.com/auth/calendar.readonly",
-                "openid",
-                "email",
-                "profile"
-            ]
-        )
+        flow = Flow.from_client_config(OAUTH_CLIENT_CONFIG, scopes=OAUTH_SCOPES)
         
         flow.redirect_uri = self.redirect_uri
         
         try:
-            flow.fetch_token(code=code)
+            # fetch_token is a blocking HTTP call
+            async with _get_api_semaphore():
+                await asyncio.to_thread(flow.fetch_token, code=code)
             credentials = flow.credentials
             
             return {
@@ -101,11 +257,22 @@ class GoogleCalendarService:
         # For now, we'll assume tokens are stored encrypted
         return token
     
+    # Credentials shared across instances, keyed by the stored token pair
+    _credentials_cache: TTLCache = TTLCache(maxsize=10_000, ttl=3000)
+    
     def _get_credentials(self, access_token: str, refresh_token: str = None, expiry: str = None) -> Credentials:
-        """Create Google credentials object from stored tokens"""
+        """Get Google credentials object for stored tokens (cached per token pair)"""
+        cache_key = (access_token, refresh_token)
+        credentials = self._credentials_cache.get(cache_key)
+        if credentials is not None:
+            return credentials
+        
         expiry_dt = None
         if expiry:
-            expiry_dt = datetime.fromisoformat(expiry.replace('Z', '+00:00'))
+            # google-auth expects naive UTC expiry datetimes
+            expiry_dt = datetime.fromisoformat(expiry)
+            if expiry_dt.tzinfo:
+                expiry_dt = expiry_dt.astimezone(timezone.utc).replace(tzinfo=None)
         
         credentials = Credentials(
             token=access_token,
@@ -113,15 +280,213 @@ class GoogleCalendarService:
             token_uri="https://oauth2.googleapis.com/token",
             client_id=self.client_id,
             client_secret=self.client_secret,
-            scopes=[
-                "https://www.googleapis.com/auth/calendar.events",
-                "https://www.googleapis.com/auth/calendar.readonly"
-            ],
+            scopes=CALENDAR_SCOPES,
             expiry=expiry_dt
         )
         
+        self._credentials_cache[cache_key] = credentials
         return credentials
     
+    async def _ensure_fresh(self, credentials: Credentials) -> None:
+        """Refresh expired credentials on the shared async client"""
+        if not (credentials.expired and credentials.refresh_token):
+            return
+        
+        async def refresh() -> Dict[str, Any]:
+            async with _get_api_semaphore():
+                response = await get_http_client().post(
+                    GOOGLE_TOKEN_URL,
+                    data={
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "refresh_token": credentials.refresh_token,
+                        "grant_type": "refresh_token"
+                    }
+                )
+            response.raise_for_status()
+            return response.json()
+        
+        # Share the refreshed token with other workers via Redis
+        token_data = await refresh_token_single_flight(credentials.refresh_token, refresh)
+        
+        # google-auth compares expiry against naive UTC datetimes
+        credentials.token = token_data["access_token"]
+        credentials.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(
+            seconds=token_data.get("expires_in", 3600)
+        )
+    
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        access_token: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Send an authorized request to the Calendar REST API"""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        content = None
+        if body is not None:
+            content = orjson.dumps(body, option=JSON_OPTIONS)
+            headers["Content-Type"] = "application/json"
+        
+        async with _get_api_semaphore():
+            response = await get_http_client().request(
+                method,
+                f"{CALENDAR_API_URL}{path}",
+                params=params,
+                content=content,
+                headers=headers
+            )
+        response.raise_for_status()
+        
+        if response.status_code == 204 or not response.content:
+            return {}
+        
+        return orjson.loads(response.content)
+    
+    def _events_path(self, calendar_id: str, event_id: Optional[str] = None) -> str:
+        """Build the events collection (or single event) path for a calendar"""
+        path = f"/calendars/{quote(calendar_id, safe='')}/events"
+        if event_id:
+            path = f"{path}/{quote(event_id, safe='')}"
+        return path
+    
+    async def batch(self, access_token: str, ops: List[BatchOp]) -> List[Dict[str, Any]]:
+        """Execute Calendar API calls through the multipart batch endpoint
+        
+        Returns one ``{"status": int, "body": dict}`` entry per op, in order.
+        Ops are sent in chunks of at most ``BATCH_MAX_REQUESTS``.
+        """
+        try:
+            credentials = self._get_credentials(access_token)
+            
+            # Refresh token if needed
+            await self._ensure_fresh(credentials)
+            
+            results = []
+            for i in range(0, len(ops), BATCH_MAX_REQUESTS):
+                results.extend(
+                    await self._send_batch(credentials.token, ops[i:i + BATCH_MAX_REQUESTS])
+                )
+            
+            return results
+            
+        except httpx.HTTPStatusError as error:
+            raise GoogleCalendarError(f"Google Calendar API error: {error}")
+        except Exception as e:
+            raise GoogleCalendarError(f"Failed to execute batch request: {str(e)}")
+    
+    async def _send_batch(self, access_token: str, ops: List[BatchOp]) -> List[Dict[str, Any]]:
+        """Send a single multipart/mixed batch request (at most 50 ops)"""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        
+        for index, op in enumerate(ops):
+            path = f"/calendar/v3{op.path}"
+            if op.params:
+                path = f"{path}?{urlencode(op.params)}"
+            
+            part = [
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: <item{index}>",
+                "",
+                f"{op.method} {path} HTTP/1.1",
+            ]
+            if op.body is not None:
+                part.extend([
+                    "Content-Type: application/json",
+                    "",
+                    orjson.dumps(op.body, option=JSON_OPTIONS).decode("utf-8"),
+                ])
+            else:
+                part.append("")
+            parts.append("\r\n".join(part))
+        
+        parts.append(f"--{boundary}--")
+        
+        async with _get_api_semaphore():
+            response = await get_http_client().post(
+                CALENDAR_BATCH_URL,
+                content="\r\n".join(parts).encode("utf-8"),
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": f"multipart/mixed; boundary={boundary}"
+                }
+            )
+        response.raise_for_status()
+        
+        return self._parse_batch_response(
+            response.headers["Content-Type"], response.content, len(ops)
+        )
+    
+    def _parse_batch_response(self, content_type: str, content: bytes, size: int) -> List[Dict[str, Any]]:
+        """Split a multipart/mixed batch response into per-op results"""
+        message = message_from_bytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + content
+        )
+        results: List[Dict[str, Any]] = [{"status": 0, "body": {}} for _ in range(size)]
+        
+        for position, part in enumerate(message.get_payload()):
+            # Content-ID comes back as <response-item{index}>
+            content_id = part.get("Content-ID", "")
+            digits = content_id.strip("<>").rsplit("item", 1)[-1]
+            index = int(digits) if digits.isdigit() else position
+            
+            raw = part.get_payload(decode=True) or b""
+            head, _, body = raw.partition(b"\r\n\r\n")
+            status_line = head.split(b"\r\n", 1)[0].decode("utf-8")
+            status_code = int(status_line.split(" ")[1])
+            body = body.strip()
+            
+            results[index] = {
+                "status": status_code,
+                "body": orjson.loads(body) if body else {}
+            }
+        
+        return results
+    
+    def _build_event_body(
+        self,
+        summary: str,
+        description: str,
+        start_time: datetime,
+        end_time: datetime,
+        attendee_email: Optional[str] = None,
+        location: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the Calendar event resource for a tutoring session"""
+        event = {
+            'summary': summary,
+            'description': description,
+            'start': {
+                'dateTime': start_time,
+                'timeZone': 'UTC',
+            },
+            'end': {
+                'dateTime': end_time,
+                'timeZone': 'UTC',
+            },
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'email', 'minutes': 24 * 60},  # 24 hours
+                    {'method': 'popup', 'minutes': 30},  # 30 minutes
+                ],
+            },
+        }
+        
+        # Add attendee if provided
+        if attendee_email:
+            event['attendees'] = [{'email': attendee_email}]
+        
+        # Add location if provided
+        if location:
+            event['location'] = location
+        
+        return event
+    
     async def get_busy_times(
         self,
         access_token: str,
@@ -129,40 +494,60 @@ class GoogleCalendarService:
         end_date: datetime,
         calendar_id: str = "primary"
     ) -> List[Dict[str, Any]]:
-        """Get busy times from Google Calendar using Free/Busy API"""
+        """Get busy times from Google Calendar using Free/Busy API
+        
+        Concurrent lookups are coalesced into shared multi-calendar queries.
+        """
+        return await _freebusy_batcher.submit(
+            self, access_token, calendar_id, start_date, end_date
+        )
+    
+    async def get_busy_times_multi(
+        self,
+        access_token: str,
+        start_date: datetime,
+        end_date: datetime,
+        calendar_ids: List[str]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get busy times for several calendars with batched Free/Busy queries"""
         try:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-            
-            service = build('calendar', 'v3', credentials=credentials)
+            await self._ensure_fresh(credentials)
             
-            # Prepare request body for free/busy query
-            body = {
-                'timeMin': start_date.isoformat() + 'Z',
-                'timeMax': end_date.isoformat() + 'Z',
-                'items': [{'id': calendar_id}]
+            busy_times: Dict[str, List[Dict[str, Any]]] = {
+                calendar_id: [] for calendar_id in calendar_ids
             }
             
-            # Call the Free/Busy API
-            events_result = service.freebusy().query(body=body).execute()
-            
-            busy_times = []
-            calendars = events_result.get('calendars', {})
-            
-            if calendar_id in calendars:
-                busy_periods = calendars[calendar_id].get('busy', [])
-                for period in busy_periods:
-                    busy_times.append({
-                        'start': period['start'],
-                        'end': period['end']
-                    })
+            for i in range(0, len(calendar_ids), FREEBUSY_MAX_ITEMS):
+                # Prepare request body for free/busy query
+                body = {
+                    'timeMin': start_date,
+                    'timeMax': end_date,
+                    'items': [
+                        {'id': calendar_id}
+                        for calendar_id in calendar_ids[i:i + FREEBUSY_MAX_ITEMS]
+                    ]
+                }
+                
+                # Call the Free/Busy API
+                events_result = await self._request(
+                    "POST", "/freeBusy", credentials.token, body=body
+                )
+                
+                calendars = events_result.get('calendars', {})
+                
+                for calendar_id, calendar in calendars.items():
+                    if calendar_id in busy_times:
+                        busy_times[calendar_id].extend(
+                            {'start': period['start'], 'end': period['end']}
+                            for period in calendar.get('busy', [])
+                        )
             
             return busy_times
             
-        except HttpError as error:
+        except httpx.HTTPStatusError as error:
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to get busy times: {str(e)}")
@@ -183,54 +568,57 @@ class GoogleCalendarService:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-            
-            service = build('calendar', 'v3', credentials=credentials)
+            await self._ensure_fresh(credentials)
             
             # Prepare event body
-            event = {
-                'summary': summary,
-                'description': description,
-                'start': {
-                    'dateTime': start_time.isoformat(),
-                    'timeZone': 'UTC',
-                },
-                'end': {
-                    'dateTime': end_time.isoformat(),
-                    'timeZone': 'UTC',
-                },
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'email', 'minutes': 24 * 60},  # 24 hours
-                        {'method': 'popup', 'minutes': 30},  # 30 minutes
-                    ],
-                },
-            }
-            
-            # Add attendee if provided
-            if attendee_email:
-                event['attendees'] = [{'email': attendee_email}]
-            
-            # Add location if provided
-            if location:
-                event['location'] = location
+            event = self._build_event_body(
+                summary, description, start_time, end_time, attendee_email, location
+            )
             
             # Create the event
-            event_result = service.events().insert(
-                calendarId=calendar_id,
-                body=event,
-                sendUpdates='all'  # Send email notifications to attendees
-            ).execute()
+            event_result = await self._request(
+                "POST",
+                self._events_path(calendar_id),
+                credentials.token,
+                params={'sendUpdates': 'all'},  # Send email notifications to attendees
+                body=event
+            )
             
             return event_result['id']
             
-        except HttpError as error:
+        except httpx.HTTPStatusError as error:
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to create event: {str(e)}")
     
+    async def create_events(
+        self,
+        access_token: str,
+        events: List[Dict[str, Any]],
+        calendar_id: str = "primary"
+    ) -> List[Optional[str]]:
+        """Create several Google Calendar events in batched round-trips
+        
+        Each item takes the same keyword arguments as ``create_event``.
+        Returns the created event ids in order (``None`` for failed items).
+        """
+        ops = [
+            BatchOp(
+                method="POST",
+                path=self._events_path(calendar_id),
+                params={'sendUpdates': 'all'},
+                body=self._build_event_body(**event)
+            )
+            for event in events
+        ]
+        
+        results = await self.batch(access_token, ops)
+        
+        return [
+            result["body"].get("id") if 200 <= result["status"] < 300 else None
+            for result in results
+        ]
+    
     async def update_event(
         self,
         access_token: str,
@@ -246,38 +634,31 @@ class GoogleCalendarService:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
+            await self._ensure_fresh(credentials)
             
-            service = build('calendar', 'v3', credentials=credentials)
-            
-            # Get existing event
-            event = service.events().get(
-                calendarId=calendar_id,
-                eventId=event_id
-            ).execute()
-            
-            # Update fields if provided
+            # Send only the changed fields; PATCH needs no prior GET
+            patch_body = {}
             if summary:
-                event['summary'] = summary
+                patch_body['summary'] = summary
             if description:
-                event['description'] = description
+                patch_body['description'] = description
             if start_time:
-                event['start']['dateTime'] = start_time.isoformat()
+                patch_body['start'] = {'dateTime': start_time, 'timeZone': 'UTC'}
             if end_time:
-                event['end']['dateTime'] = end_time.isoformat()
+                patch_body['end'] = {'dateTime': end_time, 'timeZone': 'UTC'}
             
             # Update the event
-            updated_event = service.events().update(
-                calendarId=calendar_id,
-                eventId=event_id,
-                body=event,
-                sendUpdates='all'
-            ).execute()
+            updated_event = await self._request(
+                "PATCH",
+                self._events_path(calendar_id, event_id),
+                credentials.token,
+                params={'sendUpdates': 'all'},
+                body=patch_body
+            )
             
             return updated_event
             
-        except HttpError as error:
+        except httpx.HTTPStatusError as error:
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to update event: {str(e)}")
@@ -293,41 +674,122 @@ class GoogleCalendarService:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-            
-            service = build('calendar', 'v3', credentials=credentials)
+            await self._ensure_fresh(credentials)
             
             # Delete the event
-            service.events().delete(
-                calendarId=calendar_id,
-                eventId=event_id,
-                sendUpdates='all'
-            ).execute()
+            await self._request(
+                "DELETE",
+                self._events_path(calendar_id, event_id),
+                credentials.token,
+                params={'sendUpdates': 'all'}
+            )
             
             return True
             
-        except HttpError as error:
-            if error.resp.status == 404:
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code in (404, 410):
                 # Event already deleted or doesn't exist
                 return True
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to delete event: {str(e)}")
     
+    async def delete_events(
+        self,
+        access_token: str,
+        event_ids: List[str],
+        calendar_id: str = "primary"
+    ) -> List[bool]:
+        """Delete several Google Calendar events in batched round-trips"""
+        ops = [
+            BatchOp(
+                method="DELETE",
+                path=self._events_path(calendar_id, event_id),
+                params={'sendUpdates': 'all'}
+            )
+            for event_id in event_ids
+        ]
+        
+        results = await self.batch(access_token, ops)
+        
+        # Events already deleted or missing count as deleted
+        return [
+            200 <= result["status"] < 300 or result["status"] in (404, 410)
+            for result in results
+        ]
+    
+    async def sync_events(
+        self,
+        access_token: str,
+        calendar_id: str = "primary",
+        sync_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List events changed since `sync_token` and return the next sync token
+        
+        Without a token (or once Google expires it with 410 Gone) a full
+        listing of upcoming events is done to obtain a fresh token.
+        """
+        try:
+            credentials = self._get_credentials(access_token)
+            
+            # Refresh token if needed
+            await self._ensure_fresh(credentials)
+            
+            if sync_token:
+                params = {'syncToken': sync_token, 'showDeleted': 'true'}
+            else:
+                params = {
+                    'timeMin': datetime.now(timezone.utc).isoformat(),
+                    'showDeleted': 'true'
+                }
+            
+            events = []
+            while True:
+                page = await self._request(
+                    "GET", self._events_path(calendar_id), credentials.token, params=params
+                )
+                events.extend(page.get('items', []))
+                
+                if not page.get('nextPageToken'):
+                    return events, page.get('nextSyncToken')
+                params['pageToken'] = page['nextPageToken']
+            
+        except httpx.HTTPStatusError as error:
+            if sync_token and error.response.status_code == 410:
+                # Sync token expired; start over with a full listing
+                return await self.sync_events(access_token, calendar_id)
+            raise GoogleCalendarError(f"Google Calendar API error: {error}")
+        except Exception as e:
+            raise GoogleCalendarError(f"Failed to sync events: {str(e)}")
+    
+    async def sync_channel_events(
+        self,
+        access_token: str,
+        channel: GoogleCalendarChannel
+    ) -> List[Dict[str, Any]]:
+        """Fetch changes for a watched calendar after a push notification
+        
+        The new sync token is stored on `channel` (caller commits).
+        """
+        events, next_sync_token = await self.sync_events(
+            access_token, channel.calendar_id, channel.sync_token
+        )
+        channel.sync_token = next_sync_token
+        
+        return events
+    
     async def get_calendar_list(self, access_token: str) -> List[Dict[str, Any]]:
         """Get list of user's calendars"""
         try:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-            
-            service = build('calendar', 'v3', credentials=credentials)
+            await self._ensure_fresh(credentials)
             
             # Get calendar list
-            calendar_list = service.calendarList().list().execute()
+            calendar_list = await self._request(
+                "GET", "/users/me/calendarList", credentials.token
+            )
             
             calendars = []
             for calendar in calendar_list.get('items', []):
@@ -340,7 +802,7 @@ class GoogleCalendarService:
             
             return calendars
             
-        except HttpError as error:
+        except httpx.HTTPStatusError as error:
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to get calendar list: {str(e)}")
@@ -356,8 +818,9 @@ class GoogleCalendarService:
                 client_secret=self.client_secret
             )
             
-            # Refresh the token
-            credentials.refresh(Request())
+            # Refresh the token (blocking HTTP call, run off the event loop)
+            async with _get_api_semaphore():
+                await asyncio.to_thread(credentials.refresh, _refresh_request)
             
             return {
                 "access_token": credentials.token,
@@ -377,31 +840,22 @@ class GoogleCalendarService:
         attendee_email: Optional[str] = None
     ) -> str:
         """Generate ICS file content for calendar event"""
-        ics_content = [
-            "BEGIN:VCALENDAR",
-            "VERSION:2.0",
-            "PRODID:-//Preply//Tutoring Session//EN",
-            "BEGIN:VEVENT",
-            f"UID:{start_time.strftime('%Y%m%dT%H%M%SZ')}@preply.com",
-            f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
-            f"DTSTART:{start_time.strftime('%Y%m%dT%H%M%SZ')}",
-            f"DTEND:{end_time.strftime('%Y%m%dT%H%M%SZ')}",
-            f"SUMMARY:{summary}",
-            f"DESCRIPTION:{description.replace(chr(10), '\\n').replace(chr(13), '\\n')}",
-        ]
+        start = start_time.strftime(ICS_TIME_FORMAT)
         
+        optional_lines = ""
         if location:
-            ics_content.append(f"LOCATION:{location}")
-        
+            optional_lines += f"LOCATION:{location}\r\n"
         if attendee_email:
-            ics_content.append(f"ATTENDEE:mailto:{attendee_email}")
+            optional_lines += f"ATTENDEE:mailto:{attendee_email}\r\n"
         
-        ics_content.extend([
-            "END:VEVENT",
-            "END:VCALENDAR"
-        ])
-        
-        return "\r\n".join(ics_content)
+        return ICS_TEMPLATE.format(
+            start=start,
+            stamp=datetime.now(timezone.utc).strftime(ICS_TIME_FORMAT),
+            end=end_time.strftime(ICS_TIME_FORMAT),
+            summary=summary,
+            description=description.translate(ICS_NEWLINE_ESCAPES),
+            optional_lines=optional_lines
+        )
     
     async def setup_webhook(
         self,
@@ -414,24 +868,23 @@ class GoogleCalendarService:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-            
-            service = build('calendar', 'v3', credentials=credentials)
+            await self._ensure_fresh(credentials)
             
             # Create webhook channel
             channel = {
-                'id': f"preply-{calendar_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                'id': f"preply-{calendar_id[:20]}-{secrets.token_urlsafe(12)}",
                 'type': 'web_hook',
                 'address': webhook_url,
                 'expiration': int((datetime.now() + timedelta(days=7)).timestamp() * 1000)  # 7 days
             }
             
             # Set up the webhook
-            result = service.events().watch(
-                calendarId=calendar_id,
+            result = await self._request(
+                "POST",
+                f"{self._events_path(calendar_id)}/watch",
+                credentials.token,
                 body=channel
-            ).execute()
+            )
             
             return {
                 'channel_id': result['id'],
@@ -439,11 +892,62 @@ class GoogleCalendarService:
                 'expiration': result['expiration']
             }
             
-        except HttpError as error:
+        except httpx.HTTPStatusError as error:
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to setup webhook: {str(e)}")
     
+    async def watch_calendar(
+        self,
+        access_token: str,
+        user_id: str,
+        calendar_id: str = "primary"
+    ) -> GoogleCalendarChannel:
+        """Start push notifications for a calendar
+        
+        Returns the new channel row; the caller adds and commits it.
+        """
+        result = await self.setup_webhook(
+            access_token=access_token,
+            webhook_url=settings.GOOGLE_CALENDAR_WEBHOOK_URL,
+            calendar_id=calendar_id
+        )
+        
+        return GoogleCalendarChannel(
+            user_id=user_id,
+            calendar_id=calendar_id,
+            address=settings.GOOGLE_CALENDAR_WEBHOOK_URL,
+            channel_id=result['channel_id'],
+            resource_id=result['resource_id'],
+            expiration=_channel_expiration(result)
+        )
+    
+    async def refresh_webhook_if_expiring(
+        self,
+        access_token: str,
+        channel: GoogleCalendarChannel,
+        margin: timedelta = timedelta(days=1)
+    ) -> bool:
+        """Renew a stored webhook channel if it expires within `margin`
+        
+        The replacement channel is written onto `channel` (caller commits).
+        The old channel is not stopped; Google expires it on its own.
+        """
+        if channel.expiration - datetime.now(timezone.utc) >= margin:
+            return False
+        
+        result = await self.setup_webhook(
+            access_token=access_token,
+            webhook_url=channel.address,
+            calendar_id=channel.calendar_id
+        )
+        
+        channel.channel_id = result['channel_id']
+        channel.resource_id = result['resource_id']
+        channel.expiration = _channel_expiration(result)
+        
+        return True
+    
     async def stop_webhook(
         self,
         access_token: str,
@@ -455,20 +959,22 @@ class GoogleCalendarService:
             credentials = self._get_credentials(access_token)
             
             # Refresh token if needed
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-            
-            service = build('calendar', 'v3', credentials=credentials)
+            await self._ensure_fresh(credentials)
             
             # Stop the webhook
-            service.channels().stop(body={
-                'id': channel_id,
-                'resourceId': resource_id
-            }).execute()
+            await self._request(
+                "POST",
+                "/channels/stop",
+                credentials.token,
+                body={
+                    'id': channel_id,
+                    'resourceId': resource_id
+                }
+            )
             
             return True
             
-        except HttpError as error:
+        except httpx.HTTPStatusError as error:
             raise GoogleCalendarError(f"Google Calendar API error: {error}")
         except Exception as e:
             raise GoogleCalendarError(f"Failed to stop webhook: {str(e)}")
@@ -1,9 +1,105 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Callable, Awaitable
 import aiohttp
+import asyncio
+import hashlib
+import logging
+import time
+import orjson
+from redis.exceptions import RedisError
 from urllib.parse import urlencode
 
 from app.core.config import settings
 from app.core.exceptions import OAuthError
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# Long-lived session shared by all GoogleOAuthService instances
+_session: Optional[aiohttp.ClientSession] = None
+
+# Refreshed access tokens are shared across workers through Redis
+TOKEN_CACHE_PREFIX = "oauth:google:"
+TOKEN_REFRESH_LEASE_SECONDS = 10
+TOKEN_EXPIRY_MARGIN_SECONDS = 60
+
+
+async def close_oauth_session():
+    """Close the shared Google OAuth HTTP session"""
+    global _session
+    
+    if _session is not None and not _session.closed:
+        await _session.close()
+    
+    _session = None
+
+
+async def refresh_token_single_flight(
+    refresh_token: str,
+    refresh: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """Get a fresh access token for `refresh_token`, refreshing once across workers
+    
+    `refresh` performs the actual token request and must return a dict with
+    `access_token` and `expires_in`. Results are cached in Redis until shortly
+    before expiry; a short SETNX lease makes sure only one worker calls Google
+    while the others wait for the cached result. Without Redis this simply
+    calls `refresh`.
+    """
+    redis = get_redis()
+    if redis is None:
+        return await refresh()
+    
+    key = f"{TOKEN_CACHE_PREFIX}{hashlib.sha256(refresh_token.encode()).hexdigest()}"
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + TOKEN_REFRESH_LEASE_SECONDS
+    
+    try:
+        while True:
+            cached = await redis.get(key)
+            if cached:
+                token = orjson.loads(cached)
+                return {
+                    "access_token": token["access_token"],
+                    "expires_in": int(token["expires_at"] - time.time()),
+                    "token_type": "Bearer"
+                }
+            
+            if await redis.set(lock_key, "1", nx=True, ex=TOKEN_REFRESH_LEASE_SECONDS):
+                break
+            
+            if time.monotonic() > deadline:
+                # Lease holder never published a token; refresh ourselves
+                return await refresh()
+            
+            await asyncio.sleep(0.1)
+    except RedisError:
+        return await refresh()
+    
+    try:
+        token_data = await refresh()
+        
+        ttl = int(token_data.get("expires_in") or 3600) - TOKEN_EXPIRY_MARGIN_SECONDS
+        if ttl > 0:
+            try:
+                await redis.set(
+                    key,
+                    orjson.dumps({
+                        "access_token": token_data["access_token"],
+                        "expires_at": time.time() + ttl + TOKEN_EXPIRY_MARGIN_SECONDS
+                    }),
+                    ex=ttl
+                )
+            except RedisError:
+                # The refresh itself succeeded; other workers just refresh on their own
+                logger.warning("OAuth token cache unavailable", exc_info=True)
+        
+        return token_data
+    finally:
+        try:
+            await redis.delete(lock_key)
+        except RedisError:
+            pass
 
 
 class GoogleOAuthService:
@@ -15,6 +111,17 @@ class GoogleOAuthService:
         self.redirect_uri = settings.GOOGLE_REDIRECT_URI
         self.scope = "https://www.googleapis.com/auth/calendar"
     
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it on first use"""
+        global _session
+        
+        if _session is None or _session.closed:
+            _session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+            )
+        
+        return _session
+    
     def get_authorization_url(self, state: str) -> str:
         """Generate Google OAuth authorization URL"""
         try:
@@ -47,53 +154,56 @@ class GoogleOAuthService:
                 "redirect_uri": self.redirect_uri
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(token_url, data=data) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        raise OAuthError(f"Token exchange failed: {error_data}")
-                    
-                    token_data = await response.json()
-                    
-                    return {
-                        "access_token": token_data.get("access_token"),
-                        "refresh_token": token_data.get("refresh_token"),
-                        "expires_in": token_data.get("expires_in"),
-                        "token_type": token_data.get("token_type")
-                    }
-                    
+            async with (await self._get_session()).post(token_url, data=data) as response:
+                if response.status != 200:
+                    error_data = await response.json()
+                    raise OAuthError(f"Token exchange failed: {error_data}")
+                
+                token_data = await response.json()
+                
+                return {
+                    "access_token": token_data.get("access_token"),
+                    "refresh_token": token_data.get("refresh_token"),
+                    "expires_in": token_data.get("expires_in"),
+                    "token_type": token_data.get("token_type")
+                }
+                
         except Exception as e:
             raise OAuthError(f"Failed to exchange code for tokens: {str(e)}")
     
     async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """Refresh access token using refresh token"""
         try:
-            token_url = "https://oauth2.googleapis.com/token"
-            
-            data = {
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "refresh_token": refresh_token,
-                "grant_type": "refresh_token"
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(token_url, data=data) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        raise OAuthError(f"Token refresh failed: {error_data}")
-                    
-                    token_data = await response.json()
-                    
-                    return {
-                        "access_token": token_data.get("access_token"),
-                        "expires_in": token_data.get("expires_in"),
-                        "token_type": token_data.get("token_type")
-                    }
-                    
+            return await refresh_token_single_flight(
+                refresh_token, lambda: self._request_token_refresh(refresh_token)
+            )
         except Exception as e:
             raise OAuthError(f"Failed to refresh access token: {str(e)}")
     
+    async def _request_token_refresh(self, refresh_token: str) -> Dict[str, Any]:
+        """Call Google's token endpoint with the refresh_token grant"""
+        token_url = "https://oauth2.googleapis.com/token"
+        
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "refresh_token": refresh_token,
+            "grant_type": "refresh_token"
+        }
+        
+        async with (await self._get_session()).post(token_url, data=data) as response:
+            if response.status != 200:
+                error_data = await response.json()
+                raise OAuthError(f"Token refresh failed: {error_data}")
+            
+            token_data = await response.json()
+            
+            return {
+                "access_token": token_data.get("access_token"),
+                "expires_in": token_data.get("expires_in"),
+                "token_type": token_data.get("token_type")
+            }
+    
     async def get_user_info(self, access_token: str) -> Dict[str, Any]:
         """Get user information from Google"""
         try:
@@ -103,23 +213,22 @@ class GoogleOAuthService:
                 "Authorization": f"Bearer {access_token}"
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(userinfo_url, headers=headers) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        raise OAuthError(f"Failed to get user info: {error_data}")
-                    
-                    user_data = await response.json()
-                    
-                    return {
-                        "id": user_data.get("id"),
-                        "email": user_data.get("email"),
-                        "name": user_data.get("name"),
-                        "given_name": user_data.get("given_name"),
-                        "family_name": user_data.get("family_name"),
-                        "picture": user_data.get("picture")
-                    }
-                    
+            async with (await self._get_session()).get(userinfo_url, headers=headers) as response:
+                if response.status != 200:
+                    error_data = await response.json()
+                    raise OAuthError(f"Failed to get user info: {error_data}")
+                
+                user_data = await response.json()
+                
+                return {
+                    "id": user_data.get("id"),
+                    "email": user_data.get("email"),
+                    "name": user_data.get("name"),
+                    "given_name": user_data.get("given_name"),
+                    "family_name": user_data.get("family_name"),
+                    "picture": user_data.get("picture")
+                }
+                
         except Exception as e:
             raise OAuthError(f"Failed to get user info: {str(e)}")
     
@@ -132,9 +241,8 @@ class GoogleOAuthService:
                 "token": token
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(revoke_url, data=data) as response:
-                    return response.status == 200
-                    
+            async with (await self._get_session()).post(revoke_url, data=data) as response:
+                return response.status == 200
+                
         except Exception as e:
             raise OAuthError(f"Failed to revoke token: {str(e)}")
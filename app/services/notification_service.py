@@ -1,222 +1,349 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, NamedTuple, Optional, Set, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-import json
+from sqlalchemy import select, insert, update, func, and_, or_
+from sqlalchemy.orm import selectinload, undefer
+from redis.exceptions import RedisError
+import asyncio
+import logging
+import orjson
+import uuid
 
-from app.models.booking import Booking
+from app.models.booking import Booking, BookingStatus
 from app.models.user import User
 from app.models.notification import Notification, NotificationType, NotificationDelivery, NotificationStatus
 from app.models.tutor_profile import TutorProfile
 from app.models.student_profile import StudentProfile
-from app.services.email_service import EmailService
-from app.services.sms_service import SMSService
+from app.services.email_service import EmailService, get_email_service
+from app.services.sms_service import SMSService, get_sms_service
 from app.core.config import settings
+from app.core.database import JSON_OPTIONS
+from app.core.exceptions import NotificationError
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Upcoming bookings are streamed in batches; reminder sends are capped in flight
+REMINDER_BATCH_SIZE = 500
+REMINDER_MAX_CONCURRENCY = 50
+
+# Booking emails go out as one task per recipient, so a retry resends only the failed one
+BOOKING_EMAIL_RECIPIENTS = ("student", "tutor")
+
+# Completed bookings notified per contact lookup and insert
+COMPLETION_BATCH_SIZE = 500
+
+# In-app batches at least this large serialize their payloads off the event loop
+PAYLOAD_OFFLOAD_THRESHOLD = 200
+
+# Redis keys short-circuiting duplicate reminder dispatches across workers
+REMINDER_DEDUPE_PREFIX = "reminder:"
+REMINDER_DEDUPE_TTL_SECONDS = 24 * 60 * 60
+
+# Cached per-user unread notification counts. Counters are only adjusted
+# while present (a missing key is backfilled from the database on read),
+# and expire so any drift from rolled-back writes heals itself.
+UNREAD_COUNT_PREFIX = "notif:unread:"
+UNREAD_COUNT_TTL_SECONDS = 24 * 60 * 60
+UNREAD_COUNT_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+# Per-window flags recording that a booking's reminder went out
+REMINDER_SENT_FLAGS = {
+    "24h": Booking.reminder_sent_24h,
+    "2h": Booking.reminder_sent_2h,
+}
+
+# Notifications only need these user columns
+USER_CONTACT_COLUMNS = (User.id, User.email, User.name, User.phone_number)
+
+
+class UserContact(NamedTuple):
+    """Lightweight user row carrying just what notifications need"""
+    id: Any
+    email: str
+    name: str
+    phone_number: Optional[str]
+    
+    @classmethod
+    def of(cls, user: User) -> "UserContact":
+        """Build contact details from an already-loaded User"""
+        return cls(user.id, user.email, user.name, user.phone_number)
 
 
 class NotificationService:
     """Comprehensive notification service for booking and system notifications"""
     
-    def __init__(self, db: AsyncSession = None):
+    def __init__(
+        self,
+        db: AsyncSession = None,
+        email_service: Optional[EmailService] = None,
+        sms_service: Optional[SMSService] = None,
+        raise_errors: bool = False
+    ):
         self.db = db
-        self.email_service = EmailService()
-        self.sms_service = SMSService()
+        # Background tasks re-raise delivery failures so Celery can retry them
+        self.raise_errors = raise_errors
+        self.email_service = email_service or get_email_service()
+        self.sms_service = sms_service or get_sms_service()
+        # In-flight user lookups, so concurrent requests for one user share a SELECT
+        self._user_lookups: Dict[uuid.UUID, asyncio.Future] = {}
     
-    async def send_booking_confirmation_email(self, booking: Booking) -> None:
-        """Send booking confirmation email to both tutor and student"""
+    async def send_booking_confirmation_email(self, booking: Booking, recipient: str) -> None:
+        """Send the booking confirmation email to one side of the booking"""
         try:
             # Get user details
-            tutor = await self._get_user_details(booking.tutor_id)
-            student = await self._get_user_details(booking.student_id)
+            tutor, student = await self._get_booking_users(booking)
             
             if not tutor or not student:
                 return
             
-            # Email to student
-            await self.email_service.send_booking_confirmation_student(
-                to_email=student.email,
-                student_name=student.name,
-                tutor_name=tutor.name,
-                start_time=booking.start_at,
-                end_time=booking.end_at,
-                subject="Tutoring Session Confirmed",
-                join_link=booking.join_link
-            )
-            
-            # Email to tutor
-            await self.email_service.send_booking_confirmation_tutor(
-                to_email=tutor.email,
-                tutor_name=tutor.name,
-                student_name=student.name,
-                start_time=booking.start_at,
-                end_time=booking.end_at,
-                subject="New Tutoring Session Booked"
-            )
+            if recipient == "student":
+                sent = await self.email_service.send_booking_confirmation_student(
+                    to_email=student.email,
+                    student_name=student.name,
+                    tutor_name=tutor.name,
+                    start_time=booking.start_at,
+                    end_time=booking.end_at,
+                    subject="Tutoring Session Confirmed",
+                    join_link=booking.join_link
+                )
+            else:
+                sent = await self.email_service.send_booking_confirmation_tutor(
+                    to_email=tutor.email,
+                    tutor_name=tutor.name,
+                    student_name=student.name,
+                    start_time=booking.start_at,
+                    end_time=booking.end_at,
+                    subject="New Tutoring Session Booked"
+                )
+            self._check_sent(sent)
             
-        except Exception as e:
-            print(f"Error sending booking confirmation email: {e}")
+        except Exception:
+            logger.exception("Error sending booking confirmation email")
+            if self.raise_errors:
+                raise
     
     async def send_booking_confirmation_notification(self, booking: Booking) -> None:
         """Send in-app booking confirmation notification"""
         try:
-            # Create notification for student
-            student_notification = Notification(
-                user_id=booking.student_id,
-                type=NotificationType.BOOKING_CONFIRMATION,
-                payload=json.dumps({
-                    "booking_id": str(booking.id),
-                    "tutor_name": await self._get_user_name(booking.tutor_id),
-                    "start_time": booking.start_at.isoformat(),
-                    "end_time": booking.end_at.isoformat(),
-                    "join_link": booking.join_link
-                }),
-                delivery=NotificationDelivery.INAPP,
-                status=NotificationStatus.PENDING
-            )
+            if not self.db:
+                return
             
-            # Create notification for tutor
-            tutor_notification = Notification(
-                user_id=booking.tutor_id,
-                type=NotificationType.BOOKING_CONFIRMATION,
-                payload=json.dumps({
-                    "booking_id": str(booking.id),
-                    "student_name": await self._get_user_name(booking.student_id),
-                    "start_time": booking.start_at.isoformat(),
-                    "end_time": booking.end_at.isoformat()
-                }),
-                delivery=NotificationDelivery.INAPP,
-                status=NotificationStatus.PENDING
-            )
+            tutor, student = await self._get_booking_users(booking)
+            base_payload = self._booking_payload(booking)
             
-            if self.db:
-                self.db.add(student_notification)
-                self.db.add(tutor_notification)
-                await self.db.commit()
+            await self._bulk_create_inapp([
+                # Notification for student
+                self._inapp_row(
+                    user_id=booking.student_id,
+                    notification_type=NotificationType.BOOKING_CONFIRMATION,
+                    payload={
+                        **base_payload,
+                        "tutor_name": tutor.name if tutor else "Unknown User",
+                        "join_link": booking.join_link
+                    }
+                ),
+                # Notification for tutor
+                self._inapp_row(
+                    user_id=booking.tutor_id,
+                    notification_type=NotificationType.BOOKING_CONFIRMATION,
+                    payload={
+                        **base_payload,
+                        "student_name": student.name if student else "Unknown User"
+                    }
+                )
+            ])
+            await self.db.commit()
             
-        except Exception as e:
-            print(f"Error sending booking confirmation notification: {e}")
+        except Exception:
+            logger.exception("Error sending booking confirmation notification")
+            if self.raise_errors:
+                raise
     
-    async def send_booking_cancellation_notification(self, booking: Booking) -> None:
-        """Send booking cancellation notification"""
+    async def send_booking_cancellation_email(self, booking: Booking, recipient: str) -> None:
+        """Send the booking cancellation email to one side of the booking"""
         try:
             # Get user details
-            tutor = await self._get_user_details(booking.tutor_id)
-            student = await self._get_user_details(booking.student_id)
+            tutor, student = await self._get_booking_users(booking)
             
             if not tutor or not student:
                 return
             
-            # Email to student
-            await self.email_service.send_booking_cancellation_student(
-                to_email=student.email,
-                student_name=student.name,
-                tutor_name=tutor.name,
-                start_time=booking.start_at,
-                end_time=booking.end_at,
-                subject="Tutoring Session Cancelled"
-            )
+            if recipient == "student":
+                sent = await self.email_service.send_booking_cancellation_student(
+                    to_email=student.email,
+                    student_name=student.name,
+                    tutor_name=tutor.name,
+                    start_time=booking.start_at,
+                    end_time=booking.end_at,
+                    subject="Tutoring Session Cancelled"
+                )
+            else:
+                sent = await self.email_service.send_booking_cancellation_tutor(
+                    to_email=tutor.email,
+                    tutor_name=tutor.name,
+                    student_name=student.name,
+                    start_time=booking.start_at,
+                    end_time=booking.end_at,
+                    subject="Tutoring Session Cancelled"
+                )
+            self._check_sent(sent)
             
-            # Email to tutor
-            await self.email_service.send_booking_cancellation_tutor(
-                to_email=tutor.email,
-                tutor_name=tutor.name,
-                student_name=student.name,
-                start_time=booking.start_at,
-                end_time=booking.end_at,
-                subject="Tutoring Session Cancelled"
-            )
+        except Exception:
+            logger.exception("Error sending booking cancellation email")
+            if self.raise_errors:
+                raise
+    
+    async def send_booking_cancellation_notification(self, booking: Booking) -> None:
+        """Send in-app booking cancellation notification"""
+        try:
+            if not self.db:
+                return
             
-            # In-app notifications
-            await self._create_inapp_notification(
-                user_id=booking.student_id,
-                notification_type=NotificationType.BOOKING_CANCELLATION,
-                payload={
-                    "booking_id": str(booking.id),
-                    "tutor_name": tutor.name,
-                    "start_time": booking.start_at.isoformat(),
-                    "end_time": booking.end_at.isoformat()
-                }
-            )
+            # Get user details
+            tutor, student = await self._get_booking_users(booking)
             
-            await self._create_inapp_notification(
-                user_id=booking.tutor_id,
-                notification_type=NotificationType.BOOKING_CANCELLATION,
-                payload={
-                    "booking_id": str(booking.id),
-                    "student_name": student.name,
-                    "start_time": booking.start_at.isoformat(),
-                    "end_time": booking.end_at.isoformat()
-                }
-            )
+            if not tutor or not student:
+                return
+            
+            base_payload = self._booking_payload(booking)
+            await self._bulk_create_inapp([
+                self._inapp_row(
+                    user_id=booking.student_id,
+                    notification_type=NotificationType.BOOKING_CANCELLATION,
+                    payload={**base_payload, "tutor_name": tutor.name}
+                ),
+                self._inapp_row(
+                    user_id=booking.tutor_id,
+                    notification_type=NotificationType.BOOKING_CANCELLATION,
+                    payload={**base_payload, "student_name": student.name}
+                )
+            ])
+            await self.db.commit()
+            
+        except Exception:
+            logger.exception("Error sending booking cancellation notification")
+            if self.raise_errors:
+                raise
+    
+    async def send_booking_completion_notifications(self, bookings: List[Any]) -> None:
+        """Send in-app notifications for bookings marked as completed
+        
+        Accepts Booking objects or rows carrying their id, student_id, tutor_id,
+        start_at and end_at. Notifications are written in batches, one contact
+        lookup and one insert per batch, so a large backlog never becomes a
+        single huge statement.
+        """
+        try:
+            if not self.db or not bookings:
+                return
             
-        except Exception as e:
-            print(f"Error sending booking cancellation notification: {e}")
+            for i in range(0, len(bookings), COMPLETION_BATCH_SIZE):
+                batch = bookings[i:i + COMPLETION_BATCH_SIZE]
+                contacts = await self._get_user_contacts(
+                    {booking.tutor_id for booking in batch} | {booking.student_id for booking in batch}
+                )
+                
+                rows = []
+                for booking in batch:
+                    tutor, student = contacts.get(booking.tutor_id), contacts.get(booking.student_id)
+                    base_payload = self._booking_payload(booking)
+                    rows.append(self._inapp_row(
+                        user_id=booking.student_id,
+                        notification_type=NotificationType.BOOKING_COMPLETED,
+                        payload={**base_payload, "tutor_name": tutor.name if tutor else "Unknown User"}
+                    ))
+                    rows.append(self._inapp_row(
+                        user_id=booking.tutor_id,
+                        notification_type=NotificationType.BOOKING_COMPLETED,
+                        payload={**base_payload, "student_name": student.name if student else "Unknown User"}
+                    ))
+                
+                await self._bulk_create_inapp(rows)
+                await self.db.commit()
+            
+        except Exception:
+            logger.exception("Error sending booking completion notifications")
     
-    async def send_booking_reschedule_notification(
+    async def send_booking_reschedule_email(
         self,
         new_booking: Booking,
-        old_booking: Booking
+        old_booking: Booking,
+        recipient: str
     ) -> None:
-        """Send booking reschedule notification"""
+        """Send the booking reschedule email to one side of the booking"""
         try:
             # Get user details
-            tutor = await self._get_user_details(new_booking.tutor_id)
-            student = await self._get_user_details(new_booking.student_id)
+            tutor, student = await self._get_booking_users(new_booking)
             
             if not tutor or not student:
                 return
             
-            # Email to student
-            await self.email_service.send_booking_reschedule_student(
-                to_email=student.email,
-                student_name=student.name,
-                tutor_name=tutor.name,
-                old_start_time=old_booking.start_at,
-                old_end_time=old_booking.end_at,
-                new_start_time=new_booking.start_at,
-                new_end_time=new_booking.end_at,
-                subject="Tutoring Session Rescheduled"
-            )
+            if recipient == "student":
+                sent = await self.email_service.send_booking_reschedule_student(
+                    to_email=student.email,
+                    student_name=student.name,
+                    tutor_name=tutor.name,
+                    old_start_time=old_booking.start_at,
+                    old_end_time=old_booking.end_at,
+                    new_start_time=new_booking.start_at,
+                    new_end_time=new_booking.end_at,
+                    subject="Tutoring Session Rescheduled"
+                )
+            else:
+                sent = await self.email_service.send_booking_reschedule_tutor(
+                    to_email=tutor.email,
+                    tutor_name=tutor.name,
+                    student_name=student.name,
+                    old_start_time=old_booking.start_at,
+                    old_end_time=old_booking.end_at,
+                    new_start_time=new_booking.start_at,
+                    new_end_time=new_booking.end_at,
+                    subject="Tutoring Session Rescheduled"
+                )
+            self._check_sent(sent)
             
-            # Email to tutor
-            await self.email_service.send_booking_reschedule_tutor(
-                to_email=tutor.email,
-                tutor_name=tutor.name,
-                student_name=student.name,
-                old_start_time=old_booking.start_at,
-                old_end_time=old_booking.end_at,
-                new_start_time=new_booking.start_at,
-                new_end_time=new_booking.end_at,
-                subject="Tutoring Session Rescheduled"
-            )
+        except Exception:
+            logger.exception("Error sending booking reschedule email")
+            if self.raise_errors:
+                raise
+    
+    async def send_booking_reschedule_notification(self, new_booking: Booking) -> None:
+        """Send in-app booking reschedule notification"""
+        try:
+            if not self.db:
+                return
             
-            # In-app notifications
-            await self._create_inapp_notification(
-                user_id=new_booking.student_id,
-                notification_type=NotificationType.BOOKING_CONFIRMATION,
-                payload={
-                    "booking_id": str(new_booking.id),
-                    "tutor_name": tutor.name,
-                    "start_time": new_booking.start_at.isoformat(),
-                    "end_time": new_booking.end_at.isoformat(),
-                    "rescheduled": True
-                }
-            )
+            # Get user details
+            tutor, student = await self._get_booking_users(new_booking)
             
-            await self._create_inapp_notification(
-                user_id=new_booking.tutor_id,
-                notification_type=NotificationType.BOOKING_CONFIRMATION,
-                payload={
-                    "booking_id": str(new_booking.id),
-                    "student_name": student.name,
-                    "start_time": new_booking.start_at.isoformat(),
-                    "end_time": new_booking.end_at.isoformat(),
-                    "rescheduled": True
-                }
-            )
+            if not tutor or not student:
+                return
+            
+            base_payload = self._booking_payload(new_booking, rescheduled=True)
+            await self._bulk_create_inapp([
+                self._inapp_row(
+                    user_id=new_booking.student_id,
+                    notification_type=NotificationType.BOOKING_CONFIRMATION,
+                    payload={**base_payload, "tutor_name": tutor.name}
+                ),
+                self._inapp_row(
+                    user_id=new_booking.tutor_id,
+                    notification_type=NotificationType.BOOKING_CONFIRMATION,
+                    payload={**base_payload, "student_name": student.name}
+                )
+            ])
+            await self.db.commit()
             
-        except Exception as e:
-            print(f"Error sending booking reschedule notification: {e}")
+        except Exception:
+            logger.exception("Error sending booking reschedule notification")
+            if self.raise_errors:
+                raise
     
     async def send_booking_reminders(self) -> None:
         """Send booking reminders (24h and 2h before session)"""
@@ -226,116 +353,203 @@ class NotificationService:
             tomorrow = now + timedelta(days=1)
             two_hours_from_now = now + timedelta(hours=2)
             
-            # 24-hour reminders
-            bookings_24h = await self._get_upcoming_bookings(
-                start_time=now,
-                end_time=tomorrow,
-                reminder_sent_24h=False
-            )
+            windows = [
+                # 24-hour reminders
+                ("24h", now, tomorrow),
+                # 2-hour reminders
+                ("2h", now, two_hours_from_now),
+            ]
             
-            for booking in bookings_24h:
-                await self._send_reminder_notification(booking, "24h")
-                # Mark 24h reminder as sent (you'd need to add this field to booking model)
+            # Email and SMS go out concurrently, with at most REMINDER_MAX_CONCURRENCY in flight
+            semaphore = asyncio.Semaphore(REMINDER_MAX_CONCURRENCY)
+            in_flight = set()
             
-            # 2-hour reminders
-            bookings_2h = await self._get_upcoming_bookings(
-                start_time=now,
-                end_time=two_hours_from_now,
-                reminder_sent_2h=False
-            )
+            def release(task: asyncio.Task) -> None:
+                in_flight.discard(task)
+                semaphore.release()
+            
+            rows = []
+            sms_messages = []
+            for reminder_type, start_time, end_time in windows:
+                # Claim due bookings first so each reminder goes out once across workers
+                booking_ids = await self._claim_upcoming_bookings(start_time, end_time, reminder_type)
+                
+                async for booking in self._get_upcoming_bookings(booking_ids):
+                    # Tutor and student are eager-loaded with the bookings
+                    if not self._is_active_user(booking.tutor) or not self._is_active_user(booking.student):
+                        continue
+                    tutor, student = UserContact.of(booking.tutor), UserContact.of(booking.student)
+                    
+                    if not await self._mark_reminder_dispatched(booking, reminder_type):
+                        continue
+                    
+                    await semaphore.acquire()
+                    task = asyncio.create_task(
+                        self._send_reminder_messages(booking, reminder_type, tutor, student, include_sms=False)
+                    )
+                    in_flight.add(task)
+                    task.add_done_callback(release)
+                    
+                    # SMS reminders go out in one bulk call at the end
+                    for user in (student, tutor):
+                        sms = self._reminder_sms(user, booking, reminder_type)
+                        if sms:
+                            sms_messages.append(sms)
+                    
+                    # In-app rows share the session, so they are inserted together afterwards
+                    rows.extend(self._reminder_rows(booking, reminder_type, tutor, student))
+            
+            await asyncio.gather(*in_flight)
             
-            for booking in bookings_2h:
-                await self._send_reminder_notification(booking, "2h")
-                # Mark 2h reminder as sent
+            if sms_messages:
+                await self.sms_service.send_bulk(sms_messages)
             
-        except Exception as e:
-            print(f"Error sending booking reminders: {e}")
+            # One bulk insert for every reminder's in-app notifications
+            if rows:
+                await self._bulk_create_inapp(rows)
+                await self.db.commit()
+            
+        except Exception:
+            logger.exception("Error sending booking reminders")
     
-    async def _send_reminder_notification(self, booking: Booking, reminder_type: str) -> None:
+    async def _send_reminder_notification(
+        self,
+        booking: Booking,
+        reminder_type: str,
+        tutor: UserContact,
+        student: UserContact
+    ) -> None:
         """Send reminder notification for a booking"""
+        if not await self._mark_reminder_dispatched(booking, reminder_type):
+            return
+        
+        await self._send_reminder_messages(booking, reminder_type, tutor, student)
+        await self._bulk_create_inapp(self._reminder_rows(booking, reminder_type, tutor, student))
+        
+        if self.db:
+            await self.db.commit()
+    
+    async def _mark_reminder_dispatched(self, booking: Booking, reminder_type: str) -> bool:
+        """Record a reminder dispatch in Redis; False if another worker already sent it.
+        
+        This is a cheap first-line dedupe in front of the reminder_sent flags,
+        which remain the durable record. Without Redis every dispatch proceeds.
+        """
+        redis = get_redis()
+        if redis is None:
+            return True
+        
         try:
-            tutor = await self._get_user_details(booking.tutor_id)
-            student = await self._get_user_details(booking.student_id)
-            
-            if not tutor or not student:
-                return
-            
-            # Email reminders
-            await self.email_service.send_booking_reminder_student(
-                to_email=student.email,
-                student_name=student.name,
-                tutor_name=tutor.name,
-                start_time=booking.start_at,
-                end_time=booking.end_at,
-                reminder_type=reminder_type,
-                join_link=booking.join_link
-            )
+            return bool(await redis.set(
+                f"{REMINDER_DEDUPE_PREFIX}{booking.id}:{reminder_type}",
+                "1",
+                nx=True,
+                ex=REMINDER_DEDUPE_TTL_SECONDS
+            ))
+        except RedisError:
+            logger.warning("Reminder dedupe unavailable, relying on reminder_sent flags", exc_info=True)
+            return True
+    
+    async def _send_reminder_messages(
+        self,
+        booking: Booking,
+        reminder_type: str,
+        tutor: UserContact,
+        student: UserContact,
+        include_sms: bool = True
+    ) -> None:
+        """Send reminder emails and SMS for a booking (batched callers send SMS in bulk instead)"""
+        try:
+            sms_reminders = []
+            if include_sms:
+                sms_reminders = [
+                    self._send_sms_reminder(student, booking, reminder_type),
+                    self._send_sms_reminder(tutor, booking, reminder_type)
+                ]
             
-            await self.email_service.send_booking_reminder_tutor(
-                to_email=tutor.email,
-                tutor_name=tutor.name,
-                student_name=student.name,
-                start_time=booking.start_at,
-                end_time=booking.end_at,
-                reminder_type=reminder_type
+            # Email and SMS reminders (SMS only if opted in)
+            await asyncio.gather(
+                self.email_service.send_booking_reminder_student(
+                    to_email=student.email,
+                    student_name=student.name,
+                    tutor_name=tutor.name,
+                    start_time=booking.start_at,
+                    end_time=booking.end_at,
+                    reminder_type=reminder_type,
+                    join_link=booking.join_link
+                ),
+                self.email_service.send_booking_reminder_tutor(
+                    to_email=tutor.email,
+                    tutor_name=tutor.name,
+                    student_name=student.name,
+                    start_time=booking.start_at,
+                    end_time=booking.end_at,
+                    reminder_type=reminder_type
+                ),
+                *sms_reminders
             )
             
-            # SMS reminders (if opted in)
-            await self._send_sms_reminder(student, booking, reminder_type)
-            await self._send_sms_reminder(tutor, booking, reminder_type)
-            
-            # In-app notifications
-            await self._create_inapp_notification(
+        except Exception:
+            logger.exception("Error sending reminder messages")
+    
+    def _reminder_rows(
+        self,
+        booking: Booking,
+        reminder_type: str,
+        tutor: UserContact,
+        student: UserContact
+    ) -> List[Dict[str, Any]]:
+        """Build in-app reminder notification rows for a booking"""
+        base_payload = self._booking_payload(booking, reminder_type=reminder_type)
+        return [
+            self._inapp_row(
                 user_id=booking.student_id,
                 notification_type=NotificationType.BOOKING_REMINDER,
                 payload={
-                    "booking_id": str(booking.id),
+                    **base_payload,
                     "tutor_name": tutor.name,
-                    "start_time": booking.start_at.isoformat(),
-                    "end_time": booking.end_at.isoformat(),
-                    "reminder_type": reminder_type,
                     "join_link": booking.join_link
                 }
-            )
-            
-            await self._create_inapp_notification(
+            ),
+            self._inapp_row(
                 user_id=booking.tutor_id,
                 notification_type=NotificationType.BOOKING_REMINDER,
-                payload={
-                    "booking_id": str(booking.id),
-                    "student_name": student.name,
-                    "start_time": booking.start_at.isoformat(),
-                    "end_time": booking.end_at.isoformat(),
-                    "reminder_type": reminder_type
-                }
+                payload={**base_payload, "student_name": student.name}
             )
-            
-        except Exception as e:
-            print(f"Error sending reminder notification: {e}")
+        ]
     
-    async def _send_sms_reminder(self, user: User, booking: Booking, reminder_type: str) -> None:
+    async def _send_sms_reminder(self, user: UserContact, booking: Booking, reminder_type: str) -> None:
         """Send SMS reminder (if user has opted in)"""
         try:
-            # Check if user has opted in for SMS notifications
-            # This would be stored in user preferences
-            sms_opted_in = True  # Placeholder - implement user preference check
-            
-            if sms_opted_in and user.phone_number:
-                message = f"Reminder: Your tutoring session is in {reminder_type}. "
-                if reminder_type == "2h":
-                    message += f"Join at: {booking.join_link}"
-                
+            sms = self._reminder_sms(user, booking, reminder_type)
+            if sms:
                 await self.sms_service.send_sms(
-                    phone_number=user.phone_number,
-                    message=message
+                    phone_number=sms[0],
+                    message=sms[1]
                 )
-        except Exception as e:
-            print(f"Error sending SMS reminder: {e}")
+        except Exception:
+            logger.exception("Error sending SMS reminder")
+    
+    @staticmethod
+    def _reminder_sms(user: UserContact, booking: Booking, reminder_type: str) -> Optional[Tuple[str, str]]:
+        """Build a (phone_number, message) reminder SMS, or None if the user doesn't get one"""
+        # Check if user has opted in for SMS notifications
+        # This would be stored in user preferences
+        sms_opted_in = True  # Placeholder - implement user preference check
+        
+        if not sms_opted_in or not user.phone_number:
+            return None
+        
+        message = f"Reminder: Your tutoring session is in {reminder_type}. "
+        if reminder_type == "2h":
+            message += f"Join at: {booking.join_link}"
+        
+        return user.phone_number, message
     
     async def send_payment_success_notification(self, payment: Any) -> None:
         """Send payment success notification"""
         try:
-            user = await self._get_user_details(payment.user_id)
+            user = await self._get_user_contact(payment.user_id)
             if not user:
                 return
             
@@ -353,16 +567,17 @@ class NotificationService:
                     "payment_id": str(payment.id),
                     "amount": payment.amount_cents,
                     "payment_type": payment.type.value
-                }
+                },
+                auto_commit=True
             )
             
-        except Exception as e:
-            print(f"Error sending payment success notification: {e}")
+        except Exception:
+            logger.exception("Error sending payment success notification")
     
     async def send_payment_failed_notification(self, payment: Any) -> None:
         """Send payment failed notification"""
         try:
-            user = await self._get_user_details(payment.user_id)
+            user = await self._get_user_contact(payment.user_id)
             if not user:
                 return
             
@@ -380,16 +595,17 @@ class NotificationService:
                     "payment_id": str(payment.id),
                     "amount": payment.amount_cents,
                     "payment_type": payment.type.value
-                }
+                },
+                auto_commit=True
             )
             
-        except Exception as e:
-            print(f"Error sending payment failed notification: {e}")
+        except Exception:
+            logger.exception("Error sending payment failed notification")
     
     async def send_credit_low_notification(self, user_id: str, current_balance: int) -> None:
         """Send low credit balance notification"""
         try:
-            user = await self._get_user_details(user_id)
+            user = await self._get_user_contact(user_id)
             if not user:
                 return
             
@@ -404,16 +620,17 @@ class NotificationService:
                 notification_type=NotificationType.CREDIT_LOW,
                 payload={
                     "current_balance": current_balance
-                }
+                },
+                auto_commit=True
             )
             
-        except Exception as e:
-            print(f"Error sending credit low notification: {e}")
+        except Exception:
+            logger.exception("Error sending credit low notification")
     
     async def send_ai_artifact_ready_notification(self, artifact: Any) -> None:
         """Send notification when AI artifact is ready"""
         try:
-            user = await self._get_user_details(artifact.user_id)
+            user = await self._get_user_contact(artifact.user_id)
             if not user:
                 return
             
@@ -429,79 +646,158 @@ class NotificationService:
                 payload={
                     "artifact_id": str(artifact.id),
                     "artifact_type": artifact.type.value
-                }
+                },
+                auto_commit=True
             )
             
-        except Exception as e:
-            print(f"Error sending AI artifact ready notification: {e}")
+        except Exception:
+            logger.exception("Error sending AI artifact ready notification")
     
     async def _get_user_details(self, user_id: str) -> Optional[User]:
-        """Get user details from database"""
+        """Get the full user entity from database (only needed when mutating the user)"""
         if not self.db:
             return None
         
         try:
-            user = await self.db.execute(
+            result = await self.db.execute(
                 select(User).where(
                     and_(
                         User.id == user_id,
                         User.deleted_at.is_(None)
                     )
                 )
-            ).scalar_one_or_none()
+            )
             
-            return user
-        except Exception as e:
-            print(f"Error getting user details: {e}")
+            return result.scalar_one_or_none()
+        except Exception:
+            logger.exception("Error getting user details")
+            return None
+    
+    async def _get_user_contact(self, user_id: str) -> Optional[UserContact]:
+        """Get a user's contact details, sharing any lookup already in flight"""
+        if not self.db:
             return None
+        
+        # Contacts are keyed by the UUID the database returns
+        user_id = uuid.UUID(str(user_id))
+        
+        lookup = self._user_lookups.get(user_id)
+        if lookup is not None:
+            return await lookup
+        
+        lookup = asyncio.get_running_loop().create_future()
+        self._user_lookups[user_id] = lookup
+        try:
+            contacts = await self._get_user_contacts({user_id})
+            contact = contacts.get(user_id)
+            lookup.set_result(contact)
+            return contact
+        finally:
+            del self._user_lookups[user_id]
+            if not lookup.done():
+                lookup.set_result(None)
+    
+    async def _get_user_contacts(self, user_ids: Set[str]) -> Dict[str, UserContact]:
+        """Get several users' contact details in a single query, keyed by id"""
+        if not self.db or not user_ids:
+            return {}
+        
+        try:
+            result = await self.db.execute(
+                select(*USER_CONTACT_COLUMNS).where(
+                    and_(
+                        User.id.in_(user_ids),
+                        User.deleted_at.is_(None)
+                    )
+                )
+            )
+            return {row.id: UserContact(*row) for row in result}
+        except Exception:
+            logger.exception("Error getting user contacts")
+            if self.raise_errors:
+                raise
+            return {}
+    
+    async def _get_booking_users(
+        self,
+        booking: Booking
+    ) -> Tuple[Optional[UserContact], Optional[UserContact]]:
+        """Get a booking's tutor and student contact details in a single query"""
+        contacts = await self._get_user_contacts({booking.tutor_id, booking.student_id})
+        return contacts.get(booking.tutor_id), contacts.get(booking.student_id)
+    
+    @staticmethod
+    def _is_active_user(user: Optional[User]) -> bool:
+        """Check that an eager-loaded user exists and is not soft-deleted"""
+        return user is not None and user.deleted_at is None
     
     async def _get_user_name(self, user_id: str) -> str:
         """Get user name from database"""
-        user = await self._get_user_details(user_id)
-        return user.name if user else "Unknown User"
+        contact = await self._get_user_contact(user_id)
+        return contact.name if contact else "Unknown User"
     
-    async def _get_upcoming_bookings(
+    async def _claim_upcoming_bookings(
         self,
         start_time: datetime,
         end_time: datetime,
-        reminder_sent_24h: bool = None,
-        reminder_sent_2h: bool = None
-    ) -> List[Booking]:
-        """Get upcoming bookings for reminders"""
+        reminder_type: str
+    ) -> List[Any]:
+        """Atomically flag due bookings' reminder as sent and return the claimed ids"""
         if not self.db:
             return []
         
+        reminder_sent = REMINDER_SENT_FLAGS[reminder_type]
+        
         try:
-            query = select(Booking).where(
-                and_(
-                    Booking.start_at >= start_time,
-                    Booking.start_at <= end_time,
-                    Booking.status == "confirmed",
-                    Booking.deleted_at.is_(None)
-                )
+            # Only rows whose flag is still false match, so concurrent workers never share a claim
+            result = await self.db.execute(
+                update(Booking).where(
+                    and_(
+                        Booking.start_at >= start_time,
+                        Booking.start_at <= end_time,
+                        Booking.status == BookingStatus.CONFIRMED,
+                        Booking.deleted_at.is_(None),
+                        reminder_sent.is_(False)
+                    )
+                ).values({reminder_sent: True}).returning(Booking.id)
             )
+            booking_ids = result.scalars().all()
+            await self.db.commit()
             
-            # Add reminder filters if provided
-            # Note: You'd need to add these fields to the booking model
-            # if reminder_sent_24h is not None:
-            #     query = query.where(Booking.reminder_sent_24h == reminder_sent_24h)
-            # if reminder_sent_2h is not None:
-            #     query = query.where(Booking.reminder_sent_2h == reminder_sent_2h)
+            return booking_ids
+        except Exception:
+            await self.db.rollback()
+            logger.exception("Error claiming upcoming bookings")
+            return []
+    
+    async def _get_upcoming_bookings(self, booking_ids: List[Any]) -> AsyncIterator[Booking]:
+        """Stream claimed bookings for reminders, REMINDER_BATCH_SIZE rows at a time"""
+        if not self.db or not booking_ids:
+            return
+        
+        try:
+            query = select(Booking).options(
+                selectinload(Booking.tutor).load_only(*USER_CONTACT_COLUMNS, User.deleted_at),
+                selectinload(Booking.student).load_only(*USER_CONTACT_COLUMNS, User.deleted_at)
+            ).where(Booking.id.in_(booking_ids))
             
-            bookings = await self.db.execute(query)
-            return bookings.scalars().all()
+            bookings = await self.db.stream_scalars(
+                query.execution_options(yield_per=REMINDER_BATCH_SIZE)
+            )
+            async for booking in bookings:
+                yield booking
             
-        except Exception as e:
-            print(f"Error getting upcoming bookings: {e}")
-            return []
+        except Exception:
+            logger.exception("Error getting upcoming bookings")
     
     async def _create_inapp_notification(
         self,
         user_id: str,
         notification_type: NotificationType,
-        payload: Dict[str, Any]
+        payload: Dict[str, Any],
+        auto_commit: bool = False
     ) -> None:
-        """Create in-app notification"""
+        """Create in-app notification (flushed only; the caller commits unless auto_commit is set)"""
         if not self.db:
             return
         
@@ -509,54 +805,202 @@ class NotificationService:
             notification = Notification(
                 user_id=user_id,
                 type=notification_type,
-                payload=json.dumps(payload),
+                payload=payload,
                 delivery=NotificationDelivery.INAPP,
                 status=NotificationStatus.PENDING
             )
             
             self.db.add(notification)
-            await self.db.commit()
             
-        except Exception as e:
-            print(f"Error creating in-app notification: {e}")
+            if auto_commit:
+                await self.db.commit()
+            else:
+                await self.db.flush()
+            
+            await self._adjust_unread_counts({user_id: 1})
+            
+        except Exception:
+            logger.exception("Error creating in-app notification")
+    
+    def _check_sent(self, sent: bool) -> None:
+        """Surface a failed email send when the caller retries on errors"""
+        if self.raise_errors and not sent:
+            raise NotificationError("Email delivery failed")
+    
+    @staticmethod
+    def _booking_payload(booking: Booking, **extra: Any) -> Dict[str, Any]:
+        """Payload fields shared by every notification about a booking"""
+        return {
+            "booking_id": str(booking.id),
+            "start_time": booking.start_at,
+            "end_time": booking.end_at,
+            **extra
+        }
+    
+    @staticmethod
+    def _inapp_row(
+        user_id: str,
+        notification_type: NotificationType,
+        payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build a pending in-app notification row for _bulk_create_inapp"""
+        return {
+            "user_id": user_id,
+            "type": notification_type,
+            "payload": payload,
+            "delivery": NotificationDelivery.INAPP,
+            "status": NotificationStatus.PENDING
+        }
+    
+    async def _bulk_create_inapp(self, rows: List[Dict[str, Any]]) -> None:
+        """Create several in-app notifications with a single INSERT (the caller commits)"""
+        if not self.db or not rows:
+            return
+        
+        try:
+            if len(rows) >= PAYLOAD_OFFLOAD_THRESHOLD:
+                rows = await asyncio.to_thread(self._preserialize_payloads, rows)
+            
+            await self.db.execute(insert(Notification), rows)
+            
+            counts: Dict[Any, int] = {}
+            for row in rows:
+                counts[row["user_id"]] = counts.get(row["user_id"], 0) + 1
+            await self._adjust_unread_counts(counts)
+        except Exception:
+            logger.exception("Error creating in-app notifications")
+            if self.raise_errors:
+                raise
+    
+    @staticmethod
+    def _preserialize_payloads(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Serialize payloads up front (run in a worker thread for large batches).
+        
+        Each payload becomes an orjson.Fragment, which the engine's JSON
+        serializer embeds as-is instead of encoding it again on the event loop.
+        """
+        return [
+            {**row, "payload": orjson.Fragment(orjson.dumps(row["payload"], option=JSON_OPTIONS))}
+            for row in rows
+        ]
     
     async def mark_notification_as_read(self, notification_id: str, user_id: str) -> bool:
-        """Mark notification as read"""
+        """Mark notification as read; False if it doesn't exist or was already read"""
         if not self.db:
             return False
         
         try:
-            notification = await self.db.execute(
-                select(Notification).where(
+            result = await self.db.execute(
+                update(Notification).where(
                     and_(
                         Notification.id == notification_id,
                         Notification.user_id == user_id,
-                        Notification.deleted_at.is_(None)
+                        Notification.deleted_at.is_(None),
+                        Notification.status != NotificationStatus.READ
                     )
-                )
-            ).scalar_one_or_none()
+                ).values(status=NotificationStatus.READ).returning(Notification.id)
+            )
+            marked = result.scalar_one_or_none() is not None
+            await self.db.commit()
             
-            if notification:
-                notification.status = NotificationStatus.READ
-                await self.db.commit()
-                return True
+            if marked:
+                await self._adjust_unread_counts({user_id: -1})
             
-            return False
+            return marked
             
-        except Exception as e:
-            print(f"Error marking notification as read: {e}")
+        except Exception:
+            logger.exception("Error marking notification as read")
             return False
     
+    async def get_unread_count(self, user_id: str) -> int:
+        """Get the user's unread notification count, from Redis when cached"""
+        redis = get_redis()
+        key = f"{UNREAD_COUNT_PREFIX}{user_id}"
+        
+        if redis is not None:
+            try:
+                cached = await redis.get(key)
+                if cached is not None:
+                    return max(int(cached), 0)
+            except RedisError:
+                logger.warning("Unread count cache unavailable", exc_info=True)
+                redis = None
+        
+        if not self.db:
+            return 0
+        
+        try:
+            result = await self.db.execute(
+                select(func.count()).select_from(Notification).where(
+                    and_(
+                        Notification.user_id == user_id,
+                        Notification.status == NotificationStatus.PENDING,
+                        Notification.deleted_at.is_(None)
+                    )
+                )
+            )
+            count = result.scalar_one()
+        except Exception:
+            logger.exception("Error counting unread notifications")
+            return 0
+        
+        if redis is not None:
+            try:
+                # Backfill; NX so a concurrent backfill or adjustment isn't clobbered
+                await redis.set(key, count, ex=UNREAD_COUNT_TTL_SECONDS, nx=True)
+            except RedisError:
+                logger.warning("Unread count cache unavailable", exc_info=True)
+        
+        return count
+    
+    async def _adjust_unread_counts(self, deltas: Dict[Any, int]) -> None:
+        """Apply unread count changes to the cached counters that exist"""
+        redis = get_redis()
+        if redis is None or not deltas:
+            return
+        
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for user_id, delta in deltas.items():
+                    pipe.eval(UNREAD_COUNT_ADJUST_SCRIPT, 1, f"{UNREAD_COUNT_PREFIX}{user_id}", delta)
+                await pipe.execute()
+        except RedisError:
+            logger.warning("Unread count cache unavailable", exc_info=True)
+    
+    async def get_notification(self, notification_id: str, user_id: str) -> Optional[Notification]:
+        """Get a single notification including its payload"""
+        if not self.db:
+            return None
+        
+        try:
+            result = await self.db.execute(
+                select(Notification).options(undefer(Notification.payload)).where(
+                    and_(
+                        Notification.id == notification_id,
+                        Notification.user_id == user_id,
+                        Notification.deleted_at.is_(None)
+                    )
+                )
+            )
+            
+            return result.scalar_one_or_none()
+        except Exception:
+            logger.exception("Error getting notification")
+            return None
+    
     async def get_user_notifications(
         self,
         user_id: str,
         limit: int = 50,
-        offset: int = 0,
+        cursor: Optional[Tuple[datetime, Any]] = None,
         unread_only: bool = False
-    ) -> List[Notification]:
-        """Get user notifications"""
+    ) -> Tuple[List[Notification], Optional[Tuple[datetime, Any]]]:
+        """Get a page of user notifications, newest first, plus the (created_at, id) cursor of the next page.
+        
+        The cursor is None on the last page. Payloads are not loaded; use get_notification for details.
+        """
         if not self.db:
-            return []
+            return [], None
         
         try:
             query = select(Notification).where(
@@ -569,12 +1013,31 @@ class NotificationService:
             if unread_only:
                 query = query.where(Notification.status == NotificationStatus.PENDING)
             
-            query = query.order_by(Notification.created_at.desc())
-            query = query.offset(offset).limit(limit)
+            if cursor:
+                cursor_created_at, cursor_id = cursor
+                query = query.where(
+                    or_(
+                        Notification.created_at < cursor_created_at,
+                        and_(
+                            Notification.created_at == cursor_created_at,
+                            Notification.id < cursor_id
+                        )
+                    )
+                )
             
-            notifications = await self.db.execute(query)
-            return notifications.scalars().all()
+            query = query.order_by(Notification.created_at.desc(), Notification.id.desc())
+            query = query.limit(limit + 1)
             
-        except Exception as e:
-            print(f"Error getting user notifications: {e}")
-            return []
+            result = await self.db.execute(query)
+            notifications = result.scalars().all()
+            
+            if len(notifications) <= limit:
+                return notifications, None
+            
+            notifications = notifications[:limit]
+            last = notifications[-1]
+            return notifications, (last.created_at, last.id)
+            
+        except Exception:
+            logger.exception("Error getting user notifications")
+            return [], None
@@ -1,21 +1,112 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, or_, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload
+from sqlalchemy import select, insert, update, and_, func, cast, Integer
+from functools import lru_cache
+from cachetools import TTLCache
+from bisect import bisect_left
+from operator import itemgetter
+import asyncio
+import logging
 import uuid
 import json
-from dateutil import rrule
+import numpy as np
 from dateutil.parser import parse
-import pytz
+from jose import JWTError, jwt
+from redis.exceptions import RedisError
 
 from app.models.availability import AvailabilityBlock, TimeOffBlock, Slot, SlotStatus
 from app.models.booking import Booking, BookingStatus
 from app.models.user import User, UserRole
 from app.models.google_oauth import GoogleOAuthAccount
 from app.services.google_calendar_service import GoogleCalendarService
-from app.services.notification_service import NotificationService
+from app.services.notification_service import BOOKING_EMAIL_RECIPIENTS
+from app.tasks.calendar import (
+    create_booking_calendar_events,
+    cancel_booking_calendar_events,
+)
+from app.tasks.notifications import (
+    dispatch_booking_confirmation_email,
+    dispatch_booking_confirmation_inapp,
+    dispatch_booking_cancellation_email,
+    dispatch_booking_cancellation_inapp,
+    dispatch_booking_reschedule_email,
+    dispatch_booking_reschedule_inapp,
+)
+from app.core.config import settings
 from app.core.exceptions import SchedulingError, BookingError
+from app.core.recurrence import expand_rrule
+from app.core.redis_client import get_redis
+from app.core.logging_config import RateLimitingFilter
+
+logger = logging.getLogger(__name__)
+
+# Calendar outages fail every availability lookup the same way; busy-time
+# failures go through their own logger so repeats don't flood the logs.
+# Per-booking failures stay on the unfiltered logger above.
+busy_times_logger = logging.getLogger(f"{__name__}.busy_times")
+busy_times_logger.addFilter(RateLimitingFilter())
+
+# Google busy times are cached briefly per tutor and day-aligned window
+BUSY_TIMES_CACHE_PREFIX = "gcal:busy:"
+BUSY_TIMES_CACHE_TTL_SECONDS = 60
+
+# Redis keys mapping hold tokens to the slot and student they were issued for
+HOLD_KEY_PREFIX = "hold:"
+
+# Without Redis, holds are issued as signed tokens carrying the hold itself
+HOLD_TOKEN_TYPE = "slot_hold"
+
+
+def _encode_hold_token(hold_info: Dict[str, Any], expires_at: datetime) -> str:
+    """Sign a self-contained hold token"""
+    return jwt.encode(
+        {**hold_info, "exp": expires_at, "typ": HOLD_TOKEN_TYPE},
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
+
+
+def _is_signed_hold_token(hold_token: str) -> bool:
+    """Signed tokens are JWTs; Redis-backed tokens are plain UUIDs"""
+    return "." in hold_token
+
+
+def _decode_hold_token(hold_token: str) -> Optional[Dict[str, Any]]:
+    """Hold info from a signed token, or None if it is invalid or expired"""
+    try:
+        payload = jwt.decode(hold_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    
+    return payload if payload.get("typ") == HOLD_TOKEN_TYPE else None
+
+
+# Google access tokens by user id (None when not connected), shared across requests
+_oauth_token_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+
+
+def invalidate_oauth_account(user_id: str) -> None:
+    """Drop a user's cached Google access token, e.g. after connecting or disconnecting"""
+    _oauth_token_cache.pop(str(user_id), None)
+
+
+# Tutor hourly rates by user id, shared across requests
+_hourly_rate_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
+
+
+def invalidate_hourly_rate(tutor_id: str) -> None:
+    """Drop a tutor's cached hourly rate, e.g. after their profile is updated"""
+    _hourly_rate_cache.pop(str(tutor_id), None)
+
+
+@lru_cache(maxsize=64)
+def _format_utc_offset(offset_seconds: int) -> str:
+    """Format a UTC offset in seconds as an ISO 8601 suffix, e.g. -05:00"""
+    sign = "-" if offset_seconds < 0 else "+"
+    hours, minutes = divmod(abs(offset_seconds) // 60, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
 
 
 class SchedulingService:
@@ -24,7 +115,6 @@ class SchedulingService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.google_calendar = GoogleCalendarService()
-        self.notification_service = NotificationService()
     
     async def create_availability_block(
         self,
@@ -61,201 +151,392 @@ class SchedulingService:
         
         return availability
     
-    async def _generate_slots_from_availability(self, availability: AvailabilityBlock) -> List[Slot]:
-        """Generate bookable slots from availability block"""
-        slots = []
+    async def _generate_slots_from_availability(self, availability: AvailabilityBlock) -> int:
+        """Generate bookable slots from availability block, returning how many were created"""
+        slot_rows = []
         
         if availability.is_recurring and availability.rrule:
-            # Parse RRULE and generate recurring slots
-            rule = rrule.rrulestr(availability.rrule, dtstart=availability.start_at)
-            
             # Generate slots for next 8 weeks
-            end_date = datetime.now(timezone.utc) + timedelta(weeks=8)
+            now = datetime.now(timezone.utc)
+            end_date = now + timedelta(weeks=8)
+            duration = availability.end_at - availability.start_at
+            
+            # Expand the RRULE in the tutor's timezone so slots follow DST
+            tutor_timezone = (await self.db.execute(
+                select(User.timezone).where(User.id == availability.tutor_id)
+            )).scalar_one_or_none() or "UTC"
+            occurrences = expand_rrule(availability.rrule, availability.start_at, now, end_date, tutor_timezone)
+            
+            # Fetch the whole window's time off once instead of querying per occurrence
+            time_off = await self._get_time_off_blocks(availability.tutor_id, now, end_date + duration)
+            
+            # Check every occurrence for time-off conflicts in one pass
+            available = self._filter_occurrences(
+                np.fromiter((occurrence.timestamp() for occurrence in occurrences), dtype=np.int64, count=len(occurrences)),
+                int(duration.total_seconds()),
+                np.fromiter((off_start.timestamp() for off_start, _ in time_off), dtype=np.int64, count=len(time_off)),
+                np.fromiter((off_end.timestamp() for _, off_end in time_off), dtype=np.int64, count=len(time_off))
+            )
             
-            for occurrence in rule.between(
-                datetime.now(timezone.utc),
-                end_date
-            ):
-                slot_start = occurrence
-                slot_end = occurrence + (availability.end_at - availability.start_at)
-                
-                # Check for time-off conflicts
-                if not await self._has_time_off_conflict(availability.tutor_id, slot_start, slot_end):
-                    slot = Slot(
-                        tutor_id=availability.tutor_id,
-                        start_at=slot_start,
-                        end_at=slot_end,
-                        status=SlotStatus.OPEN
-                    )
-                    slots.append(slot)
+            for occurrence, is_available in zip(occurrences, available):
+                if is_available:
+                    slot_rows.append({
+                        "tutor_id": availability.tutor_id,
+                        "start_at": occurrence,
+                        "end_at": occurrence + duration,
+                        "status": SlotStatus.OPEN
+                    })
         else:
             # One-time availability
             if not await self._has_time_off_conflict(availability.tutor_id, availability.start_at, availability.end_at):
-                slot = Slot(
-                    tutor_id=availability.tutor_id,
-                    start_at=availability.start_at,
-                    end_at=availability.end_at,
-                    status=SlotStatus.OPEN
-                )
-                slots.append(slot)
+                slot_rows.append({
+                    "tutor_id": availability.tutor_id,
+                    "start_at": availability.start_at,
+                    "end_at": availability.end_at,
+                    "status": SlotStatus.OPEN
+                })
         
-        # Bulk insert slots
-        if slots:
-            self.db.add_all(slots)
+        # Bulk insert slots in one statement without building ORM objects
+        if slot_rows:
+            await self.db.execute(insert(Slot), slot_rows)
             await self.db.commit()
         
-        return slots
+        return len(slot_rows)
     
     async def _has_time_off_conflict(self, tutor_id: str, start_at: datetime, end_at: datetime) -> bool:
         """Check if time range conflicts with time-off blocks"""
-        from app.models.availability import TimeOffBlock
-        
-        conflict = await self.db.execute(
-            select(TimeOffBlock).where(
+        time_off = await self._get_time_off_blocks(tutor_id, start_at, end_at)
+        return self._overlaps_time_off(time_off, start_at, end_at)
+    
+    async def _get_time_off_blocks(
+        self,
+        tutor_id: str,
+        window_start: datetime,
+        window_end: datetime
+    ) -> List[Tuple[datetime, datetime]]:
+        """Get a tutor's time-off intervals overlapping a window, sorted by start"""
+        result = await self.db.execute(
+            select(TimeOffBlock.start_at, TimeOffBlock.end_at).where(
                 and_(
                     TimeOffBlock.tutor_id == tutor_id,
                     TimeOffBlock.deleted_at.is_(None),
-                    or_(
-                        and_(TimeOffBlock.start_at <= start_at, TimeOffBlock.end_at > start_at),
-                        and_(TimeOffBlock.start_at < end_at, TimeOffBlock.end_at >= end_at),
-                        and_(TimeOffBlock.start_at >= start_at, TimeOffBlock.end_at <= end_at)
-                    )
+                    TimeOffBlock.start_at < window_end,
+                    TimeOffBlock.end_at > window_start
                 )
-            )
-        ).scalar_one_or_none()
+            ).order_by(TimeOffBlock.start_at)
+        )
         
-        return conflict is not None
+        return [(start_at, end_at) for start_at, end_at in result]
+    
+    @staticmethod
+    def _overlaps_time_off(
+        time_off: List[Tuple[datetime, datetime]],
+        start_at: datetime,
+        end_at: datetime
+    ) -> bool:
+        """Check a time range against time-off intervals sorted by start"""
+        # Only intervals starting before end_at can overlap; walk back from the
+        # latest of them, which is the most likely to reach past start_at
+        candidates = bisect_left(time_off, end_at, key=itemgetter(0))
+        
+        for index in range(candidates - 1, -1, -1):
+            if time_off[index][1] > start_at:
+                return True
+        
+        return False
+    
+    @staticmethod
+    def _filter_occurrences(
+        occ_starts: np.ndarray,
+        duration: int,
+        toff_starts: np.ndarray,
+        toff_ends: np.ndarray
+    ) -> np.ndarray:
+        """Mask occurrences (epoch seconds) that don't overlap time off sorted by start"""
+        if not len(toff_starts):
+            return np.ones(len(occ_starts), dtype=bool)
+        
+        # Time off starting before each occurrence ends is a prefix of the sorted
+        # intervals; it conflicts iff the latest end within that prefix is later
+        # than the occurrence start
+        candidates = np.searchsorted(toff_starts, occ_starts + duration, side="left")
+        latest_ends = np.maximum.accumulate(toff_ends)
+        conflicts = (candidates > 0) & (latest_ends[np.maximum(candidates - 1, 0)] > occ_starts)
+        
+        return ~conflicts
     
     async def get_available_slots(
         self,
         tutor_id: str,
         start_date: datetime,
         end_date: datetime,
-        student_timezone: str = "UTC"
+        student_timezone: str = "UTC",
+        bypass_cache: bool = False
     ) -> List[Dict[str, Any]]:
-        """Get available slots for a tutor, filtered by Google Calendar busy times"""
+        """Get available slots for a tutor, filtered by Google Calendar busy times
+        
+        Pass bypass_cache=True when the result gates a booking, so a stale
+        cached calendar can't let a just-taken slot through.
+        """
+        available_slots = await self.get_available_slots_for_tutors(
+            [tutor_id], start_date, end_date, student_timezone, bypass_cache=bypass_cache
+        )
         
-        # Get open slots
-        slots = await self.db.execute(
-            select(Slot).where(
+        return available_slots[str(tutor_id)]
+    
+    async def get_available_slots_for_tutors(
+        self,
+        tutor_ids: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        student_timezone: str = "UTC",
+        bypass_cache: bool = False
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get available slots for several tutors at once, keyed by tutor id"""
+        tutor_ids = [str(tutor_id) for tutor_id in tutor_ids]
+        
+        # Get open slots, with student-local wall times, UTC offsets and
+        # durations computed by the database
+        start_local = func.timezone(student_timezone, Slot.start_at)
+        end_local = func.timezone(student_timezone, Slot.end_at)
+        result = await self.db.execute(
+            select(
+                Slot.id,
+                Slot.tutor_id,
+                Slot.start_at,
+                Slot.end_at,
+                start_local.label("start_local"),
+                end_local.label("end_local"),
+                func.extract("epoch", start_local - func.timezone("UTC", Slot.start_at)).label("start_offset"),
+                func.extract("epoch", end_local - func.timezone("UTC", Slot.end_at)).label("end_offset"),
+                cast(func.extract("epoch", Slot.end_at - Slot.start_at) / 60, Integer).label("duration_minutes")
+            ).where(
                 and_(
-                    Slot.tutor_id == tutor_id,
+                    Slot.tutor_id.in_(tutor_ids),
                     Slot.status == SlotStatus.OPEN,
                     Slot.start_at >= start_date,
                     Slot.start_at <= end_date,
                     Slot.deleted_at.is_(None)
                 )
-            ).options(selectinload(Slot.tutor))
-        ).scalars().all()
+            ).order_by(Slot.start_at, Slot.id)
+        )
+        slots = result.all()
+        
+        # Get Google Calendar busy times for every connected tutor
+        busy_times = await self._get_google_calendar_busy_times_multi(
+            tutor_ids, start_date, end_date, bypass_cache=bypass_cache
+        )
         
-        # Get Google Calendar busy times if connected
-        busy_times = await self._get_google_calendar_busy_times(tutor_id, start_date, end_date)
+        # Filter out busy times
+        available_slots: Dict[str, List[Dict[str, Any]]] = {tutor_id: [] for tutor_id in tutor_ids}
         
-        # Filter out busy times and convert to student timezone
-        available_slots = []
-        student_tz = pytz.timezone(student_timezone)
+        # Parse each tutor's busy times once rather than per slot
+        busy_intervals = {
+            tutor_id: self._parse_busy_times(tutor_busy_times)
+            for tutor_id, tutor_busy_times in busy_times.items()
+        }
         
         for slot in slots:
+            tutor_id = str(slot.tutor_id)
+            
             # Check if slot conflicts with Google Calendar busy times
-            if not self._has_calendar_conflict(slot, busy_times):
-                # Convert to student timezone
-                slot_start_local = slot.start_at.astimezone(student_tz)
-                slot_end_local = slot.end_at.astimezone(student_tz)
-                
-                available_slots.append({
+            if not self._has_calendar_conflict(slot, *busy_intervals[tutor_id]):
+                available_slots[tutor_id].append({
                     "slot_id": str(slot.id),
                     "start_at": slot.start_at.isoformat(),
                     "end_at": slot.end_at.isoformat(),
-                    "start_at_local": slot_start_local.isoformat(),
-                    "end_at_local": slot_end_local.isoformat(),
-                    "duration_minutes": int((slot.end_at - slot.start_at).total_seconds() / 60)
+                    "start_at_local": slot.start_local.isoformat() + _format_utc_offset(int(slot.start_offset)),
+                    "end_at_local": slot.end_local.isoformat() + _format_utc_offset(int(slot.end_offset)),
+                    "duration_minutes": slot.duration_minutes
                 })
         
         return available_slots
     
-    async def _get_google_calendar_busy_times(self, tutor_id: str, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
-        """Get busy times from Google Calendar"""
+    async def _get_google_calendar_busy_times(
+        self,
+        tutor_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        bypass_cache: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get busy times from Google Calendar, cached briefly per tutor and day range"""
+        busy_times = await self._get_google_calendar_busy_times_multi(
+            [tutor_id], start_date, end_date, bypass_cache=bypass_cache
+        )
+        
+        return busy_times[str(tutor_id)]
+    
+    async def _get_google_calendar_busy_times_multi(
+        self,
+        tutor_ids: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        bypass_cache: bool = False
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get busy times for several tutors, keyed by tutor id
+        
+        OAuth accounts are loaded in one query and cache misses are fetched
+        concurrently; lookups sharing a token are coalesced into one Free/Busy
+        request by the calendar service.
+        """
+        tutor_ids = [str(tutor_id) for tutor_id in tutor_ids]
+        
+        # Widen to whole days so nearby requests share a cache entry
+        window_start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        window_end = end_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        keys = {
+            tutor_id: f"{BUSY_TIMES_CACHE_PREFIX}{tutor_id}:{window_start.date()}:{window_end.date()}"
+            for tutor_id in tutor_ids
+        }
+        
+        busy_times: Dict[str, List[Dict[str, Any]]] = {tutor_id: [] for tutor_id in tutor_ids}
+        missing = tutor_ids
+        
+        redis = None if bypass_cache else get_redis()
+        if redis is not None:
+            try:
+                cached = await redis.mget(list(keys.values()))
+                missing = []
+                for tutor_id, value in zip(keys, cached):
+                    if value is None:
+                        missing.append(tutor_id)
+                    else:
+                        busy_times[tutor_id] = json.loads(value)
+            except RedisError:
+                busy_times_logger.warning("Busy times cache unavailable", exc_info=True)
+                redis = None
+        
+        if not missing:
+            return busy_times
+        
         try:
-            # Get tutor's Google OAuth account
-            oauth_account = await self.db.execute(
-                select(GoogleOAuthAccount).where(
-                    and_(
-                        GoogleOAuthAccount.user_id == tutor_id,
-                        GoogleOAuthAccount.deleted_at.is_(None)
-                    )
+            # Get tutors' Google access tokens
+            access_tokens = await self._get_access_tokens(missing)
+            connected = [tutor_id for tutor_id in missing if tutor_id in access_tokens]
+            
+            results = await asyncio.gather(*[
+                self.google_calendar.get_busy_times(
+                    access_token=access_tokens[tutor_id],
+                    start_date=window_start,
+                    end_date=window_end
                 )
-            ).scalar_one_or_none()
-            
-            if oauth_account and oauth_account.calendar_connected:
-                return await self.google_calendar.get_busy_times(
-                    access_token=oauth_account.access_token,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-        except Exception as e:
+                for tutor_id in connected
+            ], return_exceptions=True)
+            
+            fetched = {}
+            for tutor_id, result in zip(connected, results):
+                if isinstance(result, Exception):
+                    # Log error but don't fail the request
+                    busy_times_logger.error(
+                        "Error getting Google Calendar busy times for tutor %s",
+                        tutor_id,
+                        exc_info=result
+                    )
+                    continue
+                
+                busy_times[tutor_id] = result
+                fetched[keys[tutor_id]] = json.dumps(result)
+            
+            if redis is not None and fetched:
+                try:
+                    async with redis.pipeline(transaction=False) as pipe:
+                        for key, value in fetched.items():
+                            pipe.set(key, value, ex=BUSY_TIMES_CACHE_TTL_SECONDS)
+                        await pipe.execute()
+                except RedisError:
+                    busy_times_logger.warning("Busy times cache unavailable", exc_info=True)
+        except Exception:
             # Log error but don't fail the request
-            print(f"Error getting Google Calendar busy times: {e}")
+            busy_times_logger.exception("Error getting Google Calendar busy times")
         
-        return []
+        return busy_times
     
-    def _has_calendar_conflict(self, slot: Slot, busy_times: List[Dict[str, Any]]) -> bool:
+    @staticmethod
+    def _parse_busy_times(busy_times: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Parse busy times into sorted start epoch seconds and the running latest end"""
+        busy_starts = np.fromiter(
+            (parse(busy_time["start"]).timestamp() for busy_time in busy_times),
+            dtype=np.int64,
+            count=len(busy_times)
+        )
+        busy_ends = np.fromiter(
+            (parse(busy_time["end"]).timestamp() for busy_time in busy_times),
+            dtype=np.int64,
+            count=len(busy_times)
+        )
+        
+        order = np.argsort(busy_starts, kind="stable")
+        
+        return busy_starts[order], np.maximum.accumulate(busy_ends[order])
+    
+    @staticmethod
+    def _has_calendar_conflict(slot: Any, busy_starts: np.ndarray, latest_ends: np.ndarray) -> bool:
         """Check if slot conflicts with Google Calendar busy times"""
-        for busy_time in busy_times:
-            busy_start = parse(busy_time["start"])
-            busy_end = parse(busy_time["end"])
-            
-            # Check for overlap
-            if (slot.start_at < busy_end and slot.end_at > busy_start):
-                return True
+        # Busy intervals starting before the slot ends are a prefix of the sorted
+        # starts; the slot conflicts iff the latest end within it is after the
+        # slot starts
+        candidates = np.searchsorted(busy_starts, slot.end_at.timestamp(), side="left")
         
-        return False
+        return bool(candidates and latest_ends[candidates - 1] > slot.start_at.timestamp())
     
     async def hold_slot(self, slot_id: str, student_id: str, hold_duration_minutes: int = 10) -> Dict[str, Any]:
         """Hold a slot for booking with transaction safety"""
         
-        # Use database transaction to prevent race conditions
-        async with self.db.begin():
-            # Get slot with lock
-            slot = await self.db.execute(
-                select(Slot).where(
-                    and_(
-                        Slot.id == slot_id,
-                        Slot.status == SlotStatus.OPEN,
-                        Slot.deleted_at.is_(None)
-                    )
-                ).with_for_update()
-            ).scalar_one_or_none()
-            
-            if not slot:
-                raise BookingError("Slot not available")
-            
-            # Check if slot is still available (double-check)
-            if slot.status != SlotStatus.OPEN:
-                raise BookingError("Slot already booked")
-            
-            # Update slot status to held
-            slot.status = SlotStatus.HELD
-            slot.updated_at = datetime.now(timezone.utc)
-            
-            # Generate hold token
-            hold_token = str(uuid.uuid4())
-            hold_expires_at = datetime.now(timezone.utc) + timedelta(minutes=hold_duration_minutes)
-            
-            # Store hold information (in practice, use Redis for this)
-            hold_info = {
-                "slot_id": slot_id,
-                "student_id": student_id,
-                "hold_token": hold_token,
-                "expires_at": hold_expires_at.isoformat()
-            }
-            
-            await self.db.commit()
-            
-            return {
-                "hold_token": hold_token,
-                "expires_at": hold_expires_at.isoformat(),
-                "slot_id": slot_id
-            }
+        # Flip OPEN -> HELD in one conditional UPDATE so concurrent holds can't both win
+        result = await self.db.execute(
+            update(Slot)
+            .where(
+                and_(
+                    Slot.id == slot_id,
+                    Slot.status == SlotStatus.OPEN,
+                    Slot.deleted_at.is_(None)
+                )
+            )
+            .values(status=SlotStatus.HELD, updated_at=func.now())
+            .returning(Slot.tutor_id, Slot.start_at, Slot.end_at)
+        )
+        slot = result.one_or_none()
+        
+        if slot is None:
+            raise BookingError("Slot not available")
+        
+        hold_expires_at = datetime.now(timezone.utc) + timedelta(minutes=hold_duration_minutes)
+        
+        # Store hold information so confirmation can target this exact slot
+        hold_info = {
+            "slot_id": str(slot_id),
+            "student_id": str(student_id),
+            "tutor_id": str(slot.tutor_id),
+            "start_at": slot.start_at.isoformat(),
+            "end_at": slot.end_at.isoformat(),
+            "expires_at": hold_expires_at.isoformat()
+        }
+        
+        hold_token = None
+        redis = get_redis()
+        if redis is not None:
+            token = str(uuid.uuid4())
+            try:
+                await redis.set(
+                    f"{HOLD_KEY_PREFIX}{token}",
+                    json.dumps(hold_info),
+                    ex=hold_duration_minutes * 60
+                )
+                hold_token = token
+            except RedisError:
+                logger.warning("Slot hold store unavailable, issuing a signed hold token", exc_info=True)
+        
+        if hold_token is None:
+            # The HELD -> BOOKED update at confirmation keeps the token single-use
+            hold_token = _encode_hold_token(hold_info, hold_expires_at)
+        
+        await self.db.commit()
+        
+        return {
+            "hold_token": hold_token,
+            "expires_at": hold_expires_at.isoformat(),
+            "slot_id": slot_id
+        }
     
     async def confirm_booking(
         self,
@@ -266,239 +547,344 @@ class SchedulingService:
     ) -> Booking:
         """Confirm booking after payment processing"""
         
-        # Validate hold token (in practice, get from Redis)
-        # For now, we'll assume the token is valid
+        # Validate the hold token before touching the database
+        hold_info = await self._get_hold(hold_token)
+        if hold_info is None:
+            raise BookingError("Hold expired or not found")
         
-        async with self.db.begin():
-            # Get the held slot
-            slot = await self.db.execute(
-                select(Slot).where(
-                    and_(
-                        Slot.status == SlotStatus.HELD,
-                        Slot.deleted_at.is_(None)
-                    )
-                ).with_for_update()
-            ).scalar_one_or_none()
-            
-            if not slot:
-                raise BookingError("No held slot found")
-            
-            # Create booking
-            booking = Booking(
-                student_id=student_id,
-                tutor_id=slot.tutor_id,
-                start_at=slot.start_at,
-                end_at=slot.end_at,
-                status=BookingStatus.CONFIRMED,
-                price_cents=await self._calculate_booking_price(slot.tutor_id, slot.start_at, slot.end_at),
-                payment_intent_id=payment_intent_id,
-                slot_id=slot.id
+        if hold_info["student_id"] != str(student_id):
+            raise BookingError("Hold belongs to another student")
+        
+        # Price the booking up front so the slot row is only locked for the writes
+        price_cents = await self._calculate_booking_price(
+            hold_info["tutor_id"],
+            datetime.fromisoformat(hold_info["start_at"]),
+            datetime.fromisoformat(hold_info["end_at"])
+        )
+        
+        # Flip the held slot HELD -> BOOKED in one statement; only one
+        # confirmation of a hold can win
+        result = await self.db.execute(
+            update(Slot)
+            .where(
+                and_(
+                    Slot.id == hold_info["slot_id"],
+                    Slot.status == SlotStatus.HELD,
+                    Slot.deleted_at.is_(None)
+                )
             )
-            
-            self.db.add(booking)
-            
-            # Update slot status
-            slot.status = SlotStatus.BOOKED
-            
-            # Create Google Calendar events
-            await self._create_calendar_events(booking)
-            
-            # Send notifications
-            await self._send_booking_confirmation(booking)
-            
-            await self.db.commit()
-            await self.db.refresh(booking)
-            
-            return booking
+            .values(status=SlotStatus.BOOKED, updated_at=func.now())
+            .returning(Slot.id, Slot.tutor_id, Slot.start_at, Slot.end_at)
+        )
+        slot = result.one_or_none()
+        
+        if not slot:
+            raise BookingError("No held slot found")
+        
+        # Create booking
+        booking = Booking(
+            student_id=student_id,
+            tutor_id=slot.tutor_id,
+            start_at=slot.start_at,
+            end_at=slot.end_at,
+            status=BookingStatus.CONFIRMED,
+            price_cents=price_cents,
+            payment_intent_id=payment_intent_id,
+            slot_id=slot.id
+        )
+        
+        self.db.add(booking)
+        
+        await self.db.commit()
+        await self.db.refresh(booking)
+        
+        # The hold is spent; expiry would clear it anyway if this fails
+        await self._delete_hold(hold_token)
+        
+        # Queue calendar events and notifications once the booking is committed
+        self._queue_calendar_events(booking)
+        self._send_booking_confirmation(booking)
+        
+        return booking
+    
+    async def _get_hold(self, hold_token: str) -> Optional[Dict[str, Any]]:
+        """Look up the hold a token was issued for, or None if it expired or is unknown"""
+        if _is_signed_hold_token(hold_token):
+            return _decode_hold_token(hold_token)
+        
+        redis = get_redis()
+        if redis is None:
+            return None
+        
+        try:
+            raw_hold = await redis.get(f"{HOLD_KEY_PREFIX}{hold_token}")
+        except RedisError as e:
+            raise BookingError("Slot holds are unavailable") from e
+        
+        return json.loads(raw_hold) if raw_hold is not None else None
+    
+    async def _delete_hold(self, hold_token: str) -> None:
+        """Drop a spent Redis-backed hold"""
+        redis = None if _is_signed_hold_token(hold_token) else get_redis()
+        if redis is None:
+            return
+        
+        try:
+            await redis.delete(f"{HOLD_KEY_PREFIX}{hold_token}")
+        except RedisError:
+            logger.warning("Could not delete spent hold token", exc_info=True)
     
     async def _calculate_booking_price(self, tutor_id: str, start_at: datetime, end_at: datetime) -> int:
         """Calculate booking price based on tutor's hourly rate"""
+        minutes = int((end_at - start_at).total_seconds() // 60)
+        
+        # Integer cents arithmetic avoids float drift on odd durations
+        return await self._get_hourly_rate_cents(tutor_id) * minutes // 60
+    
+    async def _get_hourly_rate_cents(self, tutor_id: str) -> int:
+        """Get a tutor's hourly rate, cached briefly across requests"""
         from app.models.tutor_profile import TutorProfile
         
-        tutor_profile = await self.db.execute(
-            select(TutorProfile).where(
+        hourly_rate_cents = _hourly_rate_cache.get(str(tutor_id))
+        if hourly_rate_cents is not None:
+            return hourly_rate_cents
+        
+        hourly_rate_cents = (await self.db.execute(
+            select(TutorProfile.hourly_rate_cents).where(
                 and_(
                     TutorProfile.user_id == tutor_id,
                     TutorProfile.deleted_at.is_(None)
                 )
             )
-        ).scalar_one_or_none()
+        )).scalar_one_or_none()
         
-        if not tutor_profile:
+        if hourly_rate_cents is None:
             raise BookingError("Tutor profile not found")
         
-        duration_hours = (end_at - start_at).total_seconds() / 3600
-        return int(tutor_profile.hourly_rate_cents * duration_hours)
+        _hourly_rate_cache[str(tutor_id)] = hourly_rate_cents
+        return hourly_rate_cents
     
     async def _create_calendar_events(self, booking: Booking) -> None:
         """Create Google Calendar events for both tutor and student"""
         try:
-            # Get tutor and student details
-            tutor = await self.db.execute(
-                select(User).where(User.id == booking.tutor_id)
-            ).scalar_one()
-            
-            student = await self.db.execute(
-                select(User).where(User.id == booking.student_id)
-            ).scalar_one()
-            
-            # Create event for tutor
-            if tutor:
-                tutor_oauth = await self.db.execute(
-                    select(GoogleOAuthAccount).where(
-                        and_(
-                            GoogleOAuthAccount.user_id == booking.tutor_id,
-                            GoogleOAuthAccount.deleted_at.is_(None)
-                        )
-                    )
-                ).scalar_one_or_none()
-                
-                if tutor_oauth:
-                    event_id = await self.google_calendar.create_event(
-                        access_token=tutor_oauth.access_token,
-                        summary=f"Tutoring Session - {student.name}",
-                        description=f"Tutoring session with {student.name}",
-                        start_time=booking.start_at,
-                        end_time=booking.end_at,
-                        attendee_email=student.email
+            # Get tutor and student details alongside the booking
+            result = await self.db.execute(
+                select(Booking)
+                .options(joinedload(Booking.tutor), joinedload(Booking.student))
+                .where(Booking.id == booking.id)
+            )
+            booking = result.unique().scalar_one()
+            tutor = booking.tutor
+            student = booking.student
+            
+            if not tutor or not student:
+                return
+            
+            access_tokens = await self._get_access_tokens([booking.tutor_id, booking.student_id])
+            tutor_token = access_tokens.get(str(booking.tutor_id))
+            student_token = access_tokens.get(str(booking.student_id))
+            
+            # Create both events concurrently through the Calendar batch endpoint
+            requests = {}
+            if tutor_token:
+                requests["tutor"] = self.google_calendar.create_events(tutor_token, [{
+                    "summary": f"Tutoring Session - {student.name}",
+                    "description": f"Tutoring session with {student.name}",
+                    "start_time": booking.start_at,
+                    "end_time": booking.end_at,
+                    "attendee_email": student.email
+                }])
+            if student_token:
+                requests["student"] = self.google_calendar.create_events(student_token, [{
+                    "summary": f"Tutoring Session - {tutor.name}",
+                    "description": f"Tutoring session with {tutor.name}",
+                    "start_time": booking.start_at,
+                    "end_time": booking.end_at,
+                    "attendee_email": tutor.email
+                }])
+            
+            results = await asyncio.gather(*requests.values(), return_exceptions=True)
+            
+            for side, result in zip(requests, results):
+                event_id = None if isinstance(result, Exception) else result[0]
+                if event_id is None:
+                    # Log error but don't fail the booking
+                    logger.error(
+                        "Error creating %s calendar event for booking %s",
+                        side,
+                        booking.id,
+                        exc_info=result if isinstance(result, Exception) else None
                     )
+                elif side == "tutor":
                     booking.calendar_event_id_tutor = event_id
-            
-            # Create event for student
-            student_oauth = await self.db.execute(
-                select(GoogleOAuthAccount).where(
+                else:
+                    booking.calendar_event_id_student = event_id
+                
+        except Exception:
+            # Log error but don't fail the booking
+            logger.exception("Error creating calendar events for booking %s", booking.id)
+    
+    async def _get_access_tokens(self, user_ids: List[str]) -> Dict[str, str]:
+        """Get Google access tokens for connected users, keyed by user id
+        
+        Lookups (including "not connected") are cached briefly; uncached users
+        are loaded in one query.
+        """
+        user_ids = [str(user_id) for user_id in user_ids]
+        missing = [user_id for user_id in user_ids if user_id not in _oauth_token_cache]
+        
+        if missing:
+            result = await self.db.execute(
+                select(GoogleOAuthAccount.user_id, GoogleOAuthAccount.access_token).where(
                     and_(
-                        GoogleOAuthAccount.user_id == booking.student_id,
+                        GoogleOAuthAccount.user_id.in_(missing),
                         GoogleOAuthAccount.deleted_at.is_(None)
                     )
                 )
-            ).scalar_one_or_none()
+            )
+            tokens = {str(user_id): access_token for user_id, access_token in result}
             
-            if student_oauth:
-                event_id = await self.google_calendar.create_event(
-                    access_token=student_oauth.access_token,
-                    summary=f"Tutoring Session - {tutor.name}",
-                    description=f"Tutoring session with {tutor.name}",
-                    start_time=booking.start_at,
-                    end_time=booking.end_at,
-                    attendee_email=tutor.email
-                )
-                booking.calendar_event_id_student = event_id
-                
-        except Exception as e:
+            for user_id in missing:
+                _oauth_token_cache[user_id] = tokens.get(user_id)
+        
+        access_tokens = {}
+        for user_id in user_ids:
+            access_token = _oauth_token_cache.get(user_id)
+            if access_token:
+                access_tokens[user_id] = access_token
+        
+        return access_tokens
+    
+    def _queue_calendar_events(self, booking: Booking) -> None:
+        """Queue Google Calendar event creation"""
+        try:
+            create_booking_calendar_events.delay(str(booking.id))
+        except Exception:
             # Log error but don't fail the booking
-            print(f"Error creating calendar events: {e}")
+            logger.exception("Error queueing calendar events for booking %s", booking.id)
     
-    async def _send_booking_confirmation(self, booking: Booking) -> None:
-        """Send booking confirmation notifications"""
+    def _send_booking_confirmation(self, booking: Booking) -> None:
+        """Queue booking confirmation notifications"""
         try:
             # Send email notifications
-            await self.notification_service.send_booking_confirmation_email(booking)
+            for recipient in BOOKING_EMAIL_RECIPIENTS:
+                dispatch_booking_confirmation_email.delay(str(booking.id), recipient)
             
             # Send in-app notifications
-            await self.notification_service.send_booking_confirmation_notification(booking)
+            dispatch_booking_confirmation_inapp.delay(str(booking.id))
             
-        except Exception as e:
+        except Exception:
             # Log error but don't fail the booking
-            print(f"Error sending booking confirmation: {e}")
+            logger.exception("Error sending booking confirmation for booking %s", booking.id)
     
     async def cancel_booking(self, booking_id: str, reason: str = "Cancelled by user") -> Booking:
         """Cancel a booking with proper refund handling"""
+        booking = await self._get_booking_for_update(booking_id)
         
-        async with self.db.begin():
-            booking = await self.db.execute(
-                select(Booking).where(
-                    and_(
-                        Booking.id == booking_id,
-                        Booking.deleted_at.is_(None)
-                    )
-                ).with_for_update()
-            ).scalar_one_or_none()
-            
-            if not booking:
-                raise BookingError("Booking not found")
-            
-            if booking.status in [BookingStatus.CANCELED, BookingStatus.COMPLETED]:
-                raise BookingError("Booking cannot be cancelled")
-            
-            # Update booking status
-            booking.status = BookingStatus.CANCELED
-            booking.notes = f"{booking.notes or ''}\nCancelled: {reason}"
-            
-            # Free up the slot
-            if booking.slot_id:
-                slot = await self.db.execute(
-                    select(Slot).where(Slot.id == booking.slot_id)
-                ).scalar_one()
-                if slot:
-                    slot.status = SlotStatus.OPEN
-            
-            # Handle refunds
-            await self._process_cancellation_refund(booking)
-            
-            # Cancel calendar events
-            await self._cancel_calendar_events(booking)
-            
-            # Send cancellation notifications
-            await self._send_cancellation_notifications(booking)
-            
-            await self.db.commit()
-            await self.db.refresh(booking)
-            
-            return booking
+        if booking.status in [BookingStatus.CANCELED, BookingStatus.COMPLETED]:
+            raise BookingError("Booking cannot be cancelled")
+        
+        await self._cancel_booking_inner(booking, reason)
+        
+        await self.db.commit()
+        await self.db.refresh(booking)
+        
+        # Refund, calendar cleanup and notifications run once the cancellation is committed
+        await self._after_cancellation(booking)
+        
+        return booking
+    
+    async def _get_booking_for_update(self, booking_id: str) -> Booking:
+        """Load and lock a booking, raising if it doesn't exist"""
+        result = await self.db.execute(
+            select(Booking).where(
+                and_(
+                    Booking.id == booking_id,
+                    Booking.deleted_at.is_(None)
+                )
+            ).with_for_update()
+        )
+        booking = result.scalar_one_or_none()
+        
+        if not booking:
+            raise BookingError("Booking not found")
+        
+        return booking
+    
+    async def _cancel_booking_inner(self, booking: Booking, reason: str) -> None:
+        """Mark a booking cancelled and free its slot in the current transaction"""
+        # Update booking status
+        booking.status = BookingStatus.CANCELED
+        booking.notes = f"{booking.notes or ''}\nCancelled: {reason}"
+        
+        # Free up the slot
+        if booking.slot_id:
+            await self.db.execute(
+                update(Slot)
+                .where(Slot.id == booking.slot_id)
+                .values(status=SlotStatus.OPEN, updated_at=func.now())
+            )
+    
+    async def _after_cancellation(self, booking: Booking) -> None:
+        """Run a committed cancellation's side effects"""
+        await self._process_cancellation_refund(booking)
+        
+        # Queue calendar cleanup and cancellation notifications
+        self._queue_calendar_cancellation(booking)
+        self._send_cancellation_notifications(booking)
     
     async def _process_cancellation_refund(self, booking: Booking) -> None:
         """Process refund for cancelled booking"""
         # This would integrate with your payment service
         # For now, we'll just log the refund requirement
-        print(f"Refund required for booking {booking.id}: {booking.price_cents} cents")
+        logger.info("Refund required for booking %s: %s cents", booking.id, booking.price_cents)
     
     async def _cancel_calendar_events(self, booking: Booking) -> None:
         """Cancel Google Calendar events"""
         try:
-            # Cancel tutor's event
-            if booking.calendar_event_id_tutor:
-                tutor_oauth = await self.db.execute(
-                    select(GoogleOAuthAccount).where(
-                        and_(
-                            GoogleOAuthAccount.user_id == booking.tutor_id,
-                            GoogleOAuthAccount.deleted_at.is_(None)
-                        )
-                    )
-                ).scalar_one_or_none()
-                
-                if tutor_oauth:
-                    await self.google_calendar.delete_event(
-                        access_token=tutor_oauth.access_token,
-                        event_id=booking.calendar_event_id_tutor
-                    )
-            
-            # Cancel student's event
-            if booking.calendar_event_id_student:
-                student_oauth = await self.db.execute(
-                    select(GoogleOAuthAccount).where(
-                        and_(
-                            GoogleOAuthAccount.user_id == booking.student_id,
-                            GoogleOAuthAccount.deleted_at.is_(None)
-                        )
-                    )
-                ).scalar_one_or_none()
-                
-                if student_oauth:
-                    await self.google_calendar.delete_event(
-                        access_token=student_oauth.access_token,
-                        event_id=booking.calendar_event_id_student
+            events = {
+                str(booking.tutor_id): booking.calendar_event_id_tutor,
+                str(booking.student_id): booking.calendar_event_id_student,
+            }
+            events = {user_id: event_id for user_id, event_id in events.items() if event_id}
+            if not events:
+                return
+            
+            access_tokens = await self._get_access_tokens(list(events))
+            
+            # Cancel tutor's and student's events concurrently through the Calendar batch endpoint
+            results = await asyncio.gather(*[
+                self.google_calendar.delete_events(access_tokens[user_id], [event_id])
+                for user_id, event_id in events.items()
+                if user_id in access_tokens
+            ], return_exceptions=True)
+            
+            for result in results:
+                if isinstance(result, Exception) or not all(result):
+                    logger.error(
+                        "Error cancelling calendar event for booking %s",
+                        booking.id,
+                        exc_info=result if isinstance(result, Exception) else None
                     )
                     
-        except Exception as e:
-            print(f"Error cancelling calendar events: {e}")
+        except Exception:
+            logger.exception("Error cancelling calendar events for booking %s", booking.id)
+    
+    def _queue_calendar_cancellation(self, booking: Booking) -> None:
+        """Queue Google Calendar event deletion"""
+        try:
+            cancel_booking_calendar_events.delay(str(booking.id))
+        except Exception:
+            logger.exception("Error queueing calendar cancellation for booking %s", booking.id)
     
-    async def _send_cancellation_notifications(self, booking: Booking) -> None:
-        """Send cancellation notifications"""
+    def _send_cancellation_notifications(self, booking: Booking) -> None:
+        """Queue cancellation notifications"""
         try:
-            await self.notification_service.send_booking_cancellation_notification(booking)
-        except Exception as e:
-            print(f"Error sending cancellation notifications: {e}")
+            for recipient in BOOKING_EMAIL_RECIPIENTS:
+                dispatch_booking_cancellation_email.delay(str(booking.id), recipient)
+            dispatch_booking_cancellation_inapp.delay(str(booking.id))
+        except Exception:
+            logger.exception("Error sending cancellation notifications for booking %s", booking.id)
     
     async def reschedule_booking(
         self,
@@ -508,72 +894,63 @@ class SchedulingService:
     ) -> Booking:
         """Reschedule a booking to a new slot"""
         
-        async with self.db.begin():
-            # Get original booking
-            booking = await self.db.execute(
-                select(Booking).where(
-                    and_(
-                        Booking.id == booking_id,
-                        Booking.deleted_at.is_(None)
-                    )
-                ).with_for_update()
-            ).scalar_one_or_none()
-            
-            if not booking:
-                raise BookingError("Booking not found")
-            
-            if booking.status in [BookingStatus.CANCELED, BookingStatus.COMPLETED]:
-                raise BookingError("Booking cannot be rescheduled")
-            
-            # Get new slot
-            new_slot = await self.db.execute(
-                select(Slot).where(
-                    and_(
-                        Slot.id == new_slot_id,
-                        Slot.status == SlotStatus.OPEN,
-                        Slot.deleted_at.is_(None)
-                    )
-                ).with_for_update()
-            ).scalar_one_or_none()
-            
-            if not new_slot:
-                raise BookingError("New slot not available")
-            
-            # Cancel original booking
-            await self.cancel_booking(booking_id, f"Rescheduled to {new_slot.start_at}")
-            
-            # Create new booking
-            new_booking = Booking(
-                student_id=booking.student_id,
-                tutor_id=booking.tutor_id,
-                start_at=new_slot.start_at,
-                end_at=new_slot.end_at,
-                status=BookingStatus.CONFIRMED,
-                price_cents=booking.price_cents,
-                payment_intent_id=booking.payment_intent_id,
-                slot_id=new_slot.id,
-                notes=f"Rescheduled from {booking.start_at}. Reason: {reason}"
+        # Get original booking
+        booking = await self._get_booking_for_update(booking_id)
+        
+        if booking.status in [BookingStatus.CANCELED, BookingStatus.COMPLETED]:
+            raise BookingError("Booking cannot be rescheduled")
+        
+        # Claim the new slot OPEN -> BOOKED in one conditional UPDATE
+        result = await self.db.execute(
+            update(Slot)
+            .where(
+                and_(
+                    Slot.id == new_slot_id,
+                    Slot.status == SlotStatus.OPEN,
+                    Slot.deleted_at.is_(None)
+                )
             )
-            
-            self.db.add(new_booking)
-            
-            # Update new slot status
-            new_slot.status = SlotStatus.BOOKED
-            
-            # Create new calendar events
-            await self._create_calendar_events(new_booking)
-            
-            # Send reschedule notifications
-            await self._send_reschedule_notifications(new_booking, booking)
-            
-            await self.db.commit()
-            await self.db.refresh(new_booking)
-            
-            return new_booking
+            .values(status=SlotStatus.BOOKED, updated_at=func.now())
+            .returning(Slot.id, Slot.start_at, Slot.end_at)
+        )
+        new_slot = result.one_or_none()
+        
+        if not new_slot:
+            raise BookingError("New slot not available")
+        
+        # Cancel original booking in the same transaction
+        await self._cancel_booking_inner(booking, f"Rescheduled to {new_slot.start_at}")
+        
+        # Create new booking
+        new_booking = Booking(
+            student_id=booking.student_id,
+            tutor_id=booking.tutor_id,
+            start_at=new_slot.start_at,
+            end_at=new_slot.end_at,
+            status=BookingStatus.CONFIRMED,
+            price_cents=booking.price_cents,
+            payment_intent_id=booking.payment_intent_id,
+            slot_id=new_slot.id,
+            notes=f"Rescheduled from {booking.start_at}. Reason: {reason}"
+        )
+        
+        self.db.add(new_booking)
+        
+        await self.db.commit()
+        await self.db.refresh(new_booking)
+        
+        # Clean up the original booking and queue side effects once committed
+        await self._after_cancellation(booking)
+        self._queue_calendar_events(new_booking)
+        self._send_reschedule_notifications(new_booking, booking)
+        
+        return new_booking
     
-    async def _send_reschedule_notifications(self, new_booking: Booking, old_booking: Booking) -> None:
-        """Send reschedule notifications"""
+    def _send_reschedule_notifications(self, new_booking: Booking, old_booking: Booking) -> None:
+        """Queue reschedule notifications"""
         try:
-            await self.notification_service.send_booking_reschedule_notification(new_booking, old_booking)
-        except Exception as e:
-            print(f"Error sending reschedule notifications: {e}")
+            for recipient in BOOKING_EMAIL_RECIPIENTS:
+                dispatch_booking_reschedule_email.delay(str(new_booking.id), str(old_booking.id), recipient)
+            dispatch_booking_reschedule_inapp.delay(str(new_booking.id))
+        except Exception:
+            logger.exception("Error sending reschedule notifications for booking %s", new_booking.id)
@@ -1,7 +1,21 @@
+from typing import List, Optional, Tuple
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Max SMS requests in flight during a bulk send
+SMS_BULK_MAX_CONCURRENCY = 20
+
+# Message templates
+SMS_REMINDER_TEMPLATE = "Hi {user_name}, your tutoring session is in {reminder_type}. "
+SMS_CONFIRMATION_TEMPLATE = "Hi {user_name}, your tutoring session is confirmed for {start_time}. "
+SMS_CANCELLATION_TEMPLATE = "Hi {user_name}, your tutoring session for {start_time} has been cancelled."
+SMS_PAYMENT_SUCCESS_TEMPLATE = "Hi {user_name}, your payment of ${amount:.2f} was successful."
+SMS_PAYMENT_FAILED_TEMPLATE = "Hi {user_name}, your payment of ${amount:.2f} failed. Please try again."
+SMS_CREDIT_LOW_TEMPLATE = "Hi {user_name}, your credit balance is low ({current_balance} credits). Please top up soon."
+SMS_JOIN_LINK_TEMPLATE = "Join at: {join_link}"
+
 
 class SMSService:
     """SMS service for sending notifications via Twilio or similar provider"""
@@ -24,6 +38,18 @@ class SMSService:
             logger.error(f"Error sending SMS: {e}")
             return False
     
+    async def send_bulk(self, messages: List[Tuple[str, str]]) -> List[bool]:
+        """Send many (phone_number, message) SMS concurrently, returning per-message success"""
+        semaphore = asyncio.Semaphore(SMS_BULK_MAX_CONCURRENCY)
+        
+        async def send(phone_number: str, message: str) -> bool:
+            async with semaphore:
+                return await self.send_sms(phone_number, message)
+        
+        return await asyncio.gather(*[
+            send(phone_number, message) for phone_number, message in messages
+        ])
+    
     async def send_booking_reminder(
         self,
         phone_number: str,
@@ -34,9 +60,9 @@ class SMSService:
     ) -> bool:
         """Send booking reminder SMS"""
         try:
-            message = f"Hi {user_name}, your tutoring session is in {reminder_type}. "
+            message = SMS_REMINDER_TEMPLATE.format(user_name=user_name, reminder_type=reminder_type)
             if join_link:
-                message += f"Join at: {join_link}"
+                message += SMS_JOIN_LINK_TEMPLATE.format(join_link=join_link)
             
             return await self.send_sms(phone_number, message)
         except Exception as e:
@@ -52,9 +78,9 @@ class SMSService:
     ) -> bool:
         """Send booking confirmation SMS"""
         try:
-            message = f"Hi {user_name}, your tutoring session is confirmed for {start_time}. "
+            message = SMS_CONFIRMATION_TEMPLATE.format(user_name=user_name, start_time=start_time)
             if join_link:
-                message += f"Join at: {join_link}"
+                message += SMS_JOIN_LINK_TEMPLATE.format(join_link=join_link)
             
             return await self.send_sms(phone_number, message)
         except Exception as e:
@@ -69,7 +95,7 @@ class SMSService:
     ) -> bool:
         """Send booking cancellation SMS"""
         try:
-            message = f"Hi {user_name}, your tutoring session for {start_time} has been cancelled."
+            message = SMS_CANCELLATION_TEMPLATE.format(user_name=user_name, start_time=start_time)
             return await self.send_sms(phone_number, message)
         except Exception as e:
             logger.error(f"Error sending booking cancellation SMS: {e}")
@@ -83,7 +109,7 @@ class SMSService:
     ) -> bool:
         """Send payment success SMS"""
         try:
-            message = f"Hi {user_name}, your payment of ${amount:.2f} was successful."
+            message = SMS_PAYMENT_SUCCESS_TEMPLATE.format(user_name=user_name, amount=amount)
             return await self.send_sms(phone_number, message)
         except Exception as e:
             logger.error(f"Error sending payment success SMS: {e}")
@@ -97,7 +123,7 @@ class SMSService:
     ) -> bool:
         """Send payment failed SMS"""
         try:
-            message = f"Hi {user_name}, your payment of ${amount:.2f} failed. Please try again."
+            message = SMS_PAYMENT_FAILED_TEMPLATE.format(user_name=user_name, amount=amount)
             return await self.send_sms(phone_number, message)
         except Exception as e:
             logger.error(f"Error sending payment failed SMS: {e}")
@@ -111,8 +137,22 @@ class SMSService:
     ) -> bool:
         """Send low credit balance SMS"""
         try:
-            message = f"Hi {user_name}, your credit balance is low ({current_balance} credits). Please top up soon."
+            message = SMS_CREDIT_LOW_TEMPLATE.format(user_name=user_name, current_balance=current_balance)
             return await self.send_sms(phone_number, message)
         except Exception as e:
             logger.error(f"Error sending low credit SMS: {e}")
             return False
+
+
+# Shared instance so callers reuse one service (and its provider connections)
+_sms_service: Optional[SMSService] = None
+
+
+def get_sms_service() -> SMSService:
+    """Get the shared SMS service"""
+    global _sms_service
+
+    if _sms_service is None:
+        _sms_service = SMSService()
+
+    return _sms_service
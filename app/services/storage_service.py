@@ -1,383 +1,744 @@
-import boto3
 import asyncio
 import logging
-from typing import Optional, Dict, Any
-from pathlib import Path
-import uuid
+from typing import Optional, Dict, Any, AsyncIterator, BinaryIO, List, Union
+import secrets
 import mimetypes
+import hashlib
+import io
+from functools import lru_cache
+import orjson
 from datetime import datetime, timezone
 import aiofiles
-import tempfile
 import os
+from boto3.s3.transfer import TransferConfig
+from redis.exceptions import RedisError
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.exceptions import FileUploadError
+from app.core.redis_client import get_redis
+from app.core.s3_client import get_s3_client
+from app.models.upload import Upload
 
 logger = logging.getLogger(__name__)
 
+# Per-user storage usage is cached briefly; S3 LIST requests are comparatively expensive
+STORAGE_USAGE_PREFIX = "storage:usage:"
+STORAGE_USAGE_TTL_SECONDS = 60
 
-class StorageService:
-    """Storage service for file uploads to S3 or Supabase Storage"""
+# Uploads accept raw bytes or a seekable binary file (e.g. UploadFile.file)
+FileSource = Union[bytes, BinaryIO]
+
+# Signed S3 URLs are reused until shortly before they expire
+PRESIGNED_URL_PREFIX = "s3url:"
+PRESIGNED_URL_EXPIRY_MARGIN_SECONDS = 300
+
+# Most keys a single bulk delete request may carry
+DELETE_BATCH_SIZE = 1000
+
+
+# Leading bytes of the binary formats we accept, mapped to the MIME types they can carry
+MAGIC_SIGNATURES = (
+    (b'%PDF-', frozenset({'application/pdf'})),
+    (b'{\\rtf', frozenset({'application/rtf'})),
+    # ZIP containers: Office Open XML and OpenDocument
+    (b'PK\x03\x04', frozenset({
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        'application/vnd.oasis.opendocument.text',
+        'application/vnd.oasis.opendocument.spreadsheet',
+        'application/vnd.oasis.opendocument.presentation'
+    })),
+    # OLE2 compound files: legacy Word and PowerPoint
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', frozenset({
+        'application/msword',
+        'application/vnd.ms-powerpoint'
+    })),
+)
+BINARY_MIME_TYPES = frozenset().union(*(mime_types for _, mime_types in MAGIC_SIGNATURES))
+
+
+def _sniff_mime_types(head: bytes) -> Optional[frozenset]:
+    """MIME types consistent with a file's leading bytes, or None if none match"""
+    for signature, mime_types in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_types
     
-    def __init__(self):
-        self.storage_type = settings.STORAGE_TYPE  # "s3" or "supabase"
-        
-        if self.storage_type == "s3":
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
-            )
-            self.bucket_name = settings.AWS_S3_BUCKET
-        elif self.storage_type == "supabase":
-            # Initialize Supabase client
-            import supabase
-            self.supabase_client = supabase.create_client(
-                settings.SUPABASE_URL,
-                settings.SUPABASE_ANON_KEY
-            )
-            self.bucket_name = settings.SUPABASE_STORAGE_BUCKET
+    return None
+
+
+def _read_head(file: FileSource, size: int = 16) -> bytes:
+    """First bytes of a file source, leaving a stream's position unchanged"""
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file[:size])
     
-    async def upload_file(
-        self,
-        file_content: bytes,
-        original_filename: str,
-        user_id: str,
-        file_type: str = "notes"
-    ) -> Dict[str, Any]:
-        """Upload file to storage and return file information"""
-        try:
-            # Generate unique file key
-            file_extension = Path(original_filename).suffix
-            file_key = f"{user_id}/{file_type}/{uuid.uuid4()}{file_extension}"
-            
-            # Determine MIME type
-            mime_type, _ = mimetypes.guess_type(original_filename)
-            if not mime_type:
-                mime_type = "application/octet-stream"
-            
-            # Upload based on storage type
-            if self.storage_type == "s3":
-                await self._upload_to_s3(file_content, file_key, mime_type)
-            elif self.storage_type == "supabase":
-                await self._upload_to_supabase(file_content, file_key, mime_type)
-            else:
-                raise FileUploadError(f"Unsupported storage type: {self.storage_type}")
-            
-            # Return file information
-            return {
-                "file_key": file_key,
-                "original_filename": original_filename,
-                "mime_type": mime_type,
-                "file_size": len(file_content),
-                "uploaded_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"Error uploading file {original_filename}: {e}")
-            raise FileUploadError(f"Failed to upload file: {str(e)}")
+    position = file.tell()
+    file.seek(0)
+    try:
+        return file.read(size)
+    finally:
+        file.seek(position)
+
+
+def _file_extension(filename: str) -> str:
+    """Extension of a filename including the dot, or "" if it has none"""
+    stem, dot, extension = filename.rpartition('.')
+    return f".{extension}" if dot and stem and '/' not in extension else ""
+
+
+def _guess_mime_type(filename: str) -> Optional[str]:
+    """MIME type guessed from a filename's extension"""
+    return _mime_type_for_extension(_file_extension(filename).lower())
+
+
+@lru_cache(maxsize=256)
+def _mime_type_for_extension(extension: str) -> Optional[str]:
+    return mimetypes.guess_type(f"file{extension}")[0] if extension else None
+
+
+def _content_hash(file: FileSource) -> str:
+    """SHA-256 hex digest of a file source, streaming files in chunks"""
+    if isinstance(file, (bytes, bytearray)):
+        return hashlib.sha256(file).hexdigest()
     
-    async def download_file(self, file_key: str) -> bytes:
-        """Download file from storage"""
-        try:
-            if self.storage_type == "s3":
-                return await self._download_from_s3(file_key)
-            elif self.storage_type == "supabase":
-                return await self._download_from_supabase(file_key)
-            else:
-                raise FileUploadError(f"Unsupported storage type: {self.storage_type}")
-                
-        except Exception as e:
-            logger.error(f"Error downloading file {file_key}: {e}")
-            raise FileUploadError(f"Failed to download file: {str(e)}")
+    position = file.tell()
+    file.seek(0)
+    try:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+    finally:
+        file.seek(position)
+
+
+def _content_length(file: FileSource) -> int:
+    """Size of a file source in bytes, without reading a stream into memory"""
+    if isinstance(file, (bytes, bytearray)):
+        return len(file)
     
-    async def delete_file(self, file_key: str) -> bool:
-        """Delete file from storage"""
-        try:
-            if self.storage_type == "s3":
-                return await self._delete_from_s3(file_key)
-            elif self.storage_type == "supabase":
-                return await self._delete_from_supabase(file_key)
-            else:
-                raise FileUploadError(f"Unsupported storage type: {self.storage_type}")
-                
-        except Exception as e:
-            logger.error(f"Error deleting file {file_key}: {e}")
-            raise FileUploadError(f"Failed to delete file: {str(e)}")
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+# Shared Supabase client so its HTTP connections are reused across requests
+_supabase_client: Optional[Any] = None
+
+
+def get_supabase_client() -> Any:
+    """Get the shared Supabase client"""
+    global _supabase_client
     
-    async def get_file_url(self, file_key: str, expires_in: int = 3600) -> str:
-        """Get presigned URL for file access"""
-        try:
-            if self.storage_type == "s3":
-                return await self._get_s3_presigned_url(file_key, expires_in)
-            elif self.storage_type == "supabase":
-                return await self._get_supabase_url(file_key)
-            else:
-                raise FileUploadError(f"Unsupported storage type: {self.storage_type}")
-                
-        except Exception as e:
-            logger.error(f"Error getting file URL for {file_key}: {e}")
-            raise FileUploadError(f"Failed to get file URL: {str(e)}")
+    if _supabase_client is None:
+        import supabase
+        _supabase_client = supabase.create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_ANON_KEY
+        )
     
-    async def _upload_to_s3(self, file_content: bytes, file_key: str, mime_type: str):
+    return _supabase_client
+
+
+class _S3Backend:
+    """S3 storage backend"""
+    
+    def __init__(self):
+        # The S3 client itself is shared per worker; see get_s3_client
+        self.bucket_name = settings.AWS_S3_BUCKET
+    
+    async def prewarm(self):
+        """Open the shared S3 client ahead of the first request that needs it"""
+        await get_s3_client()
+    
+    async def upload(
+        self,
+        file_content: FileSource,
+        file_key: str,
+        mime_type: str,
+        file_size: int,
+        uploaded_at: str
+    ):
         """Upload file to S3"""
         try:
-            # Use asyncio to run S3 upload in thread pool
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: self.s3_client.put_object(
+            s3 = await get_s3_client()
+            metadata = {
+                'uploaded_at': uploaded_at
+            }
+            
+            part_size = settings.S3_MULTIPART_PART_SIZE_MB * 1024 * 1024
+            
+            if not isinstance(file_content, (bytes, bytearray)):
+                # Streams are read part by part and never held in memory whole
+                await s3.upload_fileobj(
+                    file_content,
+                    self.bucket_name,
+                    file_key,
+                    ExtraArgs={'ContentType': mime_type, 'Metadata': metadata},
+                    Config=TransferConfig(
+                        multipart_threshold=part_size,
+                        multipart_chunksize=part_size,
+                        max_concurrency=settings.S3_MULTIPART_MAX_CONCURRENCY
+                    )
+                )
+            elif file_size > part_size:
+                await self._multipart_upload(s3, file_content, file_key, mime_type, metadata)
+            else:
+                await s3.put_object(
                     Bucket=self.bucket_name,
                     Key=file_key,
-                    Body=file_content,
+                    # A BytesIO over bytes shares the buffer, and an explicit length
+                    # spares botocore from re-measuring and re-buffering the body
+                    Body=io.BytesIO(file_content),
+                    ContentLength=file_size,
                     ContentType=mime_type,
-                    Metadata={
-                        'uploaded_at': datetime.now(timezone.utc).isoformat()
-                    }
+                    Metadata=metadata
                 )
-            )
             
-            logger.info(f"Successfully uploaded {file_key} to S3")
+            logger.info("Successfully uploaded %s to S3", file_key)
             
         except Exception as e:
-            logger.error(f"Error uploading to S3: {e}")
+            logger.error("Error uploading to S3: %s", e, exc_info=True)
             raise FileUploadError(f"S3 upload failed: {str(e)}")
     
-    async def _download_from_s3(self, file_key: str) -> bytes:
-        """Download file from S3"""
-        try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.s3_client.get_object(
+    async def _multipart_upload(
+        self,
+        s3: Any,
+        file_content: bytes,
+        file_key: str,
+        mime_type: str,
+        metadata: Dict[str, str]
+    ):
+        """Upload a large file to S3 as concurrently uploaded parts"""
+        part_size = settings.S3_MULTIPART_PART_SIZE_MB * 1024 * 1024
+        semaphore = asyncio.Semaphore(settings.S3_MULTIPART_MAX_CONCURRENCY)
+        
+        upload = await s3.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=file_key,
+            ContentType=mime_type,
+            Metadata=metadata
+        )
+        upload_id = upload['UploadId']
+        
+        async def upload_part(part_number: int, offset: int) -> Dict[str, Any]:
+            async with semaphore:
+                # Slice inside the gate so only in-flight parts are copied
+                part = bytes(file_content[offset:offset + part_size])
+                response = await s3.upload_part(
                     Bucket=self.bucket_name,
-                    Key=file_key
+                    Key=file_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=io.BytesIO(part),
+                    ContentLength=len(part)
                 )
+                return {'PartNumber': part_number, 'ETag': response['ETag']}
+        
+        try:
+            parts = await asyncio.gather(*[
+                upload_part(part_number, offset)
+                for part_number, offset in enumerate(range(0, len(file_content), part_size), start=1)
+            ])
+            
+            await s3.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            # Don't leave orphaned parts accruing storage charges
+            await s3.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                UploadId=upload_id
+            )
+            raise
+    
+    async def download(self, file_key: str) -> bytes:
+        """Download file from S3"""
+        try:
+            s3 = await get_s3_client()
+            response = await s3.get_object(
+                Bucket=self.bucket_name,
+                Key=file_key
             )
             
-            file_content = response['Body'].read()
-            logger.info(f"Successfully downloaded {file_key} from S3")
+            async with response['Body'] as stream:
+                file_content = await stream.read()
+            logger.info("Successfully downloaded %s from S3", file_key)
             return file_content
             
         except Exception as e:
-            logger.error(f"Error downloading from S3: {e}")
+            logger.error("Error downloading from S3: %s", e, exc_info=True)
             raise FileUploadError(f"S3 download failed: {str(e)}")
     
-    async def _delete_from_s3(self, file_key: str) -> bool:
+    async def stream(self, file_key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """Stream file from S3 in chunks"""
+        s3 = await get_s3_client()
+        response = await s3.get_object(
+            Bucket=self.bucket_name,
+            Key=file_key
+        )
+        
+        async with response['Body'] as stream:
+            async for chunk in stream.iter_chunks(chunk_size):
+                yield chunk
+    
+    async def delete(self, file_key: str) -> bool:
         """Delete file from S3"""
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: self.s3_client.delete_object(
-                    Bucket=self.bucket_name,
-                    Key=file_key
-                )
+            s3 = await get_s3_client()
+            await s3.delete_object(
+                Bucket=self.bucket_name,
+                Key=file_key
             )
             
-            logger.info(f"Successfully deleted {file_key} from S3")
+            logger.info("Successfully deleted %s from S3", file_key)
             return True
             
         except Exception as e:
-            logger.error(f"Error deleting from S3: {e}")
+            logger.error("Error deleting from S3: %s", e, exc_info=True)
             raise FileUploadError(f"S3 delete failed: {str(e)}")
     
-    async def _get_s3_presigned_url(self, file_key: str, expires_in: int) -> str:
-        """Get presigned URL for S3 file"""
+    async def delete_many(self, file_keys: List[str]) -> List[bool]:
+        """Delete files from S3, one request per batch of keys"""
         try:
-            loop = asyncio.get_event_loop()
-            url = await loop.run_in_executor(
-                None,
-                lambda: self.s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': self.bucket_name, 'Key': file_key},
-                    ExpiresIn=expires_in
+            s3 = await get_s3_client()
+            failed = set()
+            
+            for start in range(0, len(file_keys), DELETE_BATCH_SIZE):
+                batch = file_keys[start:start + DELETE_BATCH_SIZE]
+                # Quiet mode only reports the keys that failed
+                response = await s3.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
                 )
+                failed.update(error['Key'] for error in response.get('Errors', []))
+            
+            logger.info("Deleted %s of %s files from S3", len(file_keys) - len(failed), len(file_keys))
+            return [key not in failed for key in file_keys]
+            
+        except Exception as e:
+            logger.error("Error deleting from S3: %s", e, exc_info=True)
+            raise FileUploadError(f"S3 delete failed: {str(e)}")
+    
+    async def url(self, file_key: str, expires_in: int) -> str:
+        """Get presigned URL for S3 file, reusing a cached one while it stays valid"""
+        try:
+            redis = get_redis()
+            key = f"{PRESIGNED_URL_PREFIX}{file_key}:{expires_in}"
+            cache_ttl = expires_in - PRESIGNED_URL_EXPIRY_MARGIN_SECONDS
+            
+            if redis is not None and cache_ttl > 0:
+                try:
+                    cached = await redis.get(key)
+                    if cached is not None:
+                        return cached
+                except RedisError:
+                    logger.warning("Presigned URL cache unavailable", exc_info=True)
+                    redis = None
+            
+            s3 = await get_s3_client()
+            url = await s3.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': file_key},
+                ExpiresIn=expires_in
             )
             
+            if redis is not None and cache_ttl > 0:
+                try:
+                    await redis.set(key, url, ex=cache_ttl)
+                except RedisError:
+                    logger.warning("Presigned URL cache unavailable", exc_info=True)
+            
             return url
             
         except Exception as e:
-            logger.error(f"Error generating S3 presigned URL: {e}")
+            logger.error("Error generating S3 presigned URL: %s", e, exc_info=True)
             raise FileUploadError(f"S3 presigned URL generation failed: {str(e)}")
     
-    async def _upload_to_supabase(self, file_content: bytes, file_key: str, mime_type: str):
+    async def usage(self, user_id: str) -> Dict[str, Any]:
+        """Get S3 storage usage for user"""
+        try:
+            s3 = await get_s3_client()
+            paginator = s3.get_paginator('list_objects_v2')
+            
+            total_files = 0
+            total_size_bytes = 0
+            
+            # Each page holds at most 1000 keys; walk them all
+            async for page in paginator.paginate(
+                Bucket=self.bucket_name,
+                Prefix=f"{user_id}/",
+                PaginationConfig={'PageSize': 1000}
+            ):
+                contents = page.get('Contents', [])
+                total_files += len(contents)
+                total_size_bytes += sum(obj['Size'] for obj in contents)
+            
+            return {
+                "total_files": total_files,
+                "total_size_mb": total_size_bytes / (1024 * 1024)
+            }
+            
+        except Exception as e:
+            logger.error("Error getting S3 usage: %s", e, exc_info=True)
+            return {"total_files": 0, "total_size_mb": 0}
+
+
+class _SupabaseBackend:
+    """Supabase Storage backend"""
+    
+    def __init__(self):
+        self.client = get_supabase_client()
+        self.bucket_name = settings.SUPABASE_STORAGE_BUCKET
+    
+    def _supabase_bucket(self):
+        """Storage bucket handle; its calls are blocking and run via asyncio.to_thread"""
+        return self.client.storage.from_(self.bucket_name)
+    
+    async def prewarm(self):
+        """Nothing to warm; the Supabase client is created with the backend"""
+    
+    async def upload(
+        self,
+        file_content: FileSource,
+        file_key: str,
+        mime_type: str,
+        file_size: int,
+        uploaded_at: str
+    ):
         """Upload file to Supabase Storage"""
         try:
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-            
-            try:
-                # Upload to Supabase
-                response = self.supabase_client.storage.from_(self.bucket_name).upload(
-                    path=file_key,
-                    file=temp_file_path,
-                    file_options={
-                        "content-type": mime_type
-                    }
-                )
-                
-                logger.info(f"Successfully uploaded {file_key} to Supabase")
-                
-            finally:
-                # Clean up temporary file
-                os.unlink(temp_file_path)
+            # The Supabase SDK needs the whole file
+            if not isinstance(file_content, (bytes, bytearray)):
+                file_content = await asyncio.to_thread(file_content.read)
+            
+            # Upload to Supabase straight from memory
+            response = await asyncio.to_thread(
+                self._supabase_bucket().upload,
+                path=file_key,
+                file=file_content,
+                file_options={
+                    "content-type": mime_type
+                }
+            )
+            
+            logger.info("Successfully uploaded %s to Supabase", file_key)
                 
         except Exception as e:
-            logger.error(f"Error uploading to Supabase: {e}")
+            logger.error("Error uploading to Supabase: %s", e, exc_info=True)
             raise FileUploadError(f"Supabase upload failed: {str(e)}")
     
-    async def _download_from_supabase(self, file_key: str) -> bytes:
+    async def download(self, file_key: str) -> bytes:
         """Download file from Supabase Storage"""
         try:
             # Download from Supabase
-            response = self.supabase_client.storage.from_(self.bucket_name).download(file_key)
+            response = await asyncio.to_thread(self._supabase_bucket().download, file_key)
             
-            logger.info(f"Successfully downloaded {file_key} from Supabase")
+            logger.info("Successfully downloaded %s from Supabase", file_key)
             return response
             
         except Exception as e:
-            logger.error(f"Error downloading from Supabase: {e}")
+            logger.error("Error downloading from Supabase: %s", e, exc_info=True)
             raise FileUploadError(f"Supabase download failed: {str(e)}")
     
-    async def _delete_from_supabase(self, file_key: str) -> bool:
+    async def stream(self, file_key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """Stream file from Supabase Storage"""
+        # The Supabase SDK only returns whole files
+        yield await self.download(file_key)
+    
+    async def delete(self, file_key: str) -> bool:
         """Delete file from Supabase Storage"""
         try:
             # Delete from Supabase
-            response = self.supabase_client.storage.from_(self.bucket_name).remove([file_key])
+            response = await asyncio.to_thread(self._supabase_bucket().remove, [file_key])
             
-            logger.info(f"Successfully deleted {file_key} from Supabase")
+            logger.info("Successfully deleted %s from Supabase", file_key)
             return True
             
         except Exception as e:
-            logger.error(f"Error deleting from Supabase: {e}")
+            logger.error("Error deleting from Supabase: %s", e, exc_info=True)
             raise FileUploadError(f"Supabase delete failed: {str(e)}")
     
-    async def _get_supabase_url(self, file_key: str) -> str:
+    async def delete_many(self, file_keys: List[str]) -> List[bool]:
+        """Delete files from Supabase Storage, one request per batch of keys"""
+        try:
+            bucket = self._supabase_bucket()
+            for start in range(0, len(file_keys), DELETE_BATCH_SIZE):
+                await asyncio.to_thread(bucket.remove, file_keys[start:start + DELETE_BATCH_SIZE])
+            
+            logger.info("Deleted %s files from Supabase", len(file_keys))
+            return [True] * len(file_keys)
+            
+        except Exception as e:
+            logger.error("Error deleting from Supabase: %s", e, exc_info=True)
+            raise FileUploadError(f"Supabase delete failed: {str(e)}")
+    
+    async def url(self, file_key: str, expires_in: int) -> str:
         """Get public URL for Supabase file"""
         try:
-            # Get public URL from Supabase
-            response = self.supabase_client.storage.from_(self.bucket_name).get_public_url(file_key)
+            # Public URLs don't expire, so expires_in does not apply
+            response = await asyncio.to_thread(self._supabase_bucket().get_public_url, file_key)
             
             return response
             
         except Exception as e:
-            logger.error(f"Error getting Supabase URL: {e}")
+            logger.error("Error getting Supabase URL: %s", e, exc_info=True)
             raise FileUploadError(f"Supabase URL generation failed: {str(e)}")
     
+    async def usage(self, user_id: str) -> Dict[str, Any]:
+        """Get Supabase storage usage for user"""
+        try:
+            # List files in user's directory
+            response = await asyncio.to_thread(self._supabase_bucket().list, path=f"{user_id}/")
+            
+            total_files = 0
+            total_size_bytes = 0
+            
+            for file_info in response:
+                total_files += 1
+                total_size_bytes += file_info.get('metadata', {}).get('size', 0)
+            
+            return {
+                "total_files": total_files,
+                "total_size_mb": total_size_bytes / (1024 * 1024)
+            }
+            
+        except Exception as e:
+            logger.error("Error getting Supabase usage: %s", e, exc_info=True)
+            return {"total_files": 0, "total_size_mb": 0}
+
+
+# Storage backends by STORAGE_TYPE setting
+STORAGE_BACKENDS = {
+    "s3": _S3Backend,
+    "supabase": _SupabaseBackend
+}
+
+
+class StorageService:
+    """Storage service for file uploads to S3 or Supabase Storage"""
+    
+    ALLOWED_EXTENSIONS = frozenset({
+        '.pdf', '.docx', '.doc', '.pptx', '.ppt',
+        '.txt', '.md', '.rtf', '.odt', '.ods', '.odp'
+    })
+    
+    ALLOWED_MIME_TYPES = frozenset({
+        'application/pdf',
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'application/msword',
+        'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        'application/vnd.ms-powerpoint',
+        'text/plain',
+        'text/markdown',
+        'application/rtf',
+        'application/vnd.oasis.opendocument.text',
+        'application/vnd.oasis.opendocument.spreadsheet',
+        'application/vnd.oasis.opendocument.presentation'
+    })
+    
+    def __init__(self):
+        self.storage_type = settings.STORAGE_TYPE  # "s3" or "supabase"
+        
+        # Resolve the backend once so a misconfiguration fails at startup
+        backend_class = STORAGE_BACKENDS.get(self.storage_type)
+        if backend_class is None:
+            raise FileUploadError(f"Unsupported storage type: {self.storage_type}")
+        self._backend = backend_class()
+    
+    async def upload_file(
+        self,
+        file_content: FileSource,
+        original_filename: str,
+        user_id: str,
+        file_type: str = "notes"
+    ) -> Dict[str, Any]:
+        """Upload file to storage and return file information"""
+        try:
+            # Generate unique file key
+            file_extension = _file_extension(original_filename)
+            file_key = f"{user_id}/{file_type}/{secrets.token_urlsafe(16)}{file_extension}"
+            
+            # Determine MIME type
+            mime_type = _guess_mime_type(original_filename) or "application/octet-stream"
+            
+            file_size = _content_length(file_content)
+            
+            # One timestamp for both the stored metadata and the response
+            uploaded_at = datetime.now(timezone.utc).isoformat()
+            
+            await self._backend.upload(file_content, file_key, mime_type, file_size, uploaded_at)
+            
+            # Return file information
+            return {
+                "file_key": file_key,
+                "original_filename": original_filename,
+                "mime_type": mime_type,
+                "file_size": file_size,
+                "uploaded_at": uploaded_at
+            }
+            
+        except Exception as e:
+            logger.error("Error uploading file %s: %s", original_filename, e, exc_info=True)
+            raise FileUploadError(f"Failed to upload file: {str(e)}")
+    
+    async def download_file(self, file_key: str) -> bytes:
+        """Download file from storage"""
+        try:
+            return await self._backend.download(file_key)
+            
+        except Exception as e:
+            logger.error("Error downloading file %s: %s", file_key, e, exc_info=True)
+            raise FileUploadError(f"Failed to download file: {str(e)}")
+    
+    async def stream_file(self, file_key: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+        """Stream a file from storage in chunks, e.g. into a StreamingResponse"""
+        try:
+            async for chunk in self._backend.stream(file_key, chunk_size):
+                yield chunk
+            
+        except Exception as e:
+            logger.error("Error streaming file %s: %s", file_key, e, exc_info=True)
+            raise FileUploadError(f"Failed to stream file: {str(e)}")
+    
+    async def delete_file(self, file_key: str) -> bool:
+        """Delete file from storage"""
+        try:
+            return await self._backend.delete(file_key)
+            
+        except Exception as e:
+            logger.error("Error deleting file %s: %s", file_key, e, exc_info=True)
+            raise FileUploadError(f"Failed to delete file: {str(e)}")
+    
+    async def delete_files(self, file_keys: List[str]) -> List[bool]:
+        """Delete many files from storage in bulk; returns per-key success"""
+        if not file_keys:
+            return []
+        
+        try:
+            return await self._backend.delete_many(file_keys)
+            
+        except Exception as e:
+            logger.error("Error deleting %s files: %s", len(file_keys), e, exc_info=True)
+            raise FileUploadError(f"Failed to delete files: {str(e)}")
+    
+    async def get_file_url(self, file_key: str, expires_in: int = 3600) -> str:
+        """Get presigned URL for file access"""
+        try:
+            return await self._backend.url(file_key, expires_in)
+            
+        except Exception as e:
+            logger.error("Error getting file URL for %s: %s", file_key, e, exc_info=True)
+            raise FileUploadError(f"Failed to get file URL: {str(e)}")
+    
+    async def _prewarm(self) -> None:
+        """Warm the backend connection; failures are left for the upload to report"""
+        try:
+            await self._backend.prewarm()
+        except Exception:
+            logger.warning("Could not prewarm %s storage backend", self.storage_type, exc_info=True)
+    
     async def validate_file(
         self,
-        file_content: bytes,
+        file_content: FileSource,
         original_filename: str,
-        max_size_mb: int = 50
+        max_size_mb: int = settings.MAX_UPLOAD_SIZE_MB
     ) -> Dict[str, Any]:
         """Validate uploaded file"""
         try:
             # Check file size
-            file_size_mb = len(file_content) / (1024 * 1024)
+            file_size_mb = _content_length(file_content) / (1024 * 1024)
             if file_size_mb > max_size_mb:
                 raise FileUploadError(f"File size {file_size_mb:.2f}MB exceeds maximum allowed size of {max_size_mb}MB")
             
             # Check file extension
-            allowed_extensions = {
-                '.pdf', '.docx', '.doc', '.pptx', '.ppt', 
-                '.txt', '.md', '.rtf', '.odt', '.ods', '.odp'
-            }
-            
-            file_extension = Path(original_filename).suffix.lower()
-            if file_extension not in allowed_extensions:
+            file_extension = _file_extension(original_filename).lower()
+            if file_extension not in self.ALLOWED_EXTENSIONS:
                 raise FileUploadError(f"File type {file_extension} is not supported")
             
             # Check MIME type
-            mime_type, _ = mimetypes.guess_type(original_filename)
-            allowed_mime_types = {
-                'application/pdf',
-                'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                'application/msword',
-                'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-                'application/vnd.ms-powerpoint',
-                'text/plain',
-                'text/markdown',
-                'application/rtf',
-                'application/vnd.oasis.opendocument.text',
-                'application/vnd.oasis.opendocument.spreadsheet',
-                'application/vnd.oasis.opendocument.presentation'
-            }
-            
-            if mime_type and mime_type not in allowed_mime_types:
+            mime_type = _guess_mime_type(original_filename)
+            if mime_type and mime_type not in self.ALLOWED_MIME_TYPES:
                 raise FileUploadError(f"MIME type {mime_type} is not supported")
             
+            # Check the content actually is what the filename claims
+            sniffed_mime_types = _sniff_mime_types(_read_head(file_content))
+            if sniffed_mime_types is not None:
+                if mime_type not in sniffed_mime_types:
+                    raise FileUploadError("File content does not match its file type")
+            elif mime_type in BINARY_MIME_TYPES:
+                raise FileUploadError("File content does not match its file type")
+            
+            # Hash in a worker thread; SHA-256 over tens of MB would stall the loop.
+            # The backend connection is warmed meanwhile for the upload that follows.
+            content_hash, _ = await asyncio.gather(
+                asyncio.to_thread(_content_hash, file_content),
+                self._prewarm()
+            )
+            
             return {
                 "valid": True,
                 "file_size_mb": file_size_mb,
                 "file_extension": file_extension,
-                "mime_type": mime_type
+                "mime_type": mime_type,
+                "content_hash": content_hash
             }
             
         except FileUploadError:
             raise
         except Exception as e:
-            logger.error(f"Error validating file {original_filename}: {e}")
+            logger.error("Error validating file %s: %s", original_filename, e, exc_info=True)
             raise FileUploadError(f"File validation failed: {str(e)}")
     
-    async def get_storage_usage(self, user_id: str) -> Dict[str, Any]:
-        """Get storage usage statistics for user"""
+    async def get_storage_usage(self, user_id: str, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+        """Get storage usage statistics for user.
+
+        With a session, usage is summed from the user's upload records; without
+        one, the bucket itself is listed (cached briefly in Redis), which also
+        serves to reconcile the records against what is actually stored.
+        """
+        if db is not None:
+            return await self._get_recorded_usage(db, user_id)
+        
         try:
-            if self.storage_type == "s3":
-                return await self._get_s3_usage(user_id)
-            elif self.storage_type == "supabase":
-                return await self._get_supabase_usage(user_id)
-            else:
-                return {"total_files": 0, "total_size_mb": 0}
+            redis = get_redis()
+            key = f"{STORAGE_USAGE_PREFIX}{user_id}"
+            
+            if redis is not None:
+                try:
+                    cached = await redis.get(key)
+                    if cached is not None:
+                        return orjson.loads(cached)
+                except RedisError:
+                    logger.warning("Storage usage cache unavailable", exc_info=True)
+                    redis = None
+            
+            usage = await self._backend.usage(user_id)
+            
+            if redis is not None:
+                try:
+                    await redis.set(key, orjson.dumps(usage), ex=STORAGE_USAGE_TTL_SECONDS)
+                except RedisError:
+                    logger.warning("Storage usage cache unavailable", exc_info=True)
+            
+            return usage
                 
         except Exception as e:
-            logger.error(f"Error getting storage usage for user {user_id}: {e}")
+            logger.error("Error getting storage usage for user %s: %s", user_id, e, exc_info=True)
             return {"total_files": 0, "total_size_mb": 0}
     
-    async def _get_s3_usage(self, user_id: str) -> Dict[str, Any]:
-        """Get S3 storage usage for user"""
+    async def _get_recorded_usage(self, db: AsyncSession, user_id: str) -> Dict[str, Any]:
+        """Sum storage usage from the user's upload records"""
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.s3_client.list_objects_v2(
-                    Bucket=self.bucket_name,
-                    Prefix=f"{user_id}/"
-                )
+            result = await db.execute(
+                select(func.count(Upload.id), func.coalesce(func.sum(Upload.bytes), 0))
+                .where(Upload.user_id == user_id, Upload.deleted_at.is_(None))
             )
-            
-            total_files = 0
-            total_size_bytes = 0
-            
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    total_files += 1
-                    total_size_bytes += obj['Size']
-            
-            return {
-                "total_files": total_files,
-                "total_size_mb": total_size_bytes / (1024 * 1024)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error getting S3 usage: {e}")
-            return {"total_files": 0, "total_size_mb": 0}
-    
-    async def _get_supabase_usage(self, user_id: str) -> Dict[str, Any]:
-        """Get Supabase storage usage for user"""
-        try:
-            # List files in user's directory
-            response = self.supabase_client.storage.from_(self.bucket_name).list(path=f"{user_id}/")
-            
-            total_files = 0
-            total_size_bytes = 0
-            
-            for file_info in response:
-                total_files += 1
-                total_size_bytes += file_info.get('metadata', {}).get('size', 0)
+            total_files, total_size_bytes = result.one()
             
             return {
                 "total_files": total_files,
@@ -385,5 +746,5 @@ class StorageService:
             }
             
         except Exception as e:
-            logger.error(f"Error getting Supabase usage: {e}")
+            logger.error("Error getting recorded storage usage for user %s: %s", user_id, e, exc_info=True)
             return {"total_files": 0, "total_size_mb": 0}
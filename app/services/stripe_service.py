@@ -1,15 +1,24 @@
+import asyncio
+import hashlib
 from typing import Dict, Any, Optional, List
+from dataclasses import asdict
 from datetime import datetime, timezone
+from functools import lru_cache
 import stripe
 import logging
 import json
+import weakref
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, update, and_, bindparam, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.core.config import settings
 from app.core.pricing import (
     get_subscription_plan, get_credit_pack, get_ai_usage_limits,
-    calculate_credit_pack_price, get_pay_as_you_go_rate
+    calculate_credit_pack_price, get_pay_as_you_go_rate, get_all_subscription_plans
 )
 from app.models.user import User
 from app.models.stripe_models import StripeCustomer, StripeSubscription, SubscriptionStatus
@@ -17,9 +26,178 @@ from app.models.payment import Payment, PaymentType, PaymentStatus
 from app.models.credit_ledger import CreditLedger, CreditReason
 from app.models.student_profile import StudentProfile
 from app.core.exceptions import PaymentError, SubscriptionError
+from app.core.redis_client import get_redis
+from app.tasks.payments import process_stripe_event
 
 logger = logging.getLogger(__name__)
 
+# A user's Stripe customer never changes once created, so the mapping is cached
+CUSTOMER_CACHE_PREFIX = "stripe:customer:"
+CUSTOMER_CACHE_TTL_SECONDS = 86400
+
+# Hot-path lookups, built once; values are bound per call
+CUSTOMER_BY_USER = select(StripeCustomer).where(StripeCustomer.user_id == bindparam("user_id"))
+SUBSCRIPTION_BY_STRIPE_ID = select(StripeSubscription).where(
+    StripeSubscription.stripe_subscription_id == bindparam("stripe_subscription_id")
+)
+ACTIVE_SUBSCRIPTION_BY_USER = select(StripeSubscription).where(
+    and_(
+        StripeSubscription.user_id == bindparam("user_id"),
+        StripeSubscription.status == SubscriptionStatus.ACTIVE
+    )
+)
+
+# Denormalizes the plan of the user's active subscription onto the user row
+SYNC_SUBSCRIPTION_TIER = (
+    update(User)
+    .where(User.id == bindparam("user_id"))
+    .values(
+        active_subscription_tier=select(StripeSubscription.plan_key)
+        .where(
+            and_(
+                StripeSubscription.user_id == bindparam("user_id"),
+                StripeSubscription.status == SubscriptionStatus.ACTIVE,
+                StripeSubscription.deleted_at.is_(None)
+            )
+        )
+        .order_by(StripeSubscription.current_period_end.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    .execution_options(synchronize_session=False)
+)
+
+# Map Stripe price IDs to plan keys
+PLAN_KEYS_BY_PRICE_ID = {
+    "price_starter_monthly": "starter",
+    "price_pro_monthly": "pro",
+    "price_premium_monthly": "premium"
+}
+
+# Subscription status is read on every AI request; webhooks invalidate it on change
+SUBSCRIPTION_STATUS_PREFIX = "stripe:subscription_status:"
+SUBSCRIPTION_STATUS_TTL_SECONDS = 600
+
+# Monthly AI usage counters; kept past month end so late reads still see them
+AI_USAGE_PREFIX = "ai_usage:"
+AI_USAGE_TTL_SECONDS = 40 * 86400
+
+# Webhook event IDs already queued; Stripe redelivers events it thinks were missed
+WEBHOOK_EVENT_PREFIX = "stripe:event:"
+WEBHOOK_EVENT_TTL_SECONDS = 86400
+
+def _idempotency_key(prefix: str, user_id: str, attempt_id: Optional[str]) -> Optional[str]:
+    """Stripe idempotency key for one purchase attempt, or None without an attempt id
+
+    Retries of the same attempt reuse the key, so Stripe returns the original
+    object instead of making a duplicate; a new purchase gets a new attempt id.
+    """
+    if not attempt_id:
+        return None
+    
+    digest = hashlib.sha256(attempt_id.encode()).hexdigest()[:32]
+    return f"{prefix}:{user_id}:{digest}"
+
+
+@lru_cache(maxsize=32)
+def _ai_limits_payload(plan_key: str) -> Dict[str, int]:
+    """AI usage limits for a plan as a response dict; shared, so don't mutate it"""
+    return asdict(get_ai_usage_limits(plan_key))
+
+
+@lru_cache(maxsize=1)
+def _subscription_plans_payload() -> List[Dict[str, Any]]:
+    """Subscription plans as response dicts; plans only change on deploy, so this
+    is built once and shared (don't mutate it)"""
+    return [
+        {
+            "key": plan.key,
+            "name": plan.name,
+            "description": plan.description,
+            "price_cents": plan.price_cents,
+            "currency": "usd",
+            "interval": plan.interval,
+            "monthly_credits": plan.monthly_credits,
+            "ai_features": plan.ai_features,
+            "stripe_price_id": plan.stripe_price_id
+        }
+        for plan in get_all_subscription_plans()
+    ]
+
+
+# One lock per user while their Stripe customer is created; entries go away once unused
+_customer_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _customer_lock(user_id: str) -> asyncio.Lock:
+    """Lock serializing Stripe customer creation for a user in this process"""
+    lock = _customer_locks.get(user_id)
+    if lock is None:
+        lock = _customer_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+async def _get_cached_customer_id(user_id: str) -> Optional[str]:
+    """Stripe customer ID cached for a user, if any"""
+    redis = get_redis()
+    if redis is None:
+        return None
+    
+    try:
+        return await redis.get(f"{CUSTOMER_CACHE_PREFIX}{user_id}")
+    except RedisError:
+        logger.warning("Stripe customer cache unavailable", exc_info=True)
+        return None
+
+
+async def _cache_customer_id(user_id: str, stripe_customer_id: str):
+    """Remember a user's Stripe customer ID"""
+    redis = get_redis()
+    if redis is None:
+        return
+    
+    try:
+        await redis.set(f"{CUSTOMER_CACHE_PREFIX}{user_id}", stripe_customer_id, ex=CUSTOMER_CACHE_TTL_SECONDS)
+    except RedisError:
+        logger.warning("Stripe customer cache unavailable", exc_info=True)
+
+
+async def invalidate_subscription_status(user_id: str):
+    """Drop a user's cached subscription status"""
+    redis = get_redis()
+    if redis is None:
+        return
+    
+    try:
+        await redis.delete(f"{SUBSCRIPTION_STATUS_PREFIX}{user_id}")
+    except RedisError:
+        logger.warning("Subscription status cache unavailable", exc_info=True)
+
+
+async def warm_customer_cache(db_session: AsyncSession) -> int:
+    """Load every Stripe customer mapping into Redis; returns the number cached"""
+    redis = get_redis()
+    if redis is None:
+        return 0
+    
+    result = await db_session.stream(
+        select(StripeCustomer.user_id, StripeCustomer.stripe_customer_id)
+        .where(StripeCustomer.deleted_at.is_(None))
+    )
+    
+    count = 0
+    try:
+        async for rows in result.partitions(1000):
+            async with redis.pipeline(transaction=False) as pipe:
+                for user_id, stripe_customer_id in rows:
+                    pipe.set(f"{CUSTOMER_CACHE_PREFIX}{user_id}", stripe_customer_id, ex=CUSTOMER_CACHE_TTL_SECONDS)
+                await pipe.execute()
+            count += len(rows)
+    except RedisError:
+        logger.warning("Stripe customer cache unavailable", exc_info=True)
+    
+    return count
+
 
 class StripeService:
     """Comprehensive Stripe service for payment processing and subscription management"""
@@ -31,39 +209,56 @@ class StripeService:
     async def create_customer(self, user: User, db_session: AsyncSession) -> StripeCustomer:
         """Create Stripe customer for user"""
         try:
-            # Check if customer already exists
-            existing_customer = await db_session.execute(
-                select(StripeCustomer).where(StripeCustomer.user_id == str(user.id))
-            ).scalar_one_or_none()
-            
-            if existing_customer:
-                return existing_customer
-            
-            # Create customer in Stripe
-            customer = stripe.Customer.create(
-                email=user.email,
-                name=user.name,
-                metadata={
-                    "user_id": str(user.id),
-                    "role": user.role.value
-                }
-            )
-            
-            # Save to database
-            stripe_customer = StripeCustomer(
-                user_id=str(user.id),
-                stripe_customer_id=customer.id
-            )
-            
-            db_session.add(stripe_customer)
-            await db_session.commit()
-            await db_session.refresh(stripe_customer)
+            # Known customers are served from the cache without touching the DB;
+            # the returned object is transient and only carries the IDs
+            cached_customer_id = await _get_cached_customer_id(str(user.id))
+            if cached_customer_id:
+                return StripeCustomer(user_id=str(user.id), stripe_customer_id=cached_customer_id)
+            
+            # Concurrent requests for the same user (e.g. checkout and portal on
+            # signup) must not each create a Stripe customer
+            async with _customer_lock(str(user.id)):
+                # Check if customer already exists
+                existing_customer = await db_session.scalar(CUSTOMER_BY_USER, {"user_id": str(user.id)})
+                
+                if existing_customer:
+                    await _cache_customer_id(str(user.id), existing_customer.stripe_customer_id)
+                    return existing_customer
+                
+                # Create customer in Stripe
+                customer = await asyncio.to_thread(
+                    stripe.Customer.create,
+                    email=user.email,
+                    name=user.name,
+                    metadata={
+                        "user_id": str(user.id),
+                        "role": user.role.value
+                    },
+                    idempotency_key=f"cust:{user.id}"
+                )
+                
+                # Save to database; another process may have saved one first
+                stripe_customer = await db_session.scalar(
+                    pg_insert(StripeCustomer)
+                    .values(user_id=str(user.id), stripe_customer_id=customer.id)
+                    .on_conflict_do_nothing(index_elements=[StripeCustomer.user_id])
+                    .returning(StripeCustomer)
+                )
+                
+                if stripe_customer is None:
+                    logger.warning("Stripe customer for user %s was created concurrently", user.id)
+                    stripe_customer = await db_session.scalar(CUSTOMER_BY_USER, {"user_id": str(user.id)})
+                
+                await db_session.commit()
+                await _cache_customer_id(str(user.id), stripe_customer.stripe_customer_id)
             
-            logger.info(f"Created Stripe customer {customer.id} for user {user.id}")
+            logger.info("Created Stripe customer %s for user %s", stripe_customer.stripe_customer_id, user.id)
             return stripe_customer
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating Stripe customer for user {user.id}: {e}")
+            logger.exception("Error creating Stripe customer for user %s", user.id)
             raise PaymentError(f"Failed to create Stripe customer: {str(e)}")
     
     async def create_subscription_checkout_session(
@@ -72,7 +267,8 @@ class StripeService:
         price_id: str,
         success_url: str,
         cancel_url: str,
-        db_session: AsyncSession
+        db_session: AsyncSession,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create Stripe Checkout session for subscription"""
         try:
@@ -80,7 +276,8 @@ class StripeService:
             customer = await self.create_customer(user, db_session)
             
             # Create checkout session
-            session = stripe.checkout.Session.create(
+            session = await asyncio.to_thread(
+                stripe.checkout.Session.create,
                 customer=customer.stripe_customer_id,
                 payment_method_types=['card'],
                 line_items=[{
@@ -98,17 +295,20 @@ class StripeService:
                     "metadata": {
                         "user_id": str(user.id)
                     }
-                }
+                },
+                idempotency_key=_idempotency_key("sub_checkout", str(user.id), idempotency_key)
             )
             
-            logger.info(f"Created subscription checkout session {session.id} for user {user.id}")
+            logger.info("Created subscription checkout session %s for user %s", session.id, user.id)
             return {
                 "session_id": session.id,
                 "checkout_url": session.url
             }
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating subscription checkout session for user {user.id}: {e}")
+            logger.exception("Error creating subscription checkout session for user %s", user.id)
             raise PaymentError(f"Failed to create checkout session: {str(e)}")
     
     async def create_payment_intent(
@@ -117,7 +317,8 @@ class StripeService:
         amount_cents: int,
         description: str,
         metadata: Optional[Dict[str, Any]] = None,
-        db_session: AsyncSession = None
+        db_session: AsyncSession = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create Stripe PaymentIntent for one-time payment"""
         try:
@@ -125,7 +326,8 @@ class StripeService:
             customer = await self.create_customer(user, db_session)
             
             # Create payment intent
-            intent = stripe.PaymentIntent.create(
+            intent = await asyncio.to_thread(
+                stripe.PaymentIntent.create,
                 amount=amount_cents,
                 currency='usd',
                 customer=customer.stripe_customer_id,
@@ -133,10 +335,11 @@ class StripeService:
                 metadata=metadata or {},
                 automatic_payment_methods={
                     'enabled': True,
-                }
+                },
+                idempotency_key=_idempotency_key("pi", str(user.id), idempotency_key)
             )
             
-            logger.info(f"Created payment intent {intent.id} for user {user.id}")
+            logger.info("Created payment intent %s for user %s", intent.id, user.id)
             return {
                 "payment_intent_id": intent.id,
                 "client_secret": intent.client_secret,
@@ -144,8 +347,10 @@ class StripeService:
                 "currency": intent.currency
             }
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating payment intent for user {user.id}: {e}")
+            logger.exception("Error creating payment intent for user %s", user.id)
             raise PaymentError(f"Failed to create payment intent: {str(e)}")
     
     async def create_credit_pack_checkout(
@@ -155,7 +360,8 @@ class StripeService:
         price_cents: int,
         success_url: str,
         cancel_url: str,
-        db_session: AsyncSession
+        db_session: AsyncSession,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create Stripe Checkout session for credit pack purchase"""
         try:
@@ -163,7 +369,8 @@ class StripeService:
             customer = await self.create_customer(user, db_session)
             
             # Create checkout session
-            session = stripe.checkout.Session.create(
+            session = await asyncio.to_thread(
+                stripe.checkout.Session.create,
                 customer=customer.stripe_customer_id,
                 payment_method_types=['card'],
                 line_items=[{
@@ -184,17 +391,20 @@ class StripeService:
                     "user_id": str(user.id),
                     "credit_amount": credit_amount,
                     "payment_type": "credit_pack"
-                }
+                },
+                idempotency_key=_idempotency_key("credit_checkout", str(user.id), idempotency_key)
             )
             
-            logger.info(f"Created credit pack checkout session {session.id} for user {user.id}")
+            logger.info("Created credit pack checkout session %s for user %s", session.id, user.id)
             return {
                 "session_id": session.id,
                 "checkout_url": session.url
             }
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating credit pack checkout for user {user.id}: {e}")
+            logger.exception("Error creating credit pack checkout for user %s", user.id)
             raise PaymentError(f"Failed to create credit pack checkout: {str(e)}")
     
     async def process_webhook(
@@ -203,14 +413,55 @@ class StripeService:
         signature: str,
         db_session: AsyncSession
     ) -> bool:
-        """Process Stripe webhook events"""
+        """Verify a Stripe webhook and queue it for processing.
+
+        Handling happens in a worker (see handle_event) so Stripe gets its
+        response without waiting on the database.
+        """
         try:
-            # Verify webhook signature
-            event = stripe.Webhook.construct_event(
-                payload, signature, self.webhook_secret
+            # Verify the signature only; the worker builds the full stripe.Event
+            payload_text = payload.decode("utf-8")
+            stripe.WebhookSignature.verify_header(
+                payload_text, signature, self.webhook_secret, stripe.Webhook.DEFAULT_TOLERANCE
             )
+            event = orjson.loads(payload)
+            
+            # Queue each event once, however often Stripe delivers it
+            redis = get_redis()
+            event_key = f"{WEBHOOK_EVENT_PREFIX}{event['id']}"
+            if redis is not None:
+                try:
+                    if not await redis.set(event_key, "1", nx=True, ex=WEBHOOK_EVENT_TTL_SECONDS):
+                        logger.info("Skipping duplicate webhook event: %s", event['id'])
+                        return True
+                except RedisError:
+                    logger.warning("Webhook event dedup unavailable", exc_info=True)
+                    redis = None
+            
+            try:
+                process_stripe_event.delay(payload_text)
+            except Exception:
+                # Let Stripe's redelivery queue it again
+                if redis is not None:
+                    try:
+                        await redis.delete(event_key)
+                    except RedisError:
+                        pass
+                raise
+            
+            logger.info("Queued webhook event: %s", event['type'])
+            return True
             
-            logger.info(f"Processing webhook event: {event['type']}")
+        except SQLAlchemyError:
+            raise
+        except Exception as e:
+            logger.exception("Error processing webhook")
+            raise PaymentError(f"Failed to process webhook: {str(e)}")
+    
+    async def handle_event(self, event: Dict[str, Any], db_session: AsyncSession):
+        """Apply a verified Stripe webhook event"""
+        try:
+            logger.info("Processing webhook event: %s", event['type'])
             
             # Handle different event types
             if event['type'] == 'checkout.session.completed':
@@ -230,13 +481,13 @@ class StripeService:
             elif event['type'] == 'payment_intent.payment_failed':
                 await self._handle_payment_intent_failed(event, db_session)
             else:
-                logger.info(f"Unhandled webhook event type: {event['type']}")
-            
-            return True
+                logger.info("Unhandled webhook event type: %s", event['type'])
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error processing webhook: {e}")
-            raise PaymentError(f"Failed to process webhook: {str(e)}")
+            logger.exception("Error processing webhook event")
+            raise PaymentError(f"Failed to process webhook event: {str(e)}")
     
     async def _handle_checkout_completed(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle checkout.session.completed event"""
@@ -251,13 +502,15 @@ class StripeService:
             # Handle different checkout types
             if session['mode'] == 'subscription':
                 # Subscription will be handled by subscription.created event
-                logger.info(f"Subscription checkout completed for user {user_id}")
+                logger.info("Subscription checkout completed for user %s", user_id)
             elif session['mode'] == 'payment':
                 # Handle one-time payment (credit pack)
                 await self._process_credit_pack_payment(session, user_id, db_session)
             
-        except Exception as e:
-            logger.error(f"Error handling checkout completed: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling checkout completed")
     
     async def _handle_subscription_created(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle customer.subscription.created event"""
@@ -269,25 +522,41 @@ class StripeService:
                 logger.warning("No user_id in subscription metadata")
                 return
             
-            # Create subscription record
-            stripe_subscription = StripeSubscription(
+            plan_key = self._get_plan_key_from_price_id(subscription['items']['data'][0]['price']['id'])
+            current_period_end = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
+            
+            # Create subscription record; a redelivered event just refreshes it
+            upsert = pg_insert(StripeSubscription).values(
                 user_id=user_id,
                 stripe_subscription_id=subscription['id'],
                 status=SubscriptionStatus.ACTIVE,
-                current_period_end=datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc),
-                plan_key=self._get_plan_key_from_price_id(subscription['items']['data'][0]['price']['id'])
+                current_period_end=current_period_end,
+                plan_key=plan_key
+            )
+            inserted = await db_session.scalar(
+                upsert.on_conflict_do_update(
+                    index_elements=[StripeSubscription.stripe_subscription_id],
+                    set_={
+                        'status': upsert.excluded.status,
+                        'current_period_end': upsert.excluded.current_period_end,
+                        'plan_key': upsert.excluded.plan_key
+                    }
+                ).returning(literal_column("xmax = 0"))  # xmax is 0 only for a freshly inserted row
             )
             
-            db_session.add(stripe_subscription)
+            # Grant monthly credits based on plan, committed together with the subscription
+            if inserted:
+                await self._grant_monthly_credits(user_id, plan_key, db_session, commit=False)
+            await self._sync_subscription_tier(user_id, db_session)
             await db_session.commit()
+            await invalidate_subscription_status(user_id)
             
-            # Grant monthly credits based on plan
-            await self._grant_monthly_credits(user_id, stripe_subscription.plan_key, db_session)
-            
-            logger.info(f"Subscription created for user {user_id}: {subscription['id']}")
+            logger.info("Subscription created for user %s: %s", user_id, subscription['id'])
             
-        except Exception as e:
-            logger.error(f"Error handling subscription created: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling subscription created")
     
     async def _handle_subscription_updated(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle customer.subscription.updated event"""
@@ -299,23 +568,23 @@ class StripeService:
                 return
             
             # Update subscription record
-            stripe_subscription = await db_session.execute(
-                select(StripeSubscription).where(
-                    StripeSubscription.stripe_subscription_id == subscription['id']
-                )
-            ).scalar_one_or_none()
+            stripe_subscription = await self._get_subscription_by_stripe_id(subscription['id'], db_session)
             
             if stripe_subscription:
                 stripe_subscription.status = SubscriptionStatus(subscription['status'])
                 stripe_subscription.current_period_end = datetime.fromtimestamp(
                     subscription['current_period_end'], tz=timezone.utc
                 )
+                await self._sync_subscription_tier(stripe_subscription.user_id, db_session)
                 await db_session.commit()
+                await invalidate_subscription_status(user_id)
                 
-                logger.info(f"Subscription updated for user {user_id}: {subscription['id']}")
+                logger.info("Subscription updated for user %s: %s", user_id, subscription['id'])
             
-        except Exception as e:
-            logger.error(f"Error handling subscription updated: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling subscription updated")
     
     async def _handle_subscription_deleted(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle customer.subscription.deleted event"""
@@ -327,20 +596,21 @@ class StripeService:
                 return
             
             # Update subscription record
-            stripe_subscription = await db_session.execute(
-                select(StripeSubscription).where(
-                    StripeSubscription.stripe_subscription_id == subscription['id']
-                )
-            ).scalar_one_or_none()
+            updated_user_id = await self._set_subscription_status(
+                subscription['id'], SubscriptionStatus.CANCELED, db_session
+            )
             
-            if stripe_subscription:
-                stripe_subscription.status = SubscriptionStatus.CANCELED
+            if updated_user_id:
+                await self._sync_subscription_tier(updated_user_id, db_session)
                 await db_session.commit()
+                await invalidate_subscription_status(user_id)
                 
-                logger.info(f"Subscription canceled for user {user_id}: {subscription['id']}")
+                logger.info("Subscription canceled for user %s: %s", user_id, subscription['id'])
             
-        except Exception as e:
-            logger.error(f"Error handling subscription deleted: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling subscription deleted")
     
     async def _handle_invoice_payment_succeeded(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle invoice.payment_succeeded event"""
@@ -349,11 +619,7 @@ class StripeService:
             
             # Only process subscription invoices
             if invoice['subscription']:
-                subscription = await db_session.execute(
-                    select(StripeSubscription).where(
-                        StripeSubscription.stripe_subscription_id == invoice['subscription']
-                    )
-                ).scalar_one_or_none()
+                subscription = await self._get_subscription_by_stripe_id(invoice['subscription'], db_session)
                 
                 if subscription:
                     # Grant monthly credits
@@ -362,11 +628,14 @@ class StripeService:
                         subscription.plan_key, 
                         db_session
                     )
+                    await invalidate_subscription_status(str(subscription.user_id))
                     
-                    logger.info(f"Monthly credits granted for user {subscription.user_id}")
+                    logger.info("Monthly credits granted for user %s", subscription.user_id)
             
-        except Exception as e:
-            logger.error(f"Error handling invoice payment succeeded: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling invoice payment succeeded")
     
     async def _handle_invoice_payment_failed(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle invoice.payment_failed event"""
@@ -375,20 +644,21 @@ class StripeService:
             
             # Update subscription status
             if invoice['subscription']:
-                subscription = await db_session.execute(
-                    select(StripeSubscription).where(
-                        StripeSubscription.stripe_subscription_id == invoice['subscription']
-                    )
-                ).scalar_one_or_none()
+                user_id = await self._set_subscription_status(
+                    invoice['subscription'], SubscriptionStatus.PAST_DUE, db_session
+                )
                 
-                if subscription:
-                    subscription.status = SubscriptionStatus.PAST_DUE
+                if user_id:
+                    await self._sync_subscription_tier(user_id, db_session)
                     await db_session.commit()
+                    await invalidate_subscription_status(str(user_id))
                     
-                    logger.info(f"Subscription marked as past due for user {subscription.user_id}")
+                    logger.info("Subscription marked as past due for user %s", user_id)
             
-        except Exception as e:
-            logger.error(f"Error handling invoice payment failed: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling invoice payment failed")
     
     async def _handle_payment_intent_succeeded(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle payment_intent.succeeded event"""
@@ -407,10 +677,12 @@ class StripeService:
             db_session.add(payment)
             await db_session.commit()
             
-            logger.info(f"Payment succeeded: {payment_intent['id']}")
+            logger.info("Payment succeeded: %s", payment_intent['id'])
             
-        except Exception as e:
-            logger.error(f"Error handling payment intent succeeded: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling payment intent succeeded")
     
     async def _handle_payment_intent_failed(self, event: Dict[str, Any], db_session: AsyncSession):
         """Handle payment_intent.payment_failed event"""
@@ -429,10 +701,12 @@ class StripeService:
             db_session.add(payment)
             await db_session.commit()
             
-            logger.info(f"Payment failed: {payment_intent['id']}")
+            logger.info("Payment failed: %s", payment_intent['id'])
             
-        except Exception as e:
-            logger.error(f"Error handling payment intent failed: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error handling payment intent failed")
     
     async def _process_credit_pack_payment(self, session: Dict[str, Any], user_id: str, db_session: AsyncSession):
         """Process credit pack payment"""
@@ -455,43 +729,52 @@ class StripeService:
                 db_session.add(payment)
                 await db_session.commit()
                 
-                logger.info(f"Credit pack payment processed for user {user_id}: {credit_amount} credits")
+                logger.info("Credit pack payment processed for user %s: %s credits", user_id, credit_amount)
             
-        except Exception as e:
-            logger.error(f"Error processing credit pack payment: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error processing credit pack payment")
     
-    async def _grant_monthly_credits(self, user_id: str, plan_key: str, db_session: AsyncSession):
+    async def _grant_monthly_credits(
+        self,
+        user_id: str,
+        plan_key: str,
+        db_session: AsyncSession,
+        commit: bool = True
+    ):
         """Grant monthly credits based on subscription plan"""
         try:
             # Get plan configuration
             plan = get_subscription_plan(plan_key)
             
             if plan and plan.monthly_credits > 0:
-                await self._add_credits(user_id, plan.monthly_credits, "subscription", db_session)
-                logger.info(f"Granted {plan.monthly_credits} monthly credits to user {user_id} for plan {plan_key}")
+                await self._add_credits(user_id, plan.monthly_credits, "subscription", db_session, commit=commit)
+                logger.info("Granted %s monthly credits to user %s for plan %s", plan.monthly_credits, user_id, plan_key)
             
-        except Exception as e:
-            logger.error(f"Error granting monthly credits: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error granting monthly credits")
     
-    async def _add_credits(self, user_id: str, amount: int, reason: str, db_session: AsyncSession):
-        """Add credits to user's balance"""
+    async def _add_credits(
+        self,
+        user_id: str,
+        amount: int,
+        reason: str,
+        db_session: AsyncSession,
+        commit: bool = True
+    ):
+        """Add credits to user's balance; with commit=False the caller commits"""
         try:
-            # Get current balance
-            student_profile = await db_session.execute(
-                select(StudentProfile).where(StudentProfile.user_id == user_id)
-            ).scalar_one_or_none()
-            
-            if not student_profile:
-                # Create student profile if it doesn't exist
-                student_profile = StudentProfile(
-                    user_id=user_id,
-                    credit_balance=0
-                )
-                db_session.add(student_profile)
-                await db_session.flush()
-            
-            # Calculate new balance
-            new_balance = student_profile.credit_balance + amount
+            # Increment the balance in place, creating the profile if it doesn't exist
+            upsert = pg_insert(StudentProfile).values(user_id=user_id, credit_balance=amount)
+            new_balance = await db_session.scalar(
+                upsert.on_conflict_do_update(
+                    index_elements=[StudentProfile.user_id],
+                    set_={'credit_balance': StudentProfile.credit_balance + upsert.excluded.credit_balance}
+                ).returning(StudentProfile.credit_balance)
+            )
             
             # Create ledger entry
             ledger_entry = CreditLedger(
@@ -501,32 +784,42 @@ class StripeService:
                 balance_after=new_balance
             )
             
-            # Update balance
-            student_profile.credit_balance = new_balance
-            
+            # Balance and ledger entry commit together
             db_session.add(ledger_entry)
-            await db_session.commit()
+            if commit:
+                await db_session.commit()
+            else:
+                await db_session.flush()
             
-            logger.info(f"Added {amount} credits to user {user_id}, new balance: {new_balance}")
+            logger.info("Added %s credits to user %s, new balance: %s", amount, user_id, new_balance)
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error adding credits: {e}")
+            logger.exception("Error adding credits")
             raise PaymentError(f"Failed to add credits: {str(e)}")
     
     async def deduct_credits(self, user_id: str, amount: int, reason: str, db_session: AsyncSession) -> bool:
         """Deduct credits from user's balance"""
         try:
-            # Get current balance
-            student_profile = await db_session.execute(
-                select(StudentProfile).where(StudentProfile.user_id == user_id)
-            ).scalar_one_or_none()
+            # Check and decrement in one statement so concurrent deductions can't overdraw
+            new_balance = await db_session.scalar(
+                update(StudentProfile)
+                .where(
+                    and_(
+                        StudentProfile.user_id == user_id,
+                        StudentProfile.credit_balance >= amount
+                    )
+                )
+                .values(credit_balance=StudentProfile.credit_balance - amount)
+                .returning(StudentProfile.credit_balance)
+                .execution_options(synchronize_session=False)
+            )
             
-            if not student_profile or student_profile.credit_balance < amount:
+            if new_balance is None:
+                # No profile, or not enough credits
                 return False
             
-            # Calculate new balance
-            new_balance = student_profile.credit_balance - amount
-            
             # Create ledger entry
             ledger_entry = CreditLedger(
                 user_id=user_id,
@@ -535,17 +828,17 @@ class StripeService:
                 balance_after=new_balance
             )
             
-            # Update balance
-            student_profile.credit_balance = new_balance
-            
+            # Balance and ledger entry commit together
             db_session.add(ledger_entry)
             await db_session.commit()
             
-            logger.info(f"Deducted {amount} credits from user {user_id}, new balance: {new_balance}")
+            logger.info("Deducted %s credits from user %s, new balance: %s", amount, user_id, new_balance)
             return True
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error deducting credits: {e}")
+            logger.exception("Error deducting credits")
             raise PaymentError(f"Failed to deduct credits: {str(e)}")
     
     async def get_customer_portal_url(self, user: User, db_session: AsyncSession) -> str:
@@ -555,103 +848,126 @@ class StripeService:
             customer = await self.create_customer(user, db_session)
             
             # Create portal session
-            session = stripe.billing_portal.Session.create(
+            session = await asyncio.to_thread(
+                stripe.billing_portal.Session.create,
                 customer=customer.stripe_customer_id,
                 return_url=f"{settings.FRONTEND_URL}/dashboard"
             )
             
             return session.url
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating customer portal session for user {user.id}: {e}")
+            logger.exception("Error creating customer portal session for user %s", user.id)
             raise PaymentError(f"Failed to create customer portal session: {str(e)}")
     
     async def cancel_subscription(self, user: User, db_session: AsyncSession) -> bool:
         """Cancel user's active subscription"""
         try:
             # Get active subscription
-            subscription = await db_session.execute(
-                select(StripeSubscription).where(
-                    and_(
-                        StripeSubscription.user_id == str(user.id),
-                        StripeSubscription.status == SubscriptionStatus.ACTIVE
-                    )
-                )
-            ).scalar_one_or_none()
+            subscription = await db_session.scalar(ACTIVE_SUBSCRIPTION_BY_USER, {"user_id": str(user.id)})
             
             if not subscription:
                 raise SubscriptionError("No active subscription found")
             
             # Cancel in Stripe
-            stripe.Subscription.modify(
+            await asyncio.to_thread(
+                stripe.Subscription.modify,
                 subscription.stripe_subscription_id,
                 cancel_at_period_end=True
             )
             
             # Update local record
             subscription.status = SubscriptionStatus.CANCELED
+            await self._sync_subscription_tier(user.id, db_session)
             await db_session.commit()
+            await invalidate_subscription_status(str(user.id))
             
-            logger.info(f"Subscription canceled for user {user.id}")
+            logger.info("Subscription canceled for user %s", user.id)
             return True
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error canceling subscription for user {user.id}: {e}")
+            logger.exception("Error canceling subscription for user %s", user.id)
             raise SubscriptionError(f"Failed to cancel subscription: {str(e)}")
     
+    async def _get_subscription_by_stripe_id(
+        self,
+        stripe_subscription_id: str,
+        db_session: AsyncSession
+    ) -> Optional[StripeSubscription]:
+        """Get subscription record by Stripe subscription ID (unique, so indexed)"""
+        return await db_session.scalar(
+            SUBSCRIPTION_BY_STRIPE_ID, {"stripe_subscription_id": stripe_subscription_id}
+        )
+    
+    async def _set_subscription_status(
+        self,
+        stripe_subscription_id: str,
+        status: SubscriptionStatus,
+        db_session: AsyncSession
+    ) -> Optional[Any]:
+        """Set a subscription's status without loading it; returns its user ID, or None if not found"""
+        return await db_session.scalar(
+            update(StripeSubscription)
+            .where(StripeSubscription.stripe_subscription_id == stripe_subscription_id)
+            .values(status=status)
+            .returning(StripeSubscription.user_id)
+            .execution_options(synchronize_session=False)
+        )
+    
+    async def _sync_subscription_tier(self, user_id: Any, db_session: AsyncSession):
+        """Refresh the user's denormalized subscription tier (caller commits)"""
+        await db_session.execute(SYNC_SUBSCRIPTION_TIER, {"user_id": user_id})
+    
     def _get_plan_key_from_price_id(self, price_id: str) -> str:
         """Get plan key from Stripe price ID"""
-        # Map Stripe price IDs to plan keys
-        plan_mapping = {
-            "price_starter_monthly": "starter",
-            "price_pro_monthly": "pro",
-            "price_premium_monthly": "premium"
-        }
-        
-        return plan_mapping.get(price_id, "starter")
+        return PLAN_KEYS_BY_PRICE_ID.get(price_id, "starter")
     
     async def get_subscription_plans(self) -> List[Dict[str, Any]]:
         """Get available subscription plans"""
         try:
             # Use our pricing configuration
-            from app.core.pricing import get_all_subscription_plans
-            
-            plans = []
-            for plan in get_all_subscription_plans():
-                plans.append({
-                    "key": plan.key,
-                    "name": plan.name,
-                    "description": plan.description,
-                    "price_cents": plan.price_cents,
-                    "currency": "usd",
-                    "interval": plan.interval,
-                    "monthly_credits": plan.monthly_credits,
-                    "ai_features": plan.ai_features,
-                    "stripe_price_id": plan.stripe_price_id
-                })
-            
-            return plans
+            return _subscription_plans_payload()
             
         except Exception as e:
-            logger.error(f"Error fetching subscription plans: {e}")
+            logger.exception("Error fetching subscription plans")
             raise PaymentError(f"Failed to fetch subscription plans: {str(e)}")
     
     async def get_user_subscription_status(self, user_id: str, db_session: AsyncSession) -> Dict[str, Any]:
-        """Get user's subscription status and limits"""
+        """Get user's subscription status and limits, cached in Redis"""
+        redis = get_redis()
+        key = f"{SUBSCRIPTION_STATUS_PREFIX}{user_id}"
+        
+        if redis is not None:
+            try:
+                cached = await redis.get(key)
+                if cached is not None:
+                    return orjson.loads(cached)
+            except RedisError:
+                logger.warning("Subscription status cache unavailable", exc_info=True)
+                redis = None
+        
+        status = await self._load_subscription_status(user_id, db_session)
+        
+        if redis is not None:
+            try:
+                await redis.set(key, orjson.dumps(status), ex=SUBSCRIPTION_STATUS_TTL_SECONDS)
+            except RedisError:
+                logger.warning("Subscription status cache unavailable", exc_info=True)
+        
+        return status
+    
+    async def _load_subscription_status(self, user_id: str, db_session: AsyncSession) -> Dict[str, Any]:
+        """Build user's subscription status and limits from the database"""
         try:
             # Get active subscription
-            subscription = await db_session.execute(
-                select(StripeSubscription).where(
-                    and_(
-                        StripeSubscription.user_id == user_id,
-                        StripeSubscription.status == SubscriptionStatus.ACTIVE
-                    )
-                )
-            ).scalar_one_or_none()
+            subscription = await db_session.scalar(ACTIVE_SUBSCRIPTION_BY_USER, {"user_id": user_id})
             
             if subscription:
                 plan = get_subscription_plan(subscription.plan_key)
-                ai_limits = get_ai_usage_limits(subscription.plan_key)
                 
                 return {
                     "has_subscription": True,
@@ -660,64 +976,62 @@ class StripeService:
                     "status": subscription.status.value,
                     "current_period_end": subscription.current_period_end.isoformat(),
                     "monthly_credits": plan.monthly_credits if plan else 0,
-                    "ai_limits": {
-                        "qa_requests_per_month": ai_limits.qa_requests_per_month,
-                        "summaries_per_month": ai_limits.summaries_per_month,
-                        "flashcards_per_month": ai_limits.flashcards_per_month,
-                        "quizzes_per_month": ai_limits.quizzes_per_month,
-                        "max_tokens_per_request": ai_limits.max_tokens_per_request
-                    }
+                    "ai_limits": _ai_limits_payload(subscription.plan_key)
                 }
             else:
                 # Free tier limits
-                ai_limits = get_ai_usage_limits("free")
-                
                 return {
                     "has_subscription": False,
                     "plan_key": "free",
                     "plan_name": "Free",
                     "status": "none",
                     "monthly_credits": 0,
-                    "ai_limits": {
-                        "qa_requests_per_month": ai_limits.qa_requests_per_month,
-                        "summaries_per_month": ai_limits.summaries_per_month,
-                        "flashcards_per_month": ai_limits.flashcards_per_month,
-                        "quizzes_per_month": ai_limits.quizzes_per_month,
-                        "max_tokens_per_request": ai_limits.max_tokens_per_request
-                    }
+                    "ai_limits": _ai_limits_payload("free")
                 }
                 
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting subscription status for user {user_id}: {e}")
+            logger.exception("Error getting subscription status for user %s", user_id)
             raise PaymentError(f"Failed to get subscription status: {str(e)}")
     
     async def check_ai_usage_limit(self, user_id: str, feature: str, db_session: AsyncSession) -> bool:
-        """Check if user has exceeded AI usage limits"""
+        """Check the user's AI usage limit and count this use against it"""
         try:
             # Get subscription status
             subscription_status = await self.get_user_subscription_status(user_id, db_session)
             
-            # Get current month's usage
-            from datetime import datetime, timezone
-            current_month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            # TODO: Implement usage tracking in database
-            # For now, we'll allow usage (this should be implemented with a usage tracking table)
-            
             limit = subscription_status["ai_limits"].get(f"{feature}_per_month", 0)
             
             # -1 means unlimited
             if limit == -1:
                 return True
             
-            # TODO: Check actual usage against limit
-            # current_usage = await self._get_current_month_usage(user_id, feature, db_session)
-            # return current_usage < limit
+            redis = get_redis()
+            if redis is None:
+                # Usage can't be counted without Redis; don't block AI features on it
+                return True
+            
+            # One counter per user, feature and calendar month
+            key = f"{AI_USAGE_PREFIX}{user_id}:{feature}:{datetime.now(timezone.utc):%Y%m}"
+            try:
+                current_usage = await redis.incr(key)
+                if current_usage == 1:
+                    await redis.expire(key, AI_USAGE_TTL_SECONDS)
+                
+                if current_usage > limit:
+                    # Rejected requests don't count as usage
+                    await redis.decr(key)
+                    return False
+            except RedisError:
+                logger.warning("AI usage counter unavailable", exc_info=True)
             
-            return True  # Temporary - always allow for now
+            return True
             
-        except Exception as e:
-            logger.error(f"Error checking AI usage limit for user {user_id}: {e}")
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            logger.exception("Error checking AI usage limit for user %s", user_id)
             return False
     
     async def create_booking_payment_intent(
@@ -729,9 +1043,9 @@ class StripeService:
     ) -> Dict[str, Any]:
         """Create PaymentIntent for booking payment"""
         try:
-            # Check if user has subscription for discounted rate
-            subscription_status = await self.get_user_subscription_status(str(user.id), db_session)
-            has_subscription = subscription_status["has_subscription"]
+            # Check if user has subscription for discounted rate; the tier is
+            # denormalized onto the already-loaded user, so no lookup is needed
+            has_subscription = bool(user.active_subscription_tier)
             
             # Determine rate
             if has_subscription:
@@ -750,7 +1064,9 @@ class StripeService:
                     "has_subscription": has_subscription,
                     "payment_type": "booking"
                 },
-                db_session=db_session
+                db_session=db_session,
+                # One PaymentIntent per booking, however often this is retried
+                idempotency_key=f"booking:{booking_id}"
             )
             
             return {
@@ -759,6 +1075,8 @@ class StripeService:
                 "has_subscription": has_subscription
             }
             
+        except SQLAlchemyError:
+            raise
         except Exception as e:
-            logger.error(f"Error creating booking payment intent for user {user.id}: {e}")
+            logger.exception("Error creating booking payment intent for user %s", user.id)
             raise PaymentError(f"Failed to create booking payment intent: {str(e)}")
@@ -0,0 +1,45 @@
+import logging
+
+from app.core.celery_app import celery_app
+from app.core.database import AsyncSessionLocal
+from app.tasks.notifications import TASK_OPTIONS, _run, _get_booking
+
+logger = logging.getLogger(__name__)
+
+
+async def _create_booking_calendar_events(booking_id: str):
+    # Imported lazily: the scheduling service enqueues these tasks
+    from app.services.scheduling_service import SchedulingService
+
+    async with AsyncSessionLocal() as db:
+        booking = await _get_booking(db, booking_id)
+        if not booking:
+            logger.warning(f"Booking {booking_id} not found for calendar event creation")
+            return
+
+        await SchedulingService(db)._create_calendar_events(booking)
+        await db.commit()
+
+
+async def _cancel_booking_calendar_events(booking_id: str):
+    from app.services.scheduling_service import SchedulingService
+
+    async with AsyncSessionLocal() as db:
+        booking = await _get_booking(db, booking_id)
+        if not booking:
+            logger.warning(f"Booking {booking_id} not found for calendar event cancellation")
+            return
+
+        await SchedulingService(db)._cancel_calendar_events(booking)
+
+
+@celery_app.task(**TASK_OPTIONS)
+def create_booking_calendar_events(self, booking_id: str):
+    """Create Google Calendar events for a confirmed booking"""
+    _run(_create_booking_calendar_events(booking_id))
+
+
+@celery_app.task(**TASK_OPTIONS)
+def cancel_booking_calendar_events(self, booking_id: str):
+    """Delete Google Calendar events for a cancelled booking"""
+    _run(_cancel_booking_calendar_events(booking_id))
@@ -0,0 +1,187 @@
+from typing import Optional
+from sqlalchemy import select, and_
+import asyncio
+import logging
+from celery.signals import worker_process_shutdown
+
+try:
+    import uvloop
+except ImportError:  # Not available on every platform
+    uvloop = None
+
+from app.core.celery_app import celery_app
+from app.core.database import AsyncSessionLocal, close_db
+from app.core.http_client import close_http_client
+from app.core.redis_client import close_redis
+from app.models.booking import Booking
+from app.services.notification_service import NotificationService
+
+logger = logging.getLogger(__name__)
+
+TASK_OPTIONS = {
+    "bind": True,
+    "acks_late": True,
+    "autoretry_for": (Exception,),
+    "retry_backoff": True,
+    "max_retries": 5,
+}
+
+
+# Event loop shared by every task in a worker process; DB, HTTP and Redis
+# connections are bound to it, so they stay pooled between tasks
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Get this worker process's event loop, creating it on first use"""
+    global _worker_loop
+    
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    
+    return _worker_loop
+
+
+def _run(coro):
+    """Run a coroutine on the worker process's event loop"""
+    return _get_worker_loop().run_until_complete(coro)
+
+
+@worker_process_shutdown.connect
+def _close_worker_loop(**kwargs):
+    """Release loop-bound connections and close the loop when a worker process exits"""
+    if _worker_loop is None or _worker_loop.is_closed():
+        return
+    
+    async def close_connections():
+        await close_db()
+        await close_http_client()
+        await close_redis()
+    
+    try:
+        _worker_loop.run_until_complete(close_connections())
+    finally:
+        _worker_loop.close()
+
+
+async def _get_booking(db, booking_id: str) -> Optional[Booking]:
+    """Load a booking for a notification task"""
+    result = await db.execute(
+        select(Booking).where(
+            and_(
+                Booking.id == booking_id,
+                Booking.deleted_at.is_(None)
+            )
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def _send_booking_confirmation_email(booking_id: str, recipient: str):
+    async with AsyncSessionLocal() as db:
+        booking = await _get_booking(db, booking_id)
+        if not booking:
+            logger.warning(f"Booking {booking_id} not found for confirmation email")
+            return
+
+        await NotificationService(db, raise_errors=True).send_booking_confirmation_email(booking, recipient)
+
+
+async def _send_booking_confirmation_inapp(booking_id: str):
+    async with AsyncSessionLocal() as db:
+        booking = await _get_booking(db, booking_id)
+        if not booking:
+            logger.warning(f"Booking {booking_id} not found for confirmation notification")
+            return
+
+        await NotificationService(db, raise_errors=True).send_booking_confirmation_notification(booking)
+
+
+async def _send_booking_cancellation_email(booking_id: str, recipient: str):
+    async with AsyncSessionLocal() as db:
+        booking = await _get_booking(db, booking_id)
+        if not booking:
+            logger.warning(f"Booking {booking_id} not found for cancellation email")
+            return
+
+        await NotificationService(db, raise_errors=True).send_booking_cancellation_email(booking, recipient)
+
+
+async def _send_booking_cancellation_inapp(booking_id: str):
+    async with AsyncSessionLocal() as db:
+        booking = await _get_booking(db, booking_id)
+        if not booking:
+            logger.warning(f"Booking {booking_id} not found for cancellation notification")
+            return
+
+        await NotificationService(db, raise_errors=True).send_booking_cancellation_notification(booking)
+
+
+async def _send_booking_reschedule_email(new_booking_id: str, old_booking_id: str, recipient: str):
+    async with AsyncSessionLocal() as db:
+        new_booking = await _get_booking(db, new_booking_id)
+        old_booking = await _get_booking(db, old_booking_id)
+        if not new_booking or not old_booking:
+            logger.warning(f"Bookings {new_booking_id}/{old_booking_id} not found for reschedule email")
+            return
+
+        await NotificationService(db, raise_errors=True).send_booking_reschedule_email(
+            new_booking, old_booking, recipient
+        )
+
+
+async def _send_booking_reschedule_inapp(new_booking_id: str):
+    async with AsyncSessionLocal() as db:
+        new_booking = await _get_booking(db, new_booking_id)
+        if not new_booking:
+            logger.warning(f"Booking {new_booking_id} not found for reschedule notification")
+            return
+
+        await NotificationService(db, raise_errors=True).send_booking_reschedule_notification(new_booking)
+
+
+# Email and in-app delivery run as separate tasks, and emails as one task per
+# recipient, so a retry repeats only the step that failed
+@celery_app.task(**TASK_OPTIONS)
+def dispatch_booking_confirmation_email(self, booking_id: str, recipient: str):
+    """Send a booking confirmation email to the student or tutor"""
+    _run(_send_booking_confirmation_email(booking_id, recipient))
+
+
+@celery_app.task(**TASK_OPTIONS)
+def dispatch_booking_confirmation_inapp(self, booking_id: str):
+    """Create in-app booking confirmation notifications"""
+    _run(_send_booking_confirmation_inapp(booking_id))
+
+
+@celery_app.task(**TASK_OPTIONS)
+def dispatch_booking_cancellation_email(self, booking_id: str, recipient: str):
+    """Send a booking cancellation email to the student or tutor"""
+    _run(_send_booking_cancellation_email(booking_id, recipient))
+
+
+@celery_app.task(**TASK_OPTIONS)
+def dispatch_booking_cancellation_inapp(self, booking_id: str):
+    """Create in-app booking cancellation notifications"""
+    _run(_send_booking_cancellation_inapp(booking_id))
+
+
+@celery_app.task(**TASK_OPTIONS)
+def dispatch_booking_reschedule_email(self, new_booking_id: str, old_booking_id: str, recipient: str):
+    """Send a booking reschedule email to the student or tutor"""
+    _run(_send_booking_reschedule_email(new_booking_id, old_booking_id, recipient))
+
+
+@celery_app.task(**TASK_OPTIONS)
+def dispatch_booking_reschedule_inapp(self, new_booking_id: str):
+    """Create in-app booking reschedule notifications"""
+    _run(_send_booking_reschedule_inapp(new_booking_id))
+
+
+@celery_app.task(bind=True, acks_late=True)
+def send_booking_reminders(self):
+    """Send 24h and 2h booking reminders (run hourly by Celery beat)"""
+    from app.tasks.reminder_tasks import send_booking_reminders as send_reminders
+    
+    _run(send_reminders())
@@ -0,0 +1,42 @@
+import logging
+
+import orjson
+import stripe
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.tasks.notifications import TASK_OPTIONS, _run
+
+logger = logging.getLogger(__name__)
+
+
+async def _process_stripe_event(payload: str):
+    # Imported lazily: the Stripe service enqueues this task
+    from app.services.stripe_service import StripeService
+
+    event = stripe.Event.construct_from(orjson.loads(payload), settings.STRIPE_SECRET_KEY)
+
+    async with AsyncSessionLocal() as db:
+        await StripeService().handle_event(event, db)
+
+
+@celery_app.task(**TASK_OPTIONS)
+def process_stripe_event(self, payload: str):
+    """Apply a verified Stripe webhook event"""
+    _run(_process_stripe_event(payload))
+
+
+async def _warm_stripe_customer_cache():
+    from app.services.stripe_service import warm_customer_cache
+
+    async with AsyncSessionLocal() as db:
+        count = await warm_customer_cache(db)
+
+    logger.info(f"Cached {count} Stripe customers")
+
+
+@celery_app.task(bind=True, acks_late=True)
+def warm_stripe_customer_cache(self):
+    """Load Stripe customer mappings into Redis (run daily by Celery beat, and after deploys)"""
+    _run(_warm_stripe_customer_cache())
@@ -1,17 +1,107 @@
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import Any, Dict, Iterable, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, update, and_, func, exists, values, column, DateTime
 import asyncio
 import logging
 
+from app.core.celery_app import celery_app
 from app.core.database import AsyncSessionLocal
 from app.models.booking import Booking, BookingStatus
 from app.services.notification_service import NotificationService
 from app.services.scheduling_service import SchedulingService
+from app.tasks.notifications import TASK_OPTIONS, _run
 
 logger = logging.getLogger(__name__)
 
+# Bulk UPDATEs below run with synchronize_session=False: no task reads the
+# updated rows back through its session, so the ORM needn't track them
+
+# Rows soft-deleted per statement by the old-slot cleanup
+SLOT_CLEANUP_BATCH_SIZE = 4096
+
+# Accounts synced and availability blocks expanded at once; each holds a
+# pooled DB connection while it runs
+CALENDAR_SYNC_CONCURRENCY = 10
+SLOT_GENERATION_CONCURRENCY = 10
+
+
+def _merge_busy_ranges(busy_times: Iterable[Dict[str, str]]) -> List[Tuple[datetime, datetime]]:
+    """Parse busy times once and merge overlapping or touching ranges, sorted by start"""
+    parsed = sorted(
+        (
+            datetime.fromisoformat(busy_time["start"].replace('Z', '+00:00')),
+            datetime.fromisoformat(busy_time["end"].replace('Z', '+00:00'))
+        )
+        for busy_time in busy_times
+    )
+    
+    merged: List[Tuple[datetime, datetime]] = []
+    for busy_start, busy_end in parsed:
+        if merged and busy_start <= merged[-1][1]:
+            if busy_end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], busy_end)
+        else:
+            merged.append((busy_start, busy_end))
+    
+    return merged
+
+
+def _event_busy_times(events: Iterable[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Busy times of changed calendar events: timed, not cancelled and not marked free"""
+    return [
+        {"start": event["start"]["dateTime"], "end": event["end"]["dateTime"]}
+        for event in events
+        if event.get("status") != "cancelled"
+        and event.get("transparency") != "transparent"
+        and "dateTime" in event.get("start", {})
+    ]
+
+
+async def _close_busy_slots(
+    db: AsyncSession,
+    user_id,
+    merged_ranges: List[Tuple[datetime, datetime]],
+    start_date: datetime,
+    end_date: datetime,
+    now: datetime
+):
+    """Close a user's open slots in the window that overlap any busy range (caller commits)"""
+    from app.models.availability import Slot, SlotStatus
+    
+    # Nothing to close, and VALUES needs at least one row
+    if not merged_ranges:
+        return
+    
+    busy_ranges = values(
+        column("busy_start", DateTime(timezone=True)),
+        column("busy_end", DateTime(timezone=True)),
+        name="busy_ranges"
+    ).data(merged_ranges)
+    
+    # Close the open slots that overlap any busy range in one statement
+    await db.execute(
+        update(Slot)
+        .where(
+            and_(
+                Slot.tutor_id == user_id,
+                Slot.status == SlotStatus.OPEN,
+                Slot.start_at >= start_date,
+                Slot.start_at <= end_date,
+                Slot.deleted_at.is_(None),
+                exists().where(
+                    and_(
+                        Slot.start_at < busy_ranges.c.busy_end,
+                        Slot.end_at > busy_ranges.c.busy_start
+                    )
+                )
+            )
+        )
+        .values(status=SlotStatus.CLOSED, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
 
 async def send_booking_reminders():
     """Background task to send booking reminders (24h and 2h before session)"""
@@ -30,28 +120,28 @@ async def cleanup_expired_holds():
         try:
             from app.models.availability import Slot, SlotStatus
             
-            # Find held slots that have expired (more than 10 minutes old)
-            expired_time = datetime.now(timezone.utc) - timedelta(minutes=10)
+            # Release held slots that have expired (more than 10 minutes old)
+            # in one statement rather than loading and updating each slot
+            now = datetime.now(timezone.utc)
+            expired_time = now - timedelta(minutes=10)
             
-            expired_slots = await db.execute(
-                select(Slot).where(
+            result = await db.execute(
+                update(Slot)
+                .where(
                     and_(
                         Slot.status == SlotStatus.HELD,
                         Slot.updated_at < expired_time,
                         Slot.deleted_at.is_(None)
                     )
                 )
-            ).scalars().all()
-            
-            # Release expired slots
-            for slot in expired_slots:
-                slot.status = SlotStatus.OPEN
-                slot.updated_at = datetime.now(timezone.utc)
+                .values(status=SlotStatus.OPEN, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
             
             await db.commit()
             
-            if expired_slots:
-                logger.info(f"Released {len(expired_slots)} expired slot holds")
+            if result.rowcount:
+                logger.info(f"Released {result.rowcount} expired slot holds")
             
         except Exception as e:
             logger.error(f"Error cleaning up expired holds: {e}")
@@ -59,136 +149,251 @@ async def cleanup_expired_holds():
 
 async def generate_future_slots():
     """Background task to generate future slots from recurring availability"""
-    async with AsyncSessionLocal() as db:
-        try:
-            from app.models.availability import AvailabilityBlock
-            
-            # Get recurring availability blocks
-            recurring_blocks = await db.execute(
+    try:
+        from app.models.availability import AvailabilityBlock
+        
+        # Get recurring availability blocks
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
                 select(AvailabilityBlock).where(
                     and_(
                         AvailabilityBlock.is_recurring == True,
                         AvailabilityBlock.deleted_at.is_(None)
                     )
                 )
-            ).scalars().all()
-            
-            scheduling_service = SchedulingService(db)
-            
-            for block in recurring_blocks:
+            )
+            recurring_blocks = result.scalars().all()
+        
+        semaphore = asyncio.Semaphore(SLOT_GENERATION_CONCURRENCY)
+        
+        async def generate(block):
+            # Blocks are generated concurrently, so each needs its own session
+            async with semaphore, AsyncSessionLocal() as db:
                 try:
                     # Generate slots for the next 8 weeks
-                    await scheduling_service._generate_slots_from_availability(block)
+                    await SchedulingService(db)._generate_slots_from_availability(block)
                 except Exception as e:
                     logger.error(f"Error generating slots for availability block {block.id}: {e}")
-            
-            logger.info(f"Generated future slots for {len(recurring_blocks)} recurring availability blocks")
-            
-        except Exception as e:
-            logger.error(f"Error generating future slots: {e}")
+        
+        await asyncio.gather(*[generate(block) for block in recurring_blocks])
+        
+        logger.info(f"Generated future slots for {len(recurring_blocks)} recurring availability blocks")
+        
+    except Exception as e:
+        logger.error(f"Error generating future slots: {e}")
 
 
 async def sync_google_calendar_events():
     """Background task to sync Google Calendar events and update availability"""
-    async with AsyncSessionLocal() as db:
-        try:
-            from app.models.google_oauth import GoogleOAuthAccount
-            from app.models.availability import Slot, SlotStatus
-            from app.services.google_calendar_service import GoogleCalendarService
-            
-            # Get all connected Google Calendar accounts
-            oauth_accounts = await db.execute(
-                select(GoogleOAuthAccount).where(
+    try:
+        from app.models.google_oauth import GoogleOAuthAccount, GoogleCalendarChannel
+        from app.models.availability import Slot, SlotStatus
+        from app.services.google_calendar_service import GoogleCalendarService
+        
+        # Get busy times for the next 2 weeks; one timestamp stamps the whole run
+        now = datetime.now(timezone.utc)
+        start_date = now
+        end_date = now + timedelta(weeks=2)
+        
+        # Get connected Google Calendar accounts with open slots in the window;
+        # anyone else has nothing to close, so their calendars aren't fetched
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(GoogleOAuthAccount.user_id, GoogleOAuthAccount.access_token).where(
                     and_(
-                        GoogleOAuthAccount.deleted_at.is_(None)
-                    )
-                )
-            ).scalars().all()
-            
-            google_calendar = GoogleCalendarService()
-            
-            for oauth_account in oauth_accounts:
-                try:
-                    # Get busy times for the next 2 weeks
-                    start_date = datetime.now(timezone.utc)
-                    end_date = start_date + timedelta(weeks=2)
-                    
-                    busy_times = await google_calendar.get_busy_times(
-                        access_token=oauth_account.access_token,
-                        start_date=start_date,
-                        end_date=end_date
-                    )
-                    
-                    # Get open slots for this user
-                    open_slots = await db.execute(
-                        select(Slot).where(
+                        GoogleOAuthAccount.deleted_at.is_(None),
+                        exists().where(
                             and_(
-                                Slot.tutor_id == oauth_account.user_id,
+                                Slot.tutor_id == GoogleOAuthAccount.user_id,
                                 Slot.status == SlotStatus.OPEN,
                                 Slot.start_at >= start_date,
                                 Slot.start_at <= end_date,
                                 Slot.deleted_at.is_(None)
                             )
                         )
-                    ).scalars().all()
-                    
-                    # Check for conflicts and close conflicting slots
-                    for slot in open_slots:
-                        for busy_time in busy_times:
-                            busy_start = datetime.fromisoformat(busy_time["start"].replace('Z', '+00:00'))
-                            busy_end = datetime.fromisoformat(busy_time["end"].replace('Z', '+00:00'))
-                            
-                            # Check for overlap
-                            if (slot.start_at < busy_end and slot.end_at > busy_start):
-                                slot.status = SlotStatus.CLOSED
-                                slot.updated_at = datetime.now(timezone.utc)
-                                break
+                    )
+                )
+            )
+            oauth_accounts = result.all()
+            
+            # Watched calendars beyond the primary one, per user
+            result = await db.execute(
+                select(GoogleCalendarChannel.user_id, GoogleCalendarChannel.calendar_id).where(
+                    and_(
+                        GoogleCalendarChannel.calendar_id != "primary",
+                        GoogleCalendarChannel.deleted_at.is_(None)
+                    )
+                )
+            )
+            calendar_ids_by_user = defaultdict(lambda: ["primary"])
+            for user_id, calendar_id in result.all():
+                calendar_ids_by_user[user_id].append(calendar_id)
+        
+        google_calendar = GoogleCalendarService()
+        semaphore = asyncio.Semaphore(CALENDAR_SYNC_CONCURRENCY)
+        
+        async def sync_account(user_id, access_token):
+            # Accounts sync concurrently, so each needs its own session
+            async with semaphore, AsyncSessionLocal() as db:
+                try:
+                    # One Free/Busy query covers all of the user's calendars
+                    busy_by_calendar = await google_calendar.get_busy_times_multi(
+                        access_token,
+                        start_date,
+                        end_date,
+                        calendar_ids_by_user[user_id]
+                    )
+                    merged_ranges = _merge_busy_ranges(
+                        busy_time
+                        for calendar_busy_times in busy_by_calendar.values()
+                        for busy_time in calendar_busy_times
+                    )
                     
+                    await _close_busy_slots(db, user_id, merged_ranges, start_date, end_date, now)
                     await db.commit()
                     
                 except Exception as e:
-                    logger.error(f"Error syncing calendar for user {oauth_account.user_id}: {e}")
-            
-            logger.info(f"Synced Google Calendar events for {len(oauth_accounts)} users")
-            
-        except Exception as e:
-            logger.error(f"Error syncing Google Calendar events: {e}")
+                    logger.error(f"Error syncing calendar for user {user_id}: {e}")
+        
+        await asyncio.gather(*[
+            sync_account(user_id, access_token) for user_id, access_token in oauth_accounts
+        ])
+        
+        logger.info(f"Synced Google Calendar events for {len(oauth_accounts)} users")
+        
+    except Exception as e:
+        logger.error(f"Error syncing Google Calendar events: {e}")
+
+
+async def renew_expiring_calendar_channels():
+    """Background task to renew Google Calendar webhook channels close to expiry"""
+    try:
+        from app.models.google_oauth import GoogleOAuthAccount, GoogleCalendarChannel
+        from app.services.google_calendar_service import GoogleCalendarService
+        
+        # Only channels expiring within the next day need renewal
+        renew_before = datetime.now(timezone.utc) + timedelta(days=1)
+        
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(GoogleCalendarChannel, GoogleOAuthAccount.access_token).join(
+                    GoogleOAuthAccount,
+                    GoogleOAuthAccount.user_id == GoogleCalendarChannel.user_id
+                ).where(
+                    and_(
+                        GoogleCalendarChannel.expiration < renew_before,
+                        GoogleCalendarChannel.deleted_at.is_(None),
+                        GoogleOAuthAccount.deleted_at.is_(None)
+                    )
+                )
+            )
+            expiring_channels = result.all()
+        
+        google_calendar = GoogleCalendarService()
+        semaphore = asyncio.Semaphore(5)
+        
+        async def renew(channel, access_token):
+            # Each renewal commits in its own session as soon as Google accepts
+            # it, so a later failure can't lose channels that were already created
+            async with semaphore, AsyncSessionLocal() as db:
+                try:
+                    db.add(channel)
+                    if await google_calendar.refresh_webhook_if_expiring(access_token, channel):
+                        await db.commit()
+                except Exception as e:
+                    logger.error(f"Error renewing calendar channel {channel.channel_id}: {e}")
+        
+        await asyncio.gather(*[
+            renew(channel, access_token) for channel, access_token in expiring_channels
+        ])
+        
+        if expiring_channels:
+            logger.info(f"Renewed {len(expiring_channels)} expiring calendar channels")
+        
+    except Exception as e:
+        logger.error(f"Error renewing calendar channels: {e}")
+
+
+async def sync_calendar_channel(channel_id: str):
+    """Apply a watched calendar's changes after a Google push notification"""
+    from app.models.google_oauth import GoogleOAuthAccount, GoogleCalendarChannel
+    from app.services.google_calendar_service import GoogleCalendarService
+    
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(GoogleCalendarChannel, GoogleOAuthAccount.access_token).join(
+                GoogleOAuthAccount,
+                GoogleOAuthAccount.user_id == GoogleCalendarChannel.user_id
+            ).where(
+                and_(
+                    GoogleCalendarChannel.channel_id == channel_id,
+                    GoogleCalendarChannel.deleted_at.is_(None),
+                    GoogleOAuthAccount.deleted_at.is_(None)
+                )
+            )
+        )
+        row = result.first()
+        if not row:
+            logger.warning(f"Calendar channel {channel_id} not found for sync")
+            return
+        
+        channel, access_token = row
+        
+        # Events changed since the stored sync token; the new token is set on the channel
+        events = await GoogleCalendarService().sync_channel_events(access_token, channel)
+        
+        merged_ranges = _merge_busy_ranges(_event_busy_times(events))
+        now = datetime.now(timezone.utc)
+        if merged_ranges:
+            await _close_busy_slots(db, channel.user_id, merged_ranges, now, merged_ranges[-1][1], now)
+        
+        # Closed slots and the sync token are committed together
+        await db.commit()
 
 
 async def process_no_show_bookings():
     """Background task to process no-show bookings"""
     async with AsyncSessionLocal() as db:
         try:
-            # Find completed bookings that are past their end time
+            # Mark confirmed bookings that are past their end time as completed
+            # in one statement, returning what the notifications need
             now = datetime.now(timezone.utc)
             
-            completed_bookings = await db.execute(
-                select(Booking).where(
+            result = await db.execute(
+                update(Booking)
+                .where(
                     and_(
                         Booking.status == BookingStatus.CONFIRMED,
                         Booking.end_at < now,
                         Booking.deleted_at.is_(None)
                     )
                 )
-            ).scalars().all()
-            
-            for booking in completed_bookings:
-                try:
-                    # Mark booking as completed
-                    booking.status = BookingStatus.COMPLETED
-                    booking.notes = f"{booking.notes or ''}\nMarked as completed automatically"
-                    booking.updated_at = datetime.now(timezone.utc)
-                    
-                    # Send completion notification
-                    notification_service = NotificationService(db)
-                    await notification_service.send_booking_completion_notification(booking)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing no-show booking {booking.id}: {e}")
+                .values(
+                    status=BookingStatus.COMPLETED,
+                    notes=func.concat(
+                        func.coalesce(Booking.notes, ''),
+                        '\nMarked as completed automatically'
+                    ),
+                    updated_at=now
+                )
+                .returning(
+                    Booking.id,
+                    Booking.student_id,
+                    Booking.tutor_id,
+                    Booking.start_at,
+                    Booking.end_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            completed_bookings = result.all()
             
             await db.commit()
             
             if completed_bookings:
+                # Completion notifications for every booking go out together
+                notification_service = NotificationService(db)
+                await notification_service.send_booking_completion_notifications(completed_bookings)
+                
                 logger.info(f"Processed {len(completed_bookings)} completed bookings")
             
         except Exception as e:
@@ -201,93 +406,82 @@ async def cleanup_old_slots():
         try:
             from app.models.availability import Slot
             
-            # Find slots older than 3 months
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
-            
-            old_slots = await db.execute(
-                select(Slot).where(
-                    and_(
-                        Slot.start_at < cutoff_date,
-                        Slot.deleted_at.is_(None)
+            # Soft delete slots older than 3 months in bounded batches, committing
+            # each one so row locks are held briefly and memory stays flat
+            now = datetime.now(timezone.utc)
+            cutoff_date = now - timedelta(days=90)
+            deleted_count = 0
+            
+            while True:
+                batch_ids = (
+                    select(Slot.id)
+                    .where(
+                        and_(
+                            Slot.start_at < cutoff_date,
+                            Slot.deleted_at.is_(None)
+                        )
                     )
+                    .limit(SLOT_CLEANUP_BATCH_SIZE)
+                    .with_for_update(skip_locked=True)
                 )
-            ).scalars().all()
-            
-            # Soft delete old slots
-            for slot in old_slots:
-                slot.deleted_at = datetime.now(timezone.utc)
-            
-            await db.commit()
+                result = await db.execute(
+                    update(Slot)
+                    .where(Slot.id.in_(batch_ids))
+                    .values(deleted_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                
+                if not result.rowcount:
+                    break
+                deleted_count += result.rowcount
             
-            if old_slots:
-                logger.info(f"Cleaned up {len(old_slots)} old slots")
+            if deleted_count:
+                logger.info(f"Cleaned up {deleted_count} old slots")
             
         except Exception as e:
             logger.error(f"Error cleaning up old slots: {e}")
 
 
-# Task scheduler functions
-async def schedule_reminder_tasks():
-    """Schedule all reminder-related background tasks"""
-    while True:
-        try:
-            # Send booking reminders every hour
-            await send_booking_reminders()
-            
-            # Cleanup expired holds every 5 minutes
-            await cleanup_expired_holds()
-            
-            # Generate future slots daily at 2 AM
-            now = datetime.now(timezone.utc)
-            if now.hour == 2 and now.minute < 5:
-                await generate_future_slots()
-            
-            # Sync Google Calendar events every 30 minutes
-            if now.minute % 30 < 5:
-                await sync_google_calendar_events()
-            
-            # Process no-show bookings every 15 minutes
-            if now.minute % 15 < 5:
-                await process_no_show_bookings()
-            
-            # Cleanup old slots daily at 3 AM
-            if now.hour == 3 and now.minute < 5:
-                await cleanup_old_slots()
-            
-            # Wait for 5 minutes before next iteration
-            await asyncio.sleep(300)
-            
-        except Exception as e:
-            logger.error(f"Error in reminder task scheduler: {e}")
-            await asyncio.sleep(60)  # Wait 1 minute on error
+# Celery tasks, scheduled by Celery beat (see celery_app.beat_schedule).
+# Booking reminders run as app.tasks.notifications.send_booking_reminders.
+@celery_app.task(bind=True, acks_late=True)
+def cleanup_expired_holds_task(self):
+    """Celery task for cleaning up expired holds"""
+    _run(cleanup_expired_holds())
 
 
-# Celery task definitions (if using Celery)
-def send_booking_reminders_task():
-    """Celery task wrapper for sending booking reminders"""
-    asyncio.run(send_booking_reminders())
+@celery_app.task(bind=True, acks_late=True)
+def generate_future_slots_task(self):
+    """Celery task for generating future slots"""
+    _run(generate_future_slots())
 
 
-def cleanup_expired_holds_task():
-    """Celery task wrapper for cleaning up expired holds"""
-    asyncio.run(cleanup_expired_holds())
+@celery_app.task(bind=True, acks_late=True)
+def sync_google_calendar_events_task(self):
+    """Celery task for syncing Google Calendar events"""
+    _run(sync_google_calendar_events())
 
 
-def generate_future_slots_task():
-    """Celery task wrapper for generating future slots"""
-    asyncio.run(generate_future_slots())
+@celery_app.task(bind=True, acks_late=True)
+def renew_expiring_calendar_channels_task(self):
+    """Celery task for renewing calendar webhook channels"""
+    _run(renew_expiring_calendar_channels())
 
 
-def sync_google_calendar_events_task():
-    """Celery task wrapper for syncing Google Calendar events"""
-    asyncio.run(sync_google_calendar_events_task())
+@celery_app.task(**TASK_OPTIONS)
+def sync_calendar_channel_task(self, channel_id: str):
+    """Celery task for applying a watched calendar's changes (queued by the push receiver)"""
+    _run(sync_calendar_channel(channel_id))
 
 
-def process_no_show_bookings_task():
-    """Celery task wrapper for processing no-show bookings"""
-    asyncio.run(process_no_show_bookings())
+@celery_app.task(bind=True, acks_late=True)
+def process_no_show_bookings_task(self):
+    """Celery task for processing no-show bookings"""
+    _run(process_no_show_bookings())
 
 
-def cleanup_old_slots_task():
-    """Celery task wrapper for cleaning up old slots"""
-    asyncio.run(cleanup_old_slots())
+@celery_app.task(bind=True, acks_late=True)
+def cleanup_old_slots_task(self):
+    """Celery task for cleaning up old slots"""
+    _run(cleanup_old_slots())
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
@@ -6,6 +7,13 @@ import uvicorn
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.core.database import init_db
+from app.core.http_client import close_http_client
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.core.redis_client import close_redis
+from app.core.s3_client import close_s3_client
+from app.core.upload_limits import UploadSizeLimitMiddleware
+from app.services.google_oauth_service import close_oauth_session
+from app.tasks.payments import warm_stripe_customer_cache
 
 # Ensure models are imported so metadata is populated
 from app import models  # noqa: F401
@@ -13,13 +21,27 @@ from app import models  # noqa: F401
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    setup_logging()
     print("Starting up Preply API...")
+    if not (settings.CELERY_BROKER_URL or settings.REDIS_URL):
+        raise RuntimeError("CELERY_BROKER_URL or REDIS_URL must be set for background tasks")
     await init_db()
     
+    # Refill the Stripe customer cache after each deploy
+    try:
+        warm_stripe_customer_cache.delay()
+    except Exception as e:
+        print(f"Could not queue Stripe customer cache warm-up: {e}")
+    
     yield
     
     # Shutdown
     print("Shutting down Preply API...")
+    await close_http_client()
+    await close_oauth_session()
+    await close_redis()
+    await close_s3_client()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -28,9 +50,17 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# Refuse oversized uploads before they are spooled to disk. Registered before
+# CORS so CORS wraps it and the 413 carries CORS headers
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,